@@ -1,8 +1,15 @@
-from abc import abstractmethod, ABC
-
-
-class Algorithm(ABC):
-
-    @abstractmethod
-    def calculate_best_move(self, game_state):
-        pass
+from abc import abstractmethod, ABC
+
+
+class Algorithm(ABC):
+
+    @abstractmethod
+    def calculate_best_move(self, game_state):
+        pass
+
+    def calculate_best_moves(self, games):
+        """
+        Returns the best move of each of many games. Strategies that can score many
+        positions at once override this loop.
+        """
+        return [self.calculate_best_move(game) for game in games]
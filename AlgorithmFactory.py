@@ -1,16 +1,19 @@
-from QLearningStrategy import QLearningStrategy
-from ReinforcementLearningStrategy import ReinforcementLearningStrategy
-from ValueIterationStrategy import ValueIterationStrategy
-
-
-class AlgorithmFactory:
-
-    @staticmethod
-    def create_algorithm(algorithm_type):
-        if algorithm_type == "ReinforcementLearning":
-            return ReinforcementLearningStrategy
-        elif algorithm_type == "ValueIteration":
-            return ValueIterationStrategy
-        elif algorithm_type == "QLearning":
-            return QLearningStrategy
-        raise ValueError(f"Algorithm {algorithm_type} not supported.")
+from MinimaxStrategy import MinimaxStrategy
+from QLearningStrategy import QLearningStrategy
+from ReinforcementLearningStrategy import ReinforcementLearningStrategy
+from ValueIterationStrategy import ValueIterationStrategy
+
+
+class AlgorithmFactory:
+
+    @staticmethod
+    def create_algorithm(algorithm_type):
+        if algorithm_type == "ReinforcementLearning":
+            return ReinforcementLearningStrategy
+        elif algorithm_type == "ValueIteration":
+            return ValueIterationStrategy
+        elif algorithm_type == "QLearning":
+            return QLearningStrategy
+        elif algorithm_type == "Minimax":
+            return MinimaxStrategy
+        raise ValueError(f"Algorithm {algorithm_type} not supported.")
@@ -0,0 +1,250 @@
+import numpy as np
+
+from BitBoard import get_win_masks
+from Utils import get_symmetry_maps
+
+EMPTY, AI, HUMAN = 0, 1, 2
+_CELL_SYMBOLS = bytes.maketrans(b'\x00\x01\x02', b' XO')
+# Rank of each cell value in the character order ' ' < 'O' < 'X' of state strings, so that
+# comparing rank arrays lexicographically matches Utils.canonicalize_state.
+_CELL_RANKS = np.array([0, 2, 1], dtype=np.int8)
+
+
+class BatchQLearningTrainer:
+    """
+    Trains a QLearningStrategy by self-play against a random opponent, advancing many
+    games at once.
+
+    The games live in one (num_games, size * size) int8 array. Legal-move masks, the
+    random opponent, epsilon-greedy move selection, win and draw detection, terminal
+    resets and the Q-updates are all computed for the whole batch with NumPy.
+
+    During training the Q-values sit in a dense (states, cells) array with one row per
+    canonical state, rows being created the first time a position is seen and seeded
+    from the strategy's Q-table. write_back() stores the result in the usual
+    {(state, action): value} layout of QLearningStrategy.Q.
+
+    Unlike QLearningStrategy.calculate_best_move, exploitation moves are greedy in Q
+    rather than MCTS-guided, which is what makes batching possible.
+    """
+
+    def __init__(self, ai_strategy, board_size, num_games=256, seed=None):
+        self.strategy = ai_strategy
+        self.size = board_size
+        self.cells = board_size * board_size
+        self.num_games = num_games
+        self.rng = np.random.default_rng(seed)
+
+        lines = np.zeros((len(get_win_masks(board_size)), self.cells), dtype=np.int8)
+        for i, mask in enumerate(get_win_masks(board_size)):
+            for cell in range(self.cells):
+                lines[i, cell] = mask >> cell & 1
+        self.lines = lines.T  # (cells, lines), so boards @ lines counts stones per line
+        self.forward = np.array(get_symmetry_maps(board_size)[0], dtype=np.intp)
+        self.inverse = np.array(get_symmetry_maps(board_size)[1], dtype=np.intp)
+
+        self.boards = np.zeros((num_games, self.cells), dtype=np.int8)
+        # Pending transition of every game: the AI's last decision state row and action
+        self.pending_rows = np.full(num_games, -1, dtype=np.intp)
+        self.pending_actions = np.zeros(num_games, dtype=np.intp)
+
+        self.states = []  # canonical state string of every row
+        self.rows = {}  # canonical state string -> row
+        self.raw_keys = {}  # raw board bytes -> (row, transform)
+        self.q_values = np.zeros((1024, self.cells))
+        self.changed = np.zeros((1024, self.cells), dtype=bool)  # updated since the last write_back()
+
+        self.episodes = 0
+
+        # Existing Q-values, grouped by state, to seed new rows
+        self.seed_values = {}
+        for (state, (i, j)), value in ai_strategy.Q.items():
+            if len(state) == self.cells:
+                self.seed_values.setdefault(state, []).append((i * board_size + j, value))
+
+    def _row(self, canonical_state):
+        row = self.rows.get(canonical_state)
+        if row is None:
+            row = len(self.states)
+            if row == len(self.q_values):
+                self.q_values = np.concatenate([self.q_values, np.zeros_like(self.q_values)])
+                self.changed = np.concatenate([self.changed, np.zeros_like(self.changed)])
+            self.rows[canonical_state] = row
+            self.states.append(canonical_state)
+            for cell, value in self.seed_values.get(canonical_state, ()):
+                self.q_values[row, cell] = value
+        return row
+
+    def _canonicalize(self, boards):
+        """
+        Vectorized Utils.canonicalize_state over an array of boards.
+
+        Returns:
+        tuple: The canonical boards and the index of the transform producing each of them.
+        """
+        candidates = boards[:, self.inverse]  # (games, 8, cells)
+        ranks = _CELL_RANKS[candidates]
+        indices = np.arange(len(boards))
+        best = np.zeros(len(boards), dtype=np.intp)
+        for transform in range(1, len(self.inverse)):
+            current = ranks[indices, best]
+            candidate = ranks[:, transform]
+            differs = candidate != current
+            first = differs.argmax(axis=1)
+            smaller = differs.any(axis=1) & (candidate[indices, first] < current[indices, first])
+            best[smaller] = transform
+        return candidates[indices, best], best
+
+    def _lookup(self, game_indices):
+        """
+        Returns the Q-table row and symmetry transform of the given games' boards.
+        """
+        cells = self.cells
+        raw = self.boards[game_indices].tobytes()
+        keys = [raw[i * cells:(i + 1) * cells] for i in range(len(game_indices))]
+        entries = [self.raw_keys.get(key) for key in keys]
+
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        if missing:
+            canonical, transforms = self._canonicalize(self.boards[game_indices[missing]])
+            canonical = canonical.tobytes().translate(_CELL_SYMBOLS).decode()
+            for n, i in enumerate(missing):
+                entry = self.raw_keys.get(keys[i])  # the same board may appear twice in a batch
+                if entry is None:
+                    row = self._row(canonical[n * cells:(n + 1) * cells])
+                    entry = self.raw_keys[keys[i]] = (row, int(transforms[n]))
+                entries[i] = entry
+
+        rows, transforms = zip(*entries)
+        return np.array(rows, dtype=np.intp), np.array(transforms, dtype=np.intp)
+
+    def _random_moves(self, game_indices):
+        keys = self.rng.random((len(game_indices), self.cells))
+        keys[self.boards[game_indices] != EMPTY] = -1
+        return keys.argmax(axis=1)
+
+    def _outcomes(self, game_indices, player):
+        """
+        Returns masks of the given games that player has won, and that are drawn.
+        """
+        boards = self.boards[game_indices]
+        counts = (boards == player).astype(np.int8) @ self.lines
+        won = (counts == self.size).any(axis=1)
+        drawn = ~won & (boards != EMPTY).all(axis=1)
+        return won, drawn
+
+    def _update(self, rows, actions, targets):
+        """
+        Moves each (row, action) value towards its targets as if the updates were applied one
+        after the other in batch order, so that none of a pair's updates is lost: a pair updated
+        k times ends at (1 - alpha) ** k times its value, plus each of its targets times alpha *
+        (1 - alpha) ** (the number of its updates that come later).
+        """
+        alpha = self.strategy.learning_rate
+        flat = rows * self.cells + actions
+        order = np.argsort(flat, kind='stable')
+        pairs, starts, counts = np.unique(flat[order], return_index=True, return_counts=True)
+        later = np.repeat(starts + counts, counts) - 1 - np.arange(len(flat))
+        combined = np.add.reduceat(alpha * (1 - alpha) ** later * targets[order], starts)
+        rows, actions = np.divmod(pairs, self.cells)
+        self.q_values[rows, actions] = (1 - alpha) ** counts * self.q_values[rows, actions] + combined
+        self.changed[rows, actions] = True
+
+    def _max_future(self, rows):
+        legal = np.frombuffer(''.join(self.states[row] for row in rows).encode(), dtype=np.uint8)
+        legal = legal.reshape(len(rows), self.cells) == ord(' ')
+        return np.where(legal, self.q_values[rows], -np.inf).max(axis=1)
+
+    def _finish(self, game_indices, rewards):
+        """
+        Applies the terminal update of the given games' pending transitions and resets them.
+        """
+        pending = self.pending_rows[game_indices] >= 0
+        if pending.any():
+            games = game_indices[pending]
+            self._update(self.pending_rows[games], self.pending_actions[games], rewards[pending])
+        self.boards[game_indices] = EMPTY
+        self.pending_rows[game_indices] = -1
+        self.episodes += len(game_indices)
+
+    def step(self):
+        """
+        Advances every game by one opponent move and one AI move.
+        """
+        all_games = np.arange(self.num_games)
+
+        # The human (random opponent) moves first, as in TicTacToeGame
+        self.boards[all_games, self._random_moves(all_games)] = HUMAN
+        won, drawn = self._outcomes(all_games, HUMAN)
+        over = won | drawn
+        if over.any():
+            self._finish(all_games[over], np.where(won[over], -1.0, 0.0))
+        active = all_games[~over]
+        if not len(active):
+            return
+
+        # The AI decides from each active game's current state
+        rows, transforms = self._lookup(active)
+        pending = self.pending_rows[active] >= 0
+        if pending.any():
+            games = active[pending]
+            targets = self.strategy.discount_factor * self._max_future(rows[pending])
+            self._update(self.pending_rows[games], self.pending_actions[games], targets)
+
+        # Epsilon-greedy over the Q-values seen in each board's own orientation
+        legal = self.boards[active] == EMPTY
+        q_raw = self.q_values[rows[:, None], self.forward[transforms]]
+        best = np.where(legal, q_raw, -np.inf)
+        best = best == best.max(axis=1, keepdims=True)
+        keys = self.rng.random(best.shape)
+        moves = np.where(best, keys, -1).argmax(axis=1)
+        exploring = self.rng.random(len(active)) < self._decayed_exploration_rates(len(active))
+        if exploring.any():
+            moves[exploring] = self._random_moves(active[exploring])
+
+        self.boards[active, moves] = AI
+        self.pending_rows[active] = rows
+        self.pending_actions[active] = self.forward[transforms, moves]
+
+        won, drawn = self._outcomes(active, AI)
+        over = won | drawn
+        if over.any():
+            self._finish(active[over], np.where(won[over], 1.0, 0.0))
+
+    def _decayed_exploration_rates(self, decisions):
+        """
+        Returns the exploration rate of each of the next decisions, decaying it the way
+        QLearningStrategy.calculate_best_move does once per move.
+        """
+        strategy = self.strategy
+        rates = np.maximum(strategy.exploration_rate * strategy.exploration_decay ** np.arange(decisions), 0.01)
+        strategy.exploration_rate = max(strategy.exploration_rate * strategy.exploration_decay ** decisions, 0.01)
+        return rates
+
+    def train(self, num_episodes):
+        """
+        Steps all games until at least num_episodes games have finished, then writes the
+        Q-values back to the strategy.
+
+        Returns:
+        int: The number of episodes finished.
+        """
+        target = self.episodes + num_episodes
+        while self.episodes < target:
+            self.step()
+        self.write_back()
+        return self.episodes
+
+    def write_back(self):
+        """
+        Stores the Q-values updated since the last write_back() in the strategy's
+        {(state, action): value} Q-table.
+        """
+        Q = self.strategy.Q
+        size = self.size
+        rows, cells = np.nonzero(self.changed[:len(self.states)])
+        self.changed[rows, cells] = False
+        values = self.q_values[rows, cells]
+        states = self.states
+        for row, cell, value in zip(rows.tolist(), cells.tolist(), values.tolist()):
+            Q[(states[row], divmod(cell, size))] = value
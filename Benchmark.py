@@ -0,0 +1,959 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import pickle
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from AlgorithmFactory import AlgorithmFactory
+from BatchTrainer import BatchQLearningTrainer
+from BitBoard import BitBoard
+from GameBoard import GameBoard
+from Instrumentation import SearchStats, TrainingStats
+from MCTS import MCTS
+from MinimaxStrategy import MinimaxStrategy
+from OpeningBook import OpeningBookStrategy, generate_book
+from QLearningStrategy import QLearningStrategy
+from QTable import QTable
+from TableFile import MappedTable, convert_pickle
+from ReplayBuffer import ReplayBuffer
+from RolloutPolicy import HeuristicRolloutPolicy
+from Run import get_table_filename, load_strategy, play_q_learning_episode, train_strategy
+from TicTacToeGame import TicTacToeGame
+from Utils import board_to_state, canonicalize_state, state_to_board
+from ValueIterationStrategy import ValueIterationStrategy
+
+
+def benchmark_rollouts(board_type, board_size, num_rollouts, seed=0):
+    """
+    Plays random games to the end, the way MCTS._simulate does, and times them.
+
+    Returns:
+    float: Rollouts per second.
+    """
+    random.seed(seed)
+    game = TicTacToeGame(QLearningStrategy, board_size, board_type)
+    start = time.perf_counter()
+    for _ in range(num_rollouts):
+        while not game.is_game_over():
+            game.make_move(random.choice(game.get_valid_moves()))
+        game.get_winner()
+        game.reset_game()
+    return num_rollouts / (time.perf_counter() - start)
+
+
+def benchmark_mcts_moves(board_size, simulations=200, num_moves=5, seed=0, board_type=GameBoard):
+    """
+    Times MCTS.search from the opening position with an empty Q-table.
+
+    Returns:
+    float: AI moves chosen per second.
+    """
+    random.seed(seed)
+    game = TicTacToeGame(QLearningStrategy, board_size, board_type)
+    start = time.perf_counter()
+    for _ in range(num_moves):
+        MCTS(game, {}, simulations=simulations).search()
+    return num_moves / (time.perf_counter() - start)
+
+
+def benchmark_parallel_mcts(board_size=7, worker_simulations=200, worker_counts=(1, 2, 4, 8)):
+    """
+    Measures root-parallel MCTS throughput in total simulations per second, once the worker
+    processes are started: a first search starts them and is not timed.
+    """
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    for workers in worker_counts:
+        mcts = MCTS(game, {}, simulations=worker_simulations, workers=workers,
+                    worker_simulations=worker_simulations, seed=0)
+        mcts.search()
+        start = time.perf_counter()
+        mcts.search()
+        elapsed = time.perf_counter() - start
+        mcts.close()
+        print(f"{board_size}x{board_size} MCTS with {workers} worker(s): "
+              f"{workers * worker_simulations / elapsed:.0f} simulations/s")
+
+
+def benchmark_transpositions(board_size, simulations=1000, seed=0):
+    """
+    Runs the same search with and without the transposition table and reports the hit rate.
+    """
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    for transposition_table in (False, True):
+        random.seed(seed)
+        mcts = MCTS(game, {}, simulations=simulations, transposition_table=transposition_table)
+        start = time.perf_counter()
+        mcts.search()
+        elapsed = time.perf_counter() - start
+        print(f"{board_size}x{board_size} MCTS transposition_table={transposition_table}: "
+              f"{simulations / elapsed:.0f} simulations/s, hit rate {mcts.transposition_hit_rate():.1%}")
+
+
+def benchmark_batch_training(board_size, num_episodes=200, batch_size=256, seed=0):
+    """
+    Compares QLearning training throughput of the one-game-at-a-time loop in
+    Run.train_strategy with BatchQLearningTrainer. Exploration is kept at 1.0 for both,
+    so the scalar loop never falls back to MCTS and only the loop overhead is compared.
+    """
+    random.seed(seed)
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    strategy = QLearningStrategy(game.board, game.AI_symbol, game.human_symbol, exploration_decay=1.0)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        train_strategy(game, strategy, num_episodes, 0.3, 'QLearning')
+    scalar = num_episodes / (time.perf_counter() - start)
+
+    strategy = QLearningStrategy(game.board, game.AI_symbol, game.human_symbol, exploration_decay=1.0)
+    trainer = BatchQLearningTrainer(strategy, board_size, batch_size, seed=seed)
+    start = time.perf_counter()
+    episodes = trainer.train(num_episodes * 10)
+    batched = episodes / (time.perf_counter() - start)
+    print(f"{board_size}x{board_size} QLearning episodes/s: loop {scalar:.0f}, "
+          f"batched x{batch_size} {batched:.0f} ({batched / scalar:.1f}x)")
+
+
+def benchmark_value_iteration_solver(board_size=3, max_depth=None):
+    """
+    Times ValueIterationStrategy.solve over the enumerated state space.
+    """
+    strategy = ValueIterationStrategy()
+    start = time.perf_counter()
+    sweeps = strategy.solve(board_size, max_depth=max_depth)
+    print(f"{board_size}x{board_size} value iteration solve: {len(strategy.V)} states, "
+          f"{sweeps} sweeps in {time.perf_counter() - start:.3f}s")
+
+
+def _traced_size(build):
+    tracemalloc.start()
+    table = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return table, size
+
+
+def benchmark_q_store(filename="q_table_7x7.pkl", num_updates=20000, seed=0):
+    """
+    Compares memory per entry and Q-update throughput of a plain {(state, action): value}
+    dict and QTable, loading the same trained table into both.
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+    table, dict_bytes = _traced_size(lambda: pickle.loads(data))
+    q_table, store_bytes = _traced_size(lambda: QTable(pickle.loads(data)))
+    print(f"{filename}: {len(table)} entries, dict {dict_bytes / len(table):.0f} bytes/entry, "
+          f"QTable {store_bytes / len(table):.0f} bytes/entry")
+
+    random.seed(seed)
+    transitions = [random.choice(list(table)) for _ in range(num_updates)]
+
+    def dict_update(old_state, action, new_state):
+        # The previous QLearningStrategy.update_q_value: the legal actions are rebuilt
+        # through state_to_board to find the max
+        board = state_to_board(new_state)
+        actions = [(i, j) for i in range(len(board)) for j in range(len(board)) if board[i][j] == ' ']
+        max_future_value = max([table.get((new_state, new_action), 0) for new_action in actions])
+        table[(old_state, action)] = 0.9 * table.get((old_state, action), 0) + 0.1 * 0.9 * max_future_value
+
+    def store_update(old_state, action, new_state):
+        max_future_value = q_table.max_value(new_state)
+        q_table[(old_state, action)] = 0.9 * q_table.get((old_state, action), 0) + 0.1 * 0.9 * max_future_value
+
+    for name, update in (("dict", dict_update), ("QTable", store_update)):
+        start = time.perf_counter()
+        for state, action in transitions:
+            update(state, action, canonicalize_state(state)[0])
+        print(f"{name} updates/s: {num_updates / (time.perf_counter() - start):.0f}")
+
+
+def benchmark_table_loading(filename="q_table_7x7.pkl", num_lookups=50, seed=0):
+    """
+    Compares startup time and memory of unpickling a whole table with opening its
+    memory-mapped conversion and looking up a game's worth of states.
+    """
+    table_filename = convert_pickle(filename, os.path.splitext(filename)[0] + '.bench.tbl')
+    random.seed(seed)
+    with open(filename, "rb") as f:
+        keys = random.sample(list(pickle.load(f)), num_lookups)
+
+    def pickled():
+        with open(filename, "rb") as f:
+            table = pickle.load(f)
+        return table, [table[key] for key in keys]
+
+    def mapped():
+        table = MappedTable(table_filename)
+        return table, [table[key] for key in keys]
+
+    for name, load in (("pickle", pickled), ("mapped", mapped)):
+        start = time.perf_counter()
+        _, memory = _traced_size(load)
+        print(f"{filename} {name}: load + {num_lookups} lookups in {(time.perf_counter() - start) * 1000:.1f}ms, "
+              f"{memory / 1024:.0f} KiB allocated")
+    os.remove(table_filename)
+
+
+def measure_anytime_search(board_size, time_budget_ms=20, num_games=2, seed=0, reuse_tree=True):
+    """
+    Plays QLearning with time-budgeted MCTS (and an empty Q-table) against random moves.
+
+    Returns:
+    SearchStats: The statistics of every search, with the move latencies and reused nodes.
+    """
+    random.seed(seed)
+    stats = SearchStats()
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    strategy = QLearningStrategy(game.board, game.AI_symbol, game.human_symbol, exploration_rate=0.0,
+                                 search_stats=stats, mcts_time_budget_ms=time_budget_ms, mcts_reuse_tree=reuse_tree)
+    for _ in range(num_games):
+        while not game.is_game_over():
+            if game.current_player == game.AI_symbol:
+                game.make_move(strategy.calculate_best_move(game))
+            else:
+                game.make_move(random.choice(game.get_valid_moves()))
+        game.reset_game()
+    return stats
+
+
+def benchmark_anytime_mcts(board_size, time_budget_ms=50, num_games=3):
+    """
+    Compares time-budgeted MCTS with and without tree reuse between moves.
+    """
+    for reuse_tree in (False, True):
+        stats = measure_anytime_search(board_size, time_budget_ms, num_games, reuse_tree=reuse_tree)
+        print(f"{board_size}x{board_size} MCTS {time_budget_ms}ms budget, reuse_tree={reuse_tree}: "
+              f"{stats.simulations / stats.searches:.0f} simulations/move, "
+              f"{stats.reused_visits / stats.searches:.0f} reused visits/move, {stats.reused_nodes} reused nodes, "
+              f"p50 {stats.latency_percentile(50):.1f}ms, p99 {stats.latency_percentile(99):.1f}ms")
+
+
+def compare_board_engines(board_size=7, num_rollouts=2000):
+    baseline = benchmark_rollouts(GameBoard, board_size, num_rollouts)
+    bitboard = benchmark_rollouts(BitBoard, board_size, num_rollouts)
+    print(f"{board_size}x{board_size} rollouts/s: GameBoard {baseline:.0f}, BitBoard {bitboard:.0f} "
+          f"({bitboard / baseline:.1f}x)")
+
+
+def compare_position_keys(board_size=7, num_plies=20000, seed=0):
+    """
+    Compares the per-ply cost of the position keys rollouts look up: building the state
+    string from the grid and canonicalizing it, as before boards kept their keys, against
+    reading the keys the board keeps up to date.
+    """
+    boards = _random_positions(GameBoard, board_size, 100, seed)
+    rounds = num_plies // len(boards)
+
+    def per_ply_us(key):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for board in boards:
+                key(board)
+        return (time.perf_counter() - start) / (rounds * len(boards)) * 1e6
+
+    canonicalize_state.cache_clear()
+    joined = per_ply_us(lambda board: canonicalize_state(''.join([''.join(row) for row in board.board])))
+    canonicalize_state.cache_clear()
+    # Every rollout position is new, so the canonicalization cache is bypassed
+    uncached = per_ply_us(lambda board: canonicalize_state.__wrapped__(''.join([''.join(row) for row in board.board])))
+    kept = per_ply_us(lambda board: board.canonical_key())
+    zobrist = per_ply_us(lambda board: board.zobrist_hash)
+    print(f"{board_size}x{board_size} position key per ply: string + canonicalize {uncached:.2f}us "
+          f"({joined:.2f}us cached), canonical_key {kept:.2f}us, zobrist_hash {zobrist:.2f}us")
+
+
+def _random_positions(board_type, board_size, count, seed):
+    """
+    Returns count boards with a random number of random moves played, none of them finished.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        game = TicTacToeGame(QLearningStrategy, board_size, board_type)
+        for _ in range(rng.randrange(board_size * board_size)):
+            game.make_move(rng.choice(game.get_valid_moves()))
+            if game.is_game_over():
+                game.undo_move()
+                break
+        positions.append(game.board)
+    return positions
+
+
+def measure_board_operations(board_type, board_size, num_operations=20000, seed=0):
+    """
+    Times the board operations the search and training loops are built on, over a fixed
+    set of random positions.
+
+    Returns:
+    dict: Operations per second of is_game_over, get_empty_positions, a make_move/undo_move
+    pair and canonical_key.
+    """
+    boards = _random_positions(board_type, board_size, 100, seed)
+    moves = [(board, board.get_empty_positions()[0]) for board in boards]
+    rounds = num_operations // len(boards)
+    operations = rounds * len(boards)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for board in boards:
+            board.is_game_over()
+    is_game_over = operations / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for board in boards:
+            board.get_empty_positions()
+    get_empty_positions = operations / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for board, move in moves:
+            board.make_move(move, 'X')
+            board.undo_move(move)
+    make_undo_move = operations / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for board in boards:
+            board.canonical_key()
+    canonical_key = operations / (time.perf_counter() - start)
+
+    return {'is_game_over_per_s': is_game_over, 'get_empty_positions_per_s': get_empty_positions,
+            'make_undo_move_per_s': make_undo_move, 'canonical_key_per_s': canonical_key}
+
+
+def measure_mcts_search(board_size, simulations=200, num_searches=5, seed=0, rollout_policy=None):
+    """
+    Times MCTS.search from the opening position with an empty Q-table, and the given
+    rollout policy.
+
+    Returns:
+    dict: Median search latency in milliseconds and rollouts per second.
+    """
+    random.seed(seed)
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    latencies = []
+    for _ in range(num_searches):
+        start = time.perf_counter()
+        MCTS(game, {}, simulations=simulations, rollout_policy=rollout_policy).search()
+        latencies.append(time.perf_counter() - start)
+    return {'mcts_search_ms': statistics.median(latencies) * 1000,
+            'mcts_rollouts_per_s': simulations * num_searches / sum(latencies)}
+
+
+def _play_mcts_match(board_size, rollout_policies, simulations=200, num_games=10, seed=0):
+    """
+    Plays MCTS searches with two rollout policies (None for the Q-table policy, with an empty
+    table) against each other, the first one playing 'O', which moves first, in even games.
+
+    Returns:
+    tuple: (wins of the first policy, draws, wins of the second).
+    """
+    random.seed(seed)
+    results = [0, 0, 0]
+    for i in range(num_games):
+        game = TicTacToeGame(QLearningStrategy, board_size)
+        symbols = ('O', 'X') if i % 2 == 0 else ('X', 'O')
+        while not game.is_game_over():
+            search_game = game.copy()
+            search_game.AI_symbol = game.current_player
+            search_game.human_symbol = 'X' if game.current_player == 'O' else 'O'
+            policy = rollout_policies[symbols.index(game.current_player)]
+            game.make_move(MCTS(search_game, QTable(), simulations=simulations, rollout_policy=policy).search())
+        winner = game.get_winner()
+        results[1 if winner is None else 0 if winner == symbols[0] else 2] += 1
+    return tuple(results)
+
+
+def benchmark_rollout_policies(board_size, simulations=200, num_games=10, cutoff_depth=8):
+    """
+    Compares MCTS with the heuristic rollout policy, with and without an early cutoff,
+    against the Q-table policy, which plays at random on an empty table: rollouts per
+    second, and the results of games between searches of the same number of simulations.
+    """
+    policies = (("Q-table", None), ("heuristic", HeuristicRolloutPolicy()),
+                (f"heuristic, cutoff {cutoff_depth}", HeuristicRolloutPolicy(cutoff_depth)))
+    for name, policy in policies:
+        rollouts = measure_mcts_search(board_size, simulations, rollout_policy=policy)['mcts_rollouts_per_s']
+        line = f"{board_size}x{board_size} MCTS rollouts/s, {name}: {rollouts:.0f}"
+        if policy is not None:
+            wins, draws, losses = _play_mcts_match(board_size, (policy, None), simulations, num_games)
+            line += f"; against the Q-table policy: {wins} wins, {draws} draws, {losses} losses"
+        print(line)
+
+
+def measure_best_move(board_size, algorithm_type, num_moves=5, seed=0, mcts_simulations=200):
+    """
+    Times calculate_best_move of a freshly created strategy on the position after the
+    human's first move. QLearning is run with exploration off, so every call searches.
+
+    Returns:
+    float: Median latency in milliseconds.
+    """
+    random.seed(seed)
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    game.make_move(random.choice(game.get_valid_moves()))
+    if algorithm_type == 'QLearning':
+        strategy = QLearningStrategy(game.board, game.AI_symbol, game.human_symbol, exploration_rate=0.0,
+                                     mcts_simulations=mcts_simulations)
+    else:
+        strategy = AlgorithmFactory.create_algorithm(algorithm_type)(game.board, game.AI_symbol, game.human_symbol)
+    latencies = []
+    for _ in range(num_moves):
+        start = time.perf_counter()
+        strategy.calculate_best_move(game)
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies) * 1000
+
+
+def measure_minimax(board_size, max_nodes=2000, num_moves=5, seed=0):
+    """
+    Times MinimaxStrategy.calculate_best_move with a node budget instead of a time budget, so
+    that every run does the same work, on the position after the human's first move. Each
+    move gets a fresh strategy, so the transposition table starts empty. On 3x3 the budget
+    is enough to solve the position.
+
+    Returns:
+    float: Median latency in milliseconds.
+    """
+    random.seed(seed)
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    game.make_move(random.choice(game.get_valid_moves()))
+    latencies = []
+    for _ in range(num_moves):
+        strategy = MinimaxStrategy(game.board, game.AI_symbol, game.human_symbol, time_budget_ms=None,
+                                   max_nodes=max_nodes)
+        start = time.perf_counter()
+        strategy.calculate_best_move(game)
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies) * 1000
+
+
+def benchmark_minimax(board_size, time_budget_ms=500, num_games=2, seed=0):
+    """
+    Plays MinimaxStrategy against random moves and reports its search depth and move latency.
+    """
+    random.seed(seed)
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    strategy = MinimaxStrategy(game.board, game.AI_symbol, game.human_symbol, time_budget_ms=time_budget_ms)
+    latencies = []
+    depths = []
+    results = []
+    for _ in range(num_games):
+        while not game.is_game_over():
+            if game.current_player == game.AI_symbol:
+                start = time.perf_counter()
+                game.make_move(strategy.calculate_best_move(game))
+                latencies.append(time.perf_counter() - start)
+                depths.append(strategy.depth)
+            else:
+                game.make_move(random.choice(game.get_valid_moves()))
+        results.append(game.get_winner() or 'Draw')
+        game.reset_game()
+    print(f"{board_size}x{board_size} Minimax {time_budget_ms}ms budget: mean depth {statistics.mean(depths):.1f}, "
+          f"max latency {max(latencies) * 1000:.1f}ms, results {results}")
+
+
+def measure_opening_book(board_size, num_lookups=20000, seed=0):
+    """
+    Builds a one-ply opening book with a small node budget and times book moves from it.
+
+    Returns:
+    float: Book moves per second.
+    """
+    random.seed(seed)
+    book = generate_book(board_size, 1, time_budget_ms=None, max_nodes=500)
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    game.make_move(random.choice(game.get_valid_moves()))
+    strategy = OpeningBookStrategy(book, None)
+    start = time.perf_counter()
+    for _ in range(num_lookups):
+        strategy.calculate_best_move(game)
+    return num_lookups / (time.perf_counter() - start)
+
+
+def benchmark_opening_book(board_size, max_ply, num_games=20, time_budget_ms=100, seed=0):
+    """
+    Plays QLearning with an empty Q-table, behind an opening book, against random moves and
+    reports the book's hit rate and the latency of book and searched moves.
+    """
+    start = time.perf_counter()
+    book = generate_book(board_size, max_ply, time_budget_ms)
+    generation = time.perf_counter() - start
+
+    random.seed(seed)
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    fallback = QLearningStrategy(game.board, game.AI_symbol, game.human_symbol, exploration_rate=0.0,
+                                 mcts_simulations=200)
+    strategy = OpeningBookStrategy(book, fallback)
+    book_latencies = []
+    search_latencies = []
+    for _ in range(num_games):
+        while not game.is_game_over():
+            if game.current_player == game.AI_symbol:
+                hits = strategy.hits
+                start = time.perf_counter()
+                game.make_move(strategy.calculate_best_move(game))
+                latency = time.perf_counter() - start
+                (book_latencies if strategy.hits > hits else search_latencies).append(latency)
+            else:
+                game.make_move(random.choice(game.get_valid_moves()))
+        game.reset_game()
+    searched = f"{statistics.median(search_latencies) * 1000:.1f}ms" if search_latencies else "-"
+    print(f"{board_size}x{board_size} opening book to ply {max_ply}: {len(book)} positions in {generation:.1f}s, "
+          f"hit rate {strategy.hit_rate():.0%}, book move {statistics.median(book_latencies) * 1e6:.1f}us, "
+          f"searched move {searched}")
+
+
+def _random_games(board_size, count, seed):
+    """
+    Returns count games with a random number of random moves played, none of them finished.
+    """
+    rng = random.Random(seed)
+    games = []
+    while len(games) < count:
+        game = TicTacToeGame(QLearningStrategy, board_size)
+        for _ in range(rng.randrange(board_size * board_size)):
+            game.make_move(rng.choice(game.get_valid_moves()))
+            if game.is_game_over():
+                game.undo_move()
+                break
+        games.append(game)
+    return games
+
+
+def measure_batch_moves(board_size, algorithm_type, batch_size, seed=0, max_scalar=1000):
+    """
+    Times calculate_best_moves on a batch of random positions against picking the same
+    moves one game at a time, with the saved table of the strategy when there is one.
+    QLearning's one-at-a-time path is get_best_action, the greedy table lookup the batch
+    replaces, since calculate_best_move searches with MCTS instead.
+
+    Parameters:
+    max_scalar (int): At most this many positions of the batch are timed one at a time.
+
+    Returns:
+    dict: Positions per second of the one-at-a-time and the batched path.
+    """
+    random.seed(seed)
+    games = _random_games(board_size, batch_size, seed)
+    strategy = AlgorithmFactory.create_algorithm(algorithm_type)(games[0].board, 'X', 'O')
+    filename = get_table_filename(algorithm_type, board_size)
+    if filename is not None:
+        load_strategy(strategy, filename)
+    if algorithm_type == 'QLearning':
+        strategy.exploration_rate = 0.0
+        scalar_move = lambda game: strategy.get_best_action(game, board_to_state(game.board))
+    else:
+        scalar_move = strategy.calculate_best_move
+
+    # One call of each path first, so one-time setup (symmetry maps, NumPy imports) is not timed
+    scalar_move(games[0])
+    strategy.calculate_best_moves(games[:1])
+    scalar_games = games[:max_scalar]
+    start = time.perf_counter()
+    for game in scalar_games:
+        scalar_move(game)
+    scalar = len(scalar_games) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    strategy.calculate_best_moves(games)
+    batched = batch_size / (time.perf_counter() - start)
+    return {'scalar_per_s': scalar, 'batched_per_s': batched}
+
+
+def benchmark_batch_moves(board_size, batch_sizes=(1, 10, 100, 1000, 10000)):
+    for algorithm_type in ('QLearning', 'ValueIteration', 'ReinforcementLearning'):
+        for batch_size in batch_sizes:
+            result = measure_batch_moves(board_size, algorithm_type, batch_size)
+            print(f"{board_size}x{board_size} {algorithm_type} batch of {batch_size}: "
+                  f"{result['scalar_per_s']:.0f} positions/s one at a time, {result['batched_per_s']:.0f} batched "
+                  f"({result['batched_per_s'] / result['scalar_per_s']:.1f}x)")
+
+
+def measure_training(board_size, algorithm_type, num_games=20, seed=0, mcts_simulations=50, asynchronous=False):
+    """
+    Times Run.train_strategy from an empty table, for ValueIteration with prioritized
+    sweeping when asynchronous is set.
+
+    Returns:
+    float: Training games per second.
+    """
+    random.seed(seed)
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    if algorithm_type == 'QLearning':
+        strategy = QLearningStrategy(game.board, game.AI_symbol, game.human_symbol, mcts_simulations=mcts_simulations)
+    elif algorithm_type == 'ValueIteration':
+        strategy = ValueIterationStrategy(game.board, game.AI_symbol, game.human_symbol, asynchronous=asynchronous)
+    else:
+        strategy = AlgorithmFactory.create_algorithm(algorithm_type)(game.board, game.AI_symbol, game.human_symbol)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        train_strategy(game, strategy, num_games, 0.3, algorithm_type)
+    return num_games / (time.perf_counter() - start)
+
+
+def benchmark_value_iteration_training(board_size, num_games=400, report_every=100, seed=0):
+    """
+    Trains ValueIteration with full sweeps and with prioritized sweeping, and reports the
+    time per game spent updating the values as the value table grows.
+    """
+    for asynchronous in (False, True):
+        random.seed(seed)
+        game = TicTacToeGame(QLearningStrategy, board_size)
+        strategy = ValueIterationStrategy(game.board, game.AI_symbol, game.human_symbol, asynchronous=asynchronous)
+        timings = []
+        for _ in range(num_games // report_every):
+            stats = TrainingStats()
+            with contextlib.redirect_stdout(io.StringIO()):
+                train_strategy(game, strategy, report_every, 0.3, 'ValueIteration', stats=stats)
+            timings.append(f"{stats.update_time / report_every * 1000:.2f}ms at {len(strategy.V)} states")
+        name = "prioritized sweeping" if asynchronous else "full sweeps"
+        print(f"{board_size}x{board_size} ValueIteration update per game, {name}: {', '.join(timings)}")
+
+
+def check_threat_blocking():
+    """
+    Checks that ValueIteration blocks an immediate threat, solved by full sweeps and learned
+    by prioritized sweeping: with 'O' on (0, 0) and (0, 1) and 'X' on (1, 1), 'X' must play
+    (0, 2), and the value backed up for the position must be the Q-value of that move, the
+    best one. The prioritized sweeps learn from the five games 'O' wins there after each
+    other reply of 'X'.
+
+    Returns:
+    list: The names of the ways of training that failed, empty when both block.
+    """
+    opening = [(0, 0), (1, 1), (0, 1)]
+    game = TicTacToeGame(QLearningStrategy, 3)
+    for move in opening:
+        game.make_move(move)
+    state = board_to_state(game.board)
+
+    solved = ValueIterationStrategy()
+    solved.solve(3)
+    swept = ValueIterationStrategy()
+    for reply in swept.get_possible_actions(game, state):
+        if reply != (0, 2):
+            history = TicTacToeGame(QLearningStrategy, 3)
+            for move in opening + [reply, (0, 2)]:
+                history.make_move(move)
+            swept.prioritized_sweep(history, max_backups=None)
+
+    failed = []
+    for name, strategy in (("full sweeps", solved), ("prioritized sweeping", swept)):
+        q_values = {action: strategy.compute_q_value(game, state, action)
+                    for action in strategy.get_possible_actions(game, state)}
+        if (max(q_values, key=q_values.get) != (0, 2) or
+                abs(strategy.value(state, 'X') - q_values[(0, 2)]) > 1e-6):
+            failed.append(name)
+    return failed
+
+
+def check_sweep_keeps_solution():
+    """
+    Checks that a full sweep of value_iteration leaves the values of solve() unchanged: both
+    back up each position for its player to move, so the solved 3x3 values are a fixed point
+    of the sweeps, whichever player is to move in the game passed to value_iteration.
+
+    Returns:
+    list: The players to move in the game for which a sweep changed a value, empty when none did.
+    """
+    failed = []
+    game = TicTacToeGame(QLearningStrategy, 3)
+    for move in (None, (1, 1)):
+        if move is not None:
+            game.make_move(move)
+        strategy = ValueIterationStrategy()
+        strategy.solve(3)
+        solved = dict(strategy.V)
+        strategy.value_iteration(game, num_iterations=1)
+        if any(abs(strategy.V[state] - value) > 1e-5 for state, value in solved.items()):
+            failed.append(game.current_player)
+    return failed
+
+
+def _greedy_results(strategy, board_size, num_games=2000, seed=1):
+    """
+    Plays the strategy's best action in its Q-table (get_best_action, no search and no
+    exploration) against a random opponent.
+
+    Returns:
+    tuple: (win rate, loss rate).
+    """
+    rng = random.Random(seed)
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    results = []
+    for _ in range(num_games):
+        while not game.is_game_over():
+            if game.current_player == game.AI_symbol:
+                game.make_move(strategy.get_best_action(game, board_to_state(game.board)))
+            else:
+                game.make_move(rng.choice(game.get_valid_moves()))
+        results.append(game.result)
+        game.reset_game()
+    return results.count(game.AI_symbol) / num_games, results.count(game.human_symbol) / num_games
+
+
+def benchmark_replay_training(board_size=3, checkpoints=(250, 500, 1000, 2000), seeds=(0, 1, 2)):
+    """
+    Compares how fast QLearning's greedy policy improves against a random opponent when
+    trained by the online loop, and with uniform and prioritized experience replay. Every
+    training move explores (exploration_rate stays 1.0), so no MCTS search is run and the
+    times are those of the games and updates alone. At each checkpoint the training time
+    and the greedy policy's loss rate are reported, averaged over the seeds.
+    """
+    for replay in (None, 'uniform', 'prioritized'):
+        times = [0.0] * len(checkpoints)
+        losses = [0.0] * len(checkpoints)
+        for seed in seeds:
+            random.seed(seed)
+            game = TicTacToeGame(QLearningStrategy, board_size)
+            strategy = QLearningStrategy(game.board, game.AI_symbol, game.human_symbol, exploration_decay=1.0)
+            if replay is not None:
+                strategy.replay_buffer = ReplayBuffer(20000, replay == 'prioritized', seed=seed)
+            elapsed = 0.0
+            played = 0
+            for i, episodes in enumerate(checkpoints):
+                start = time.perf_counter()
+                for _ in range(episodes - played):
+                    play_q_learning_episode(game, strategy)
+                elapsed += time.perf_counter() - start
+                played = episodes
+                times[i] += elapsed / len(seeds)
+                losses[i] += _greedy_results(strategy, board_size)[1] / len(seeds)
+        progress = ', '.join(f"{episodes}: {loss:.1%} in {seconds:.2f}s"
+                             for episodes, loss, seconds in zip(checkpoints, losses, times))
+        print(f"{board_size}x{board_size} QLearning loss rate by episodes, {replay or 'online'}: {progress}")
+
+
+def measure_replay(board_size, num_batches=200, seed=0, prioritized=False):
+    """
+    Times QLearningStrategy.replay on a buffer filled by 200 random training games.
+
+    Returns:
+    float: Minibatches replayed per second.
+    """
+    random.seed(seed)
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    strategy = QLearningStrategy(game.board, game.AI_symbol, game.human_symbol, exploration_decay=1.0)
+    strategy.replay_buffer = ReplayBuffer(20000, prioritized, seed=seed)
+    strategy.replay_batch_size = 1 << 30  # Fill the buffer without replaying
+    for _ in range(200):
+        play_q_learning_episode(game, strategy)
+    start = time.perf_counter()
+    for _ in range(num_batches):
+        strategy.replay(32)
+    return num_batches / (time.perf_counter() - start)
+
+
+def measure_peak_memory(board_size, seed=0):
+    """
+    Traces a QLearning training run and an MCTS search, which hold the largest tables and trees.
+
+    Returns:
+    float: Peak traced memory in KiB.
+    """
+    tracemalloc.start()
+    measure_training(board_size, 'QLearning', num_games=10, seed=seed)
+    measure_mcts_search(board_size, num_searches=1, seed=seed)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def run_suite(board_sizes=(3, 5, 7), seed=0, scale=1.0, repeats=3):
+    """
+    Runs every measurement with fixed seeds.
+
+    Parameters:
+    board_sizes (tuple): The board sizes to measure.
+    seed (int): Seed of every measurement.
+    scale (float): Multiplies the iteration counts; below 1 for a quick, noisier run.
+    repeats (int): How many times the suite is run; each metric keeps its best value,
+        which filters out most of the noise of a busy machine.
+
+    Returns:
+    dict: {metric: value}, metric names being '<size>x<size>/<measurement>'. Metrics ending in
+    '_per_s' are better when higher, the others ('_ms', '_kib') when lower.
+    """
+    metrics = {}
+
+    def count(n):
+        return max(1, int(n * scale))
+
+    def record(name, value):
+        if name not in metrics:
+            metrics[name] = value
+        elif name.endswith('_per_s'):
+            metrics[name] = max(metrics[name], value)
+        else:
+            metrics[name] = min(metrics[name], value)
+
+    for _ in range(repeats):
+        for size in board_sizes:
+            prefix = f"{size}x{size}/"
+            for board_type in (GameBoard, BitBoard):
+                for name, value in measure_board_operations(board_type, size, count(20000), seed).items():
+                    record(f"{prefix}{board_type.__name__}.{name}", value)
+            for name, value in measure_mcts_search(size, num_searches=count(5), seed=seed).items():
+                record(prefix + name, value)
+            record(prefix + "heuristic_mcts_rollouts_per_s",
+                   measure_mcts_search(size, num_searches=count(5), seed=seed,
+                                       rollout_policy=HeuristicRolloutPolicy())['mcts_rollouts_per_s'])
+            record(prefix + "anytime_move_p99_ms",
+                   measure_anytime_search(size, num_games=count(2), seed=seed).latency_percentile(99))
+            for algorithm_type in ('QLearning', 'ValueIteration', 'ReinforcementLearning'):
+                record(f"{prefix}{algorithm_type}.best_move_ms", measure_best_move(size, algorithm_type, count(25), seed))
+            record(prefix + "Minimax.best_move_ms", measure_minimax(size, num_moves=count(5), seed=seed))
+            record(prefix + "OpeningBook.moves_per_s", measure_opening_book(size, count(20000), seed))
+            for algorithm_type in ('QLearning', 'ValueIteration', 'ReinforcementLearning'):
+                record(f"{prefix}{algorithm_type}.batch_moves_per_s",
+                       measure_batch_moves(size, algorithm_type, count(1000), seed)['batched_per_s'])
+            for algorithm_type in ('QLearning', 'ValueIteration'):
+                record(f"{prefix}{algorithm_type}.train_episodes_per_s",
+                       measure_training(size, algorithm_type, count(20), seed))
+            record(prefix + "ValueIteration.async_train_episodes_per_s",
+                   measure_training(size, 'ValueIteration', count(20), seed, asynchronous=True))
+            record(prefix + "QLearning.replay_batches_per_s", measure_replay(size, count(200), seed))
+            record(prefix + "QLearning.prioritized_replay_batches_per_s",
+                   measure_replay(size, count(200), seed, prioritized=True))
+            record(prefix + "peak_memory_kib", measure_peak_memory(size, seed))
+    return metrics
+
+
+def find_regressions(metrics, baseline, threshold, min_ms=1.0):
+    """
+    Compares metrics with a baseline run.
+
+    Parameters:
+    metrics (dict): {metric: value}, as returned by run_suite.
+    baseline (dict): The same for the baseline; metrics missing from either side are skipped.
+    threshold (float): The relative slowdown tolerated, e.g. 0.25 for 25%.
+    min_ms (float): Latencies ('_ms' metrics) that grew by less than this many milliseconds are
+        not counted; sub-millisecond timings vary by more than any sensible threshold.
+
+    Returns:
+    list: (metric, baseline value, value, relative change) of every regression beyond threshold.
+    """
+    regressions = []
+    for name, value in metrics.items():
+        if name not in baseline or not baseline[name]:
+            continue
+        change = (value - baseline[name]) / baseline[name]
+        worse = -change if name.endswith('_per_s') else change
+        if name.endswith('_ms') and value - baseline[name] < min_ms:
+            continue
+        if worse > threshold:
+            regressions.append((name, baseline[name], value, change))
+    return regressions
+
+
+def print_reports():
+    """
+    Prints the side-by-side comparisons of the alternative engines and table formats.
+    """
+    for size in (3, 5, 7):
+        compare_board_engines(size)
+    for size in (3, 5, 7):
+        compare_position_keys(size)
+    for size in (3, 5, 7):
+        print(f"{size}x{size} MCTS moves/s (200 simulations): {benchmark_mcts_moves(size):.2f}")
+    benchmark_parallel_mcts()
+    for size in (3, 5, 7):
+        benchmark_transpositions(size)
+    for size in (3, 5, 7):
+        benchmark_rollout_policies(size)
+    for size in (3, 5, 7):
+        benchmark_anytime_mcts(size)
+    for size in (3, 5, 7):
+        benchmark_minimax(size)
+    benchmark_opening_book(3, 9)
+    benchmark_opening_book(5, 2, num_games=5)
+    benchmark_opening_book(7, 1, num_games=2)
+    for size in (3, 5, 7):
+        benchmark_batch_moves(size)
+    for size in (3, 5, 7):
+        benchmark_batch_training(size)
+    benchmark_value_iteration_solver(3)
+    for size in (3, 5, 7):
+        benchmark_value_iteration_training(size)
+    benchmark_replay_training(3)
+    benchmark_value_iteration_solver(5, max_depth=4)
+    for size in (3, 5, 7):
+        benchmark_q_store(f"q_table_{size}x{size}.pkl")
+    benchmark_table_loading()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the boards, search, strategies and training.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3, 5, 7], choices=(3, 5, 7))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the iteration counts")
+    parser.add_argument("--repeats", type=int, default=3, help="runs of the suite, keeping each metric's best")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the results as JSON")
+    parser.add_argument("--baseline", default="benchmark_baseline.json", help="results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.3,
+                        help="relative slowdown of any metric that fails the run (default 0.3)")
+    parser.add_argument("--min-ms", type=float, default=1.0,
+                        help="smallest latency increase in milliseconds counted as a regression (default 1.0)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="add the metrics missing from the baseline, leaving the recorded ones as they are")
+    parser.add_argument("--reset-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--reports", action="store_true",
+                        help="print the engine and table format comparisons instead of running the suite")
+    args = parser.parse_args()
+
+    if args.reports:
+        print_reports()
+        sys.exit(0)
+
+    failed = check_threat_blocking()
+    if failed:
+        print(f"CHECK FAILED: ValueIteration does not block an immediate threat with {' or '.join(failed)}")
+        sys.exit(1)
+    failed = check_sweep_keeps_solution()
+    if failed:
+        print(f"CHECK FAILED: value_iteration changes the solved values with {' and '.join(failed)} to move")
+        sys.exit(1)
+
+    metrics = run_suite(tuple(args.sizes), args.seed, args.scale, args.repeats)
+    results = {'meta': {'python': platform.python_version(), 'machine': platform.machine(),
+                        'seed': args.seed, 'scale': args.scale, 'repeats': args.repeats,
+                        'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+               'metrics': metrics}
+    for name, value in metrics.items():
+        print(f"{name}: {value:.2f}")
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.reset_baseline or (args.update_baseline and baseline is None):
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif args.update_baseline:
+        # Recorded metrics keep the run they were measured in, so that re-recording them
+        # cannot hide a slowdown of existing code
+        added = {name: value for name, value in metrics.items() if name not in baseline['metrics']}
+        baseline['metrics'].update(added)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"{len(added)} new metrics added to {args.baseline}")
+    elif baseline is not None:
+        regressions = find_regressions(metrics, baseline['metrics'], args.threshold, args.min_ms)
+        for name, before, after, change in regressions:
+            print(f"REGRESSION {name}: {before:.2f} -> {after:.2f} ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression beyond {args.threshold:.0%} against {args.baseline}")
+    else:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
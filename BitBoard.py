@@ -0,0 +1,214 @@
+from GameBoard import GameBoard
+
+# Win masks are built once per board size and shared by every BitBoard of that size.
+_WIN_MASKS = {}
+_CELL_WIN_MASKS = {}
+
+
+def get_win_masks(size):
+    """
+    Returns the bitmasks of every winning line on a size x size board.
+
+    Cell (row, col) maps to bit row * size + col. Lines are ordered rows, columns,
+    main diagonal, anti-diagonal, matching the scan order of GameBoard.is_game_over.
+    """
+    masks = _WIN_MASKS.get(size)
+    if masks is None:
+        lines = []
+        for i in range(size):
+            lines.append(sum(1 << (i * size + j) for j in range(size)))
+        for j in range(size):
+            lines.append(sum(1 << (i * size + j) for i in range(size)))
+        lines.append(sum(1 << (i * size + i) for i in range(size)))
+        lines.append(sum(1 << (i * size + size - 1 - i) for i in range(size)))
+        masks = tuple(lines)
+        _WIN_MASKS[size] = masks
+    return masks
+
+
+def get_cell_win_masks(size):
+    """
+    Returns, for every cell index, the win masks of the lines passing through that cell.
+    """
+    cell_masks = _CELL_WIN_MASKS.get(size)
+    if cell_masks is None:
+        lines = get_win_masks(size)
+        cell_masks = tuple(tuple(mask for mask in lines if mask >> cell & 1) for cell in range(size * size))
+        _CELL_WIN_MASKS[size] = cell_masks
+    return cell_masks
+
+
+class BitBoard(GameBoard):
+    """
+    A Tic Tac Toe board that keeps one integer bitmask per player.
+
+    It is a drop-in replacement for GameBoard: the public methods behave the same,
+    the position keys (zobrist_hash, packed_keys) are kept up to date the same way,
+    and the `board` attribute is still available as a 2D list for code that reads or
+    replaces the whole grid.
+
+    Attributes:
+    x_bits (int): Bitmask of the cells taken by 'X'.
+    o_bits (int): Bitmask of the cells taken by 'O'.
+    full_mask (int): Bitmask with every cell of the board set.
+    win_masks (tuple): Bitmasks of every row, column and diagonal.
+    cell_win_masks (tuple): For every cell, the win masks of the lines through it.
+    """
+
+    def __init__(self, size):
+        self.width = size
+        self.height = size
+        self.x_bits = 0
+        self.o_bits = 0
+        self.full_mask = (1 << (size * size)) - 1
+        self.win_masks = get_win_masks(size)
+        self.cell_win_masks = get_cell_win_masks(size)
+        self._init_keys(size)
+
+    @property
+    def board(self):
+        """
+        The board as a 2D list of ' ', 'X' and 'O', built on demand.
+        """
+        x_bits, o_bits = self.x_bits, self.o_bits
+        grid = []
+        bit = 1
+        for _ in range(self.height):
+            row = []
+            for _ in range(self.width):
+                row.append('X' if x_bits & bit else 'O' if o_bits & bit else ' ')
+                bit <<= 1
+            grid.append(row)
+        return grid
+
+    @board.setter
+    def board(self, grid):
+        self.x_bits, self.o_bits = self._encode(grid)
+        self._reset_keys(grid)
+
+    def _encode(self, grid):
+        x_bits = o_bits = 0
+        bit = 1
+        for row in grid:
+            for cell in row:
+                if cell == 'X':
+                    x_bits |= bit
+                elif cell == 'O':
+                    o_bits |= bit
+                bit <<= 1
+        return x_bits, o_bits
+
+    def _player_bits(self, player):
+        if player == 'X':
+            return self.x_bits
+        if player == 'O':
+            return self.o_bits
+        return 0
+
+    def is_winner(self, player):
+        bits = self._player_bits(player)
+        for mask in self.win_masks:
+            if bits & mask == mask:
+                return True
+        return False
+
+    def is_winning_move(self, position, player):
+        bits = self._player_bits(player)
+        for mask in self.cell_win_masks[position[0] * self.width + position[1]]:
+            if bits & mask == mask:
+                return True
+        return False
+
+    def check_winner_on_board(self, board, player):
+        x_bits, o_bits = self._encode(board)
+        bits = x_bits if player == 'X' else o_bits if player == 'O' else 0
+        for mask in self.win_masks:
+            if bits & mask == mask:
+                return True
+        return False
+
+    def is_game_over(self):
+        """
+        Checks if the game is over.
+
+        Returns:
+        str or bool: Returns the winning symbol if there's a winner, 'Draw' if it's a draw, or False otherwise.
+        """
+        x_bits, o_bits = self.x_bits, self.o_bits
+        for mask in self.win_masks:
+            if x_bits & mask == mask:
+                return 'X'
+            if o_bits & mask == mask:
+                return 'O'
+
+        if x_bits | o_bits == self.full_mask:
+            return 'Draw'
+
+        return False
+
+    def get_empty_positions(self):
+        """
+        Returns the positions of the empty cells on the game board, in row-major order.
+
+        Returns:
+        list of tuple: A list containing tuples representing the positions of the empty cells.
+        """
+        width = self.width
+        empty = self.full_mask & ~(self.x_bits | self.o_bits)
+        positions = []
+        while empty:
+            low = empty & -empty
+            positions.append(divmod(low.bit_length() - 1, width))
+            empty ^= low
+        return positions
+
+    def make_move(self, position, symbol):
+        """
+        Makes a move on the board.
+
+        Parameters:
+        position (tuple): The row and column where the move should be made.
+        symbol (str): The symbol ('X' or 'O') to place on the board.
+
+        Returns:
+        bool: True if the symbol was placed, False if the cell was taken or off the board.
+        """
+        row, col = position
+        if 0 <= row < self.width and 0 <= col < self.width:
+            cell = row * self.width + col
+            bit = 1 << cell
+            if not (self.x_bits | self.o_bits) & bit:
+                if symbol == 'X':
+                    self.x_bits |= bit
+                elif symbol == 'O':
+                    self.o_bits |= bit
+                else:
+                    return False
+                zobrist_key, packed_delta = self.key_updates[cell][symbol]
+                self.zobrist_hash ^= zobrist_key
+                self.packed_keys += packed_delta
+                self._state = None
+                return True
+        return False
+
+    def undo_move(self, position):
+        cell = position[0] * self.width + position[1]
+        bit = 1 << cell
+        symbol = 'X' if self.x_bits & bit else 'O' if self.o_bits & bit else None
+        if symbol is not None:
+            self.x_bits &= ~bit
+            self.o_bits &= ~bit
+            zobrist_key, packed_delta = self.key_updates[cell][symbol]
+            self.zobrist_hash ^= zobrist_key
+            self.packed_keys -= packed_delta
+            self._state = None
+
+    def copy(self):
+        """
+        Create a copy of the current game board.
+        """
+        new_board = BitBoard(self.width)
+        new_board.x_bits = self.x_bits
+        new_board.o_bits = self.o_bits
+        new_board._copy_keys(self)
+        return new_board
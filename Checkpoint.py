@@ -0,0 +1,192 @@
+import os
+import pickle
+import time
+from collections import ChainMap
+
+_MISSING = object()
+
+
+class TrackedDict(dict):
+    """
+    A dict that remembers which keys were assigned a new value since the last pop_changes();
+    assigning a key the value it already holds is not a change.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.changed = set()
+
+    def __setitem__(self, key, value):
+        if self.get(key, _MISSING) != value:
+            super().__setitem__(key, value)
+            self.changed.add(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def pop_changes(self):
+        changes = {key: self[key] for key in self.changed}
+        self.changed = set()
+        return changes
+
+
+class CheckpointLog:
+    """
+    An append-only log of table changes.
+
+    Every record is one pickle frame ('delta' or 'full', entries, meta) appended to the
+    file, so writing a checkpoint costs in proportion to the entries that changed. A
+    record cut short by a crash is dropped on the next load. When the log has grown to
+    compact_ratio times its size after the last compaction, it is rewritten as a single
+    'full' record.
+    """
+
+    def __init__(self, filename, compact_ratio=4, min_compact_size=1 << 20):
+        self.filename = filename
+        self.compact_ratio = compact_ratio
+        self.min_compact_size = min_compact_size
+        self.compacted_size = 0
+
+    def load(self):
+        """
+        Replays the log.
+
+        Returns:
+        tuple: The merged {key: value} entries and the meta dict of the last record, or
+        ({}, None) if there is no log.
+        """
+        entries = {}
+        meta = None
+        if not os.path.exists(self.filename):
+            return entries, meta
+        with open(self.filename, 'rb') as f:
+            good_offset = 0
+            while True:
+                try:
+                    kind, record_entries, record_meta = pickle.load(f)
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, TypeError):
+                    # A partially written record at the tail, left by a crash
+                    break
+                if kind == 'full':
+                    entries = dict(record_entries)
+                else:
+                    entries.update(record_entries)
+                meta = record_meta
+                good_offset = f.tell()
+        if good_offset < os.path.getsize(self.filename):
+            with open(self.filename, 'r+b') as f:
+                f.truncate(good_offset)
+        self.compacted_size = good_offset
+        return entries, meta
+
+    def append(self, entries, meta):
+        with open(self.filename, 'ab') as f:
+            pickle.dump(('delta', entries, meta), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def needs_compaction(self):
+        size = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        return size > max(self.compact_ratio * self.compacted_size, self.min_compact_size)
+
+    def compact(self, entries, meta):
+        """
+        Atomically replaces the log with one record holding all entries.
+        """
+        temporary_filename = self.filename + '.tmp'
+        with open(temporary_filename, 'wb') as f:
+            pickle.dump(('full', dict(entries), meta), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_filename, self.filename)
+        self.compacted_size = os.path.getsize(self.filename)
+
+
+class TrainingCheckpoint:
+    """
+    Periodically checkpoints the table of a QLearningStrategy (Q) or ValueIterationStrategy (V)
+    into a CheckpointLog, together with the episode count and exploration rate, and restores
+    them to resume an interrupted training run.
+
+    A checkpoint is written once every `every` episodes or every `seconds` seconds,
+    whichever comes first. The changes of a Q-table are recorded from the creation of the
+    checkpoint until close().
+    """
+
+    def __init__(self, filename, ai_strategy, every=100, seconds=60.0, compact_ratio=4):
+        self.log = CheckpointLog(filename, compact_ratio)
+        self.strategy = ai_strategy
+        self.every = every
+        self.seconds = seconds
+        self.last_episode = 0
+        self.last_time = time.monotonic()
+        self.tracker = None
+        if hasattr(ai_strategy, 'Q'):
+            self.tracker = ai_strategy.Q.track_changes()
+        elif isinstance(ai_strategy.V, ChainMap):
+            # A V read through from a mapped table file (see Run.load_strategy) takes every
+            # write in its front dict, which alone is tracked, so the file is not read in
+            ai_strategy.V.maps[0] = TrackedDict(ai_strategy.V.maps[0])
+        else:
+            ai_strategy.V = TrackedDict(ai_strategy.V)
+
+    def _table(self):
+        return self.strategy.Q if hasattr(self.strategy, 'Q') else self.strategy.V
+
+    def _tracked(self):
+        """
+        Returns the part of the table whose entries are logged: the entries of a V read
+        through from a mapped file are those of its front dict, the file's being loaded
+        anyway before the log is replayed.
+        """
+        table = self._table()
+        return table.maps[0] if isinstance(table, ChainMap) else table
+
+    def _pop_changes(self):
+        table = self._tracked()
+        return table.pop_changes(self.tracker) if self.tracker is not None else table.pop_changes()
+
+    def resume(self):
+        """
+        Applies the logged entries on top of the strategy's table and restores its exploration rate.
+
+        Returns:
+        int: The number of episodes already completed, 0 if there is no checkpoint.
+        """
+        entries, meta = self.log.load()
+        table = self._table()
+        for key, value in entries.items():
+            table[key] = value
+        self._pop_changes()
+        if meta is None:
+            return 0
+        if meta.get('exploration_rate') is not None:
+            self.strategy.exploration_rate = meta['exploration_rate']
+        self.last_episode = meta['episodes']
+        return self.last_episode
+
+    def maybe_save(self, episodes):
+        if episodes - self.last_episode >= self.every or time.monotonic() - self.last_time >= self.seconds:
+            self.save(episodes)
+
+    def save(self, episodes):
+        meta = {'episodes': episodes, 'exploration_rate': getattr(self.strategy, 'exploration_rate', None)}
+        table = self._tracked()
+        changes = self._pop_changes()
+        if self.log.needs_compaction():
+            self.log.compact(table.items(), meta)
+        else:
+            self.log.append(changes, meta)
+        self.last_episode = episodes
+        self.last_time = time.monotonic()
+
+    def close(self):
+        """
+        Stops recording the changes of the Q-table. Closing twice does nothing.
+        """
+        if self.tracker is not None:
+            self.strategy.Q.untrack_changes(self.tracker)
+            self.tracker = None
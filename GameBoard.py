@@ -1,106 +1,272 @@
-class GameBoard:
-    """
-    This class represents a game board for Tic Tac Toe.
-
-    Attributes:
-    board (list): A 2D list representing the game board.
-    size (int): The size of the game board.
-    """
-
-    def __init__(self, size):
-        self.width = size
-        self.height = size
-        # Initialize the board as a 2D list filled with empty spaces (' ')
-        self.board = [[' ' for _ in range(self.width)] for _ in range(self.height)]
-
-    def is_winner(self, player):
-        return self.check_winner_on_board(self.board, player)
-
-    def check_winner_on_board(self, board, player):
-        # Check rows and columns
-        for i in range(self.width):
-            if all([board[i][j] == player for j in range(self.width)]) or \
-               all([board[j][i] == player for j in range(self.width)]):
-                return True
-
-        # Check diagonals
-        if all([board[i][i] == player for i in range(self.width)]) or \
-           all([board[i][self.width - 1 - i] == player for i in range(self.width)]):
-            return True
-
-        return False
-
-    def print_board(self):
-        """
-        Prints the current state of the game board.
-        """
-        for row in self.board:
-            print('|'.join(row))
-            print('-' * (2 * self.width - 1))
-
-    def is_game_over(self):
-        """
-        Checks if the game is over.
-
-        Returns:
-        str or bool: Returns the winning symbol if there's a winner, 'Draw' if it's a draw, or False otherwise.
-        """
-        for row in self.board:
-            if len(set(row)) == 1 and row[0] != ' ':
-                return row[0]
-
-        for col in range(self.width):
-            column = [self.board[row][col] for row in range(self.width)]
-            if len(set(column)) == 1 and column[0] != ' ':
-                return column[0]
-
-        diagonal1 = [self.board[i][i] for i in range(self.width)]
-        if len(set(diagonal1)) == 1 and diagonal1[0] != ' ':
-            return diagonal1[0]
-
-        diagonal2 = [self.board[i][self.width - 1 - i] for i in range(self.width)]
-        if len(set(diagonal2)) == 1 and diagonal2[0] != ' ':
-            return diagonal2[0]
-
-        if all(cell != ' ' for row in self.board for cell in row):
-            return 'Draw'
-
-        return False
-
-    def get_empty_positions(self):
-        """
-        Returns the positions of the empty cells on the game board.
-
-        Returns:
-        list of tuple: A list containing tuples representing the positions of the empty cells.
-        """
-        positions = []
-        for i in range(self.width):
-            for j in range(self.width):
-                if self.board[i][j] == ' ':
-                    positions.append((i, j))
-        return positions
-
-    def make_move(self, position, symbol):
-        """
-        Makes a move on the board.
-
-        Parameters:
-        position (tuple): The row and column where the move should be made.
-        symbol (str): The symbol ('X' or 'O') to place on the board.
-        """
-        if 0 <= position[0] < self.width and 0 <= position[1] < self.width:
-            if self.board[position[0]][position[1]] == ' ':
-                self.board[position[0]][position[1]] = symbol
-
-    def undo_move(self, position):
-        self.board[position[0]][position[1]] = ' '  # assuming ' ' represents an empty cell
-
-    def copy(self):
-        """
-        Create a deep copy of the current game board.
-        """
-        new_board = GameBoard(self.width)
-        new_board.board = [row.copy() for row in self.board]
-
-        return new_board
+from Utils import get_symmetry_maps, get_zobrist_keys
+
+# Key updates are built once per board size and shared by every board of that size.
+_KEY_UPDATES = {}
+
+
+def get_key_field_width(size):
+    """
+    Returns the bits taken by each of the 8 symmetric keys packed into GameBoard.packed_keys.
+    """
+    return (3 ** (size * size)).bit_length()
+
+
+def get_key_updates(size):
+    """
+    Returns what placing a stone changes in the position keys of a size x size board.
+
+    Returns:
+    tuple: For every cell index, {symbol: (zobrist_key, packed_delta)}. The packed delta
+    holds, in field t, the stone's base-3 digit (1 for 'O', 2 for 'X', see
+    Utils.encode_state) at the position the cell moves to under symmetry t of
+    Utils.get_symmetry_maps, so one addition updates all 8 symmetric keys.
+    """
+    updates = _KEY_UPDATES.get(size)
+    if updates is None:
+        cells = size * size
+        width = get_key_field_width(size)
+        forward = get_symmetry_maps(size)[0]
+        zobrist = get_zobrist_keys(size)
+        updates = tuple({symbol: (zobrist[cell][side],
+                                  sum(digit * 3 ** (cells - 1 - cells_to[cell]) << transform * width
+                                      for transform, cells_to in enumerate(forward)))
+                         for side, (symbol, digit) in enumerate((('X', 2), ('O', 1)))}
+                        for cell in range(cells))
+        _KEY_UPDATES[size] = updates
+    return updates
+
+
+class GameBoard:
+    """
+    This class represents a game board for Tic Tac Toe.
+
+    The board keeps keys of its position up to date as moves are made and undone, with an
+    XOR and an addition per move, so reading them never takes a pass over the grid.
+
+    Attributes:
+    board (list): A 2D list representing the game board. Assigning a new grid recomputes
+        the keys; cells must only be changed with make_move and undo_move.
+    size (int): The size of the game board.
+    zobrist_hash (int): 64-bit Zobrist hash of the position (see Utils.get_zobrist_keys).
+    packed_keys (int): The base-3 keys (Utils.encode_state) of the position under each of
+        the 8 symmetries, packed into one integer; read them with symmetric_keys,
+        state_key and canonical_key().
+    """
+
+    def __init__(self, size):
+        self.width = size
+        self.height = size
+        self._init_keys(size)
+        # Initialize the board as a 2D list filled with empty spaces (' ')
+        self.board = [[' ' for _ in range(self.width)] for _ in range(self.height)]
+
+    def _init_keys(self, size):
+        """
+        Sets up the keys of an empty size x size board.
+        """
+        self.key_updates = get_key_updates(size)
+        self.key_field_width = get_key_field_width(size)
+        self.key_field_mask = (1 << self.key_field_width) - 1
+        self.key_field_shifts = tuple(range(0, 8 * self.key_field_width, self.key_field_width))
+        self._state = None
+        self.zobrist_hash = 0
+        self.packed_keys = 0
+
+    @property
+    def board(self):
+        return self._grid
+
+    @board.setter
+    def board(self, grid):
+        self._grid = grid
+        self._reset_keys(grid)
+
+    def _reset_keys(self, grid):
+        self._state = None
+        self.zobrist_hash = 0
+        self.packed_keys = 0
+        for cell, symbol in enumerate(symbol for row in grid for symbol in row):
+            if symbol != ' ':
+                zobrist_key, packed_delta = self.key_updates[cell][symbol]
+                self.zobrist_hash ^= zobrist_key
+                self.packed_keys += packed_delta
+
+    def _copy_keys(self, other):
+        self._state = other._state
+        self.zobrist_hash = other.zobrist_hash
+        self.packed_keys = other.packed_keys
+
+    @property
+    def state(self):
+        """
+        The position as a state string, as built by Utils.board_to_state, kept until the next move.
+        """
+        if self._state is None:
+            self._state = ''.join([''.join(row) for row in self.board])
+        return self._state
+
+    @property
+    def symmetric_keys(self):
+        """
+        The base-3 keys of the position under each of the 8 symmetries, the first being state_key.
+        """
+        packed = self.packed_keys
+        mask = self.key_field_mask
+        return tuple([packed >> shift & mask for shift in self.key_field_shifts])
+
+    @property
+    def state_key(self):
+        """
+        The base-3 integer key of the position, encode_state(state).
+        """
+        return self.packed_keys & self.key_field_mask
+
+    def canonical_key(self):
+        """
+        Returns the key of the position's symmetry class without building any state string.
+
+        Returns:
+        tuple: (canonical key, transform), the key being encode_state of the canonical
+        state and transform the symmetry that yields it, as Utils.canonicalize_state returns.
+        """
+        packed = self.packed_keys
+        mask = self.key_field_mask
+        keys = [packed >> shift & mask for shift in self.key_field_shifts]
+        key = min(keys)
+        return key, keys.index(key)
+
+    def is_winner(self, player):
+        return self.check_winner_on_board(self._grid, player)
+
+    def check_winner_on_board(self, board, player):
+        # Check rows and columns
+        for i in range(self.width):
+            if all([board[i][j] == player for j in range(self.width)]) or \
+               all([board[j][i] == player for j in range(self.width)]):
+                return True
+
+        # Check diagonals
+        if all([board[i][i] == player for i in range(self.width)]) or \
+           all([board[i][self.width - 1 - i] == player for i in range(self.width)]):
+            return True
+
+        return False
+
+    def is_winning_move(self, position, player):
+        """
+        Checks only the row, column and diagonals through the given position.
+
+        Parameters:
+        position (tuple): The row and column of the last move.
+        player (str): The symbol that was placed there.
+
+        Returns:
+        bool: True if one of those lines is completely filled by player.
+        """
+        row, col = position
+        board = self._grid
+        n = self.width
+        if all(board[row][j] == player for j in range(n)) or all(board[i][col] == player for i in range(n)):
+            return True
+        if row == col and all(board[i][i] == player for i in range(n)):
+            return True
+        if row + col == n - 1 and all(board[i][n - 1 - i] == player for i in range(n)):
+            return True
+        return False
+
+    def print_board(self):
+        """
+        Prints the current state of the game board.
+        """
+        for row in self.board:
+            print('|'.join(row))
+            print('-' * (2 * self.width - 1))
+
+    def is_game_over(self):
+        """
+        Checks if the game is over.
+
+        Returns:
+        str or bool: Returns the winning symbol if there's a winner, 'Draw' if it's a draw, or False otherwise.
+        """
+        board = self._grid
+        for row in board:
+            if len(set(row)) == 1 and row[0] != ' ':
+                return row[0]
+
+        for col in range(self.width):
+            column = [board[row][col] for row in range(self.width)]
+            if len(set(column)) == 1 and column[0] != ' ':
+                return column[0]
+
+        diagonal1 = [board[i][i] for i in range(self.width)]
+        if len(set(diagonal1)) == 1 and diagonal1[0] != ' ':
+            return diagonal1[0]
+
+        diagonal2 = [board[i][self.width - 1 - i] for i in range(self.width)]
+        if len(set(diagonal2)) == 1 and diagonal2[0] != ' ':
+            return diagonal2[0]
+
+        if all(cell != ' ' for row in board for cell in row):
+            return 'Draw'
+
+        return False
+
+    def get_empty_positions(self):
+        """
+        Returns the positions of the empty cells on the game board.
+
+        Returns:
+        list of tuple: A list containing tuples representing the positions of the empty cells.
+        """
+        board = self._grid
+        positions = []
+        for i in range(self.width):
+            for j in range(self.width):
+                if board[i][j] == ' ':
+                    positions.append((i, j))
+        return positions
+
+    def make_move(self, position, symbol):
+        """
+        Makes a move on the board.
+
+        Parameters:
+        position (tuple): The row and column where the move should be made.
+        symbol (str): The symbol ('X' or 'O') to place on the board.
+
+        Returns:
+        bool: True if the symbol was placed, False if the cell was taken or off the board.
+        """
+        row, col = position
+        if 0 <= row < self.width and 0 <= col < self.width:
+            grid_row = self._grid[row]
+            if grid_row[col] == ' ':
+                grid_row[col] = symbol
+                zobrist_key, packed_delta = self.key_updates[row * self.width + col][symbol]
+                self.zobrist_hash ^= zobrist_key
+                self.packed_keys += packed_delta
+                self._state = None
+                return True
+        return False
+
+    def undo_move(self, position):
+        row, col = position
+        grid_row = self._grid[row]
+        symbol = grid_row[col]
+        if symbol != ' ':
+            grid_row[col] = ' '  # assuming ' ' represents an empty cell
+            zobrist_key, packed_delta = self.key_updates[row * self.width + col][symbol]
+            self.zobrist_hash ^= zobrist_key
+            self.packed_keys -= packed_delta
+            self._state = None
+
+    def copy(self):
+        """
+        Create a deep copy of the current game board.
+        """
+        new_board = GameBoard(self.width)
+        new_board._grid = [row.copy() for row in self._grid]
+        new_board._copy_keys(self)
+
+        return new_board
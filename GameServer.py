@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import itertools
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from AlgorithmFactory import AlgorithmFactory
+from GameFactory import GameFactory
+from Run import get_table_filename, load_strategy
+from Utils import board_to_state
+
+# Protocol: one JSON object per line in each direction. Every request may carry an "id",
+# echoed in its response, so a client can pipeline requests on one connection.
+#   {"op": "new", "size": 3, "algorithm": "QLearning"}
+#       -> {"ok": true, "session": 1, "board": "         ", "result": null}
+#   {"op": "move", "session": 1, "row": 1, "col": 1}
+#       -> {"ok": true, "ai_move": [0, 0], "board": "X   O    ", "result": null}
+#          result is null while the game runs, then "X", "O" or "Draw"; the human plays 'O'
+#          and moves first, and ai_move is null if the human's move ended the game
+#   {"op": "close", "session": 1} -> {"ok": true}
+# Errors are answered with {"ok": false, "error": "..."}.
+
+# The strategies of the current executor process, by (board size, algorithm, MCTS budget)
+_process_strategies = {}
+
+
+def create_strategy(board_size, algorithm_type, mcts_time_budget_ms):
+    """
+    Creates the strategy playing the AI of a board size and algorithm, and loads its table.
+    QLearning plays greedily (no exploration), with MCTS limited to mcts_time_budget_ms per
+    move, or with mcts_time_budget_ms 0 straight from its Q-table.
+
+    Returns:
+    tuple: The strategy, and whether it picks the moves of a batch with calculate_best_moves.
+    """
+    strategy = AlgorithmFactory.create_algorithm(algorithm_type)(None, 'X', 'O')
+    filename = get_table_filename(algorithm_type, board_size)
+    if filename is not None:
+        load_strategy(strategy, filename)
+    batched = hasattr(strategy, 'calculate_best_moves')
+    if algorithm_type == 'QLearning':
+        strategy.exploration_rate = 0.0
+        strategy.mcts_time_budget_ms = mcts_time_budget_ms
+        batched = not mcts_time_budget_ms
+    return strategy, batched
+
+
+def _best_moves(board_size, algorithm_type, mcts_time_budget_ms, games):
+    """
+    Picks the AI moves of a batch of games in an executor process, with the process's own
+    strategy of their kind, created and its table loaded for the first batch of that kind.
+    """
+    key = (board_size, algorithm_type, mcts_time_budget_ms)
+    if key not in _process_strategies:
+        _process_strategies[key] = create_strategy(*key)
+    strategy, batched = _process_strategies[key]
+    if batched:
+        return strategy.calculate_best_moves(games)
+    return [strategy.calculate_best_move(game) for game in games]
+
+
+class MoveBatcher:
+    """
+    Gathers the AI move requests of one board size and algorithm into batches.
+
+    A batch is evaluated when it reaches max_batch games or max_delay seconds after its
+    first request, whichever comes first. Batches run in a process pool executor, where
+    every worker process keeps its own strategy of each kind (see _best_moves), so the
+    searches neither hold the event loop's GIL nor wait for each other: the batches of one
+    strategy run concurrently, up to one per process. With batched set, a whole batch is
+    passed to the strategy's calculate_best_moves, which scores all its positions at once.
+    """
+
+    def __init__(self, board_size, algorithm_type, executor, max_batch=64, max_delay=0.002,
+                 mcts_time_budget_ms=20):
+        self.board_size = board_size
+        self.algorithm_type = algorithm_type
+        self.mcts_time_budget_ms = mcts_time_budget_ms
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pending = []
+        self.flush_handle = None
+        self.batches = 0
+        self.moves = 0
+
+    async def best_move(self, game):
+        """
+        Returns the strategy's move on game. The game is copied, so the caller may keep using it.
+        """
+        future = asyncio.get_running_loop().create_future()
+        game = game.copy()
+        game.AI = None  # Not needed to pick the move, and left out of the batch sent to the executor
+        self.pending.append((game, future))
+        if len(self.pending) >= self.max_batch:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.ensure_future(self._evaluate(batch))
+
+    async def _evaluate(self, batch):
+        try:
+            moves = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _best_moves, self.board_size, self.algorithm_type, self.mcts_time_budget_ms,
+                [game for game, _ in batch])
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        self.batches += 1
+        self.moves += len(batch)
+        for (_, future), move in zip(batch, moves):
+            if not future.done():
+                future.set_result(move)
+
+
+class GameServer:
+    """
+    Hosts many concurrent games over the JSON-lines protocol above.
+
+    The AI moves are picked by a pool of worker processes. Each of them creates the strategy
+    of a board size and algorithm, and loads its table, the first time it gets a batch of
+    that kind, and then uses it for every game of that kind (see create_strategy).
+    """
+
+    def __init__(self, max_batch=64, max_delay=0.002, workers=4, mcts_time_budget_ms=20):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.mcts_time_budget_ms = mcts_time_budget_ms
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.batchers = {}  # (board size, algorithm) -> MoveBatcher
+        self.sessions = {}  # session id -> (TicTacToeGame, MoveBatcher of its strategy)
+        self.session_ids = itertools.count(1)
+
+    def _batcher(self, board_size, algorithm_type):
+        batcher = self.batchers.get((board_size, algorithm_type))
+        if batcher is None:
+            AlgorithmFactory.create_algorithm(algorithm_type)  # Raises ValueError for an unknown algorithm
+            batcher = self.batchers[(board_size, algorithm_type)] = MoveBatcher(
+                board_size, algorithm_type, self.executor, self.max_batch, self.max_delay, self.mcts_time_budget_ms)
+        return batcher
+
+    async def handle_request(self, request, owned_sessions):
+        op = request.get('op')
+        if op == 'new':
+            board_size = int(request.get('size', 3))
+            algorithm_type = request.get('algorithm', 'QLearning')
+            if board_size not in (3, 5, 7):
+                raise ValueError(f"Board size {board_size} not supported.")
+            batcher = self._batcher(board_size, algorithm_type)
+            game = GameFactory.create_game('TicTacToe', algorithm_type, board_size)
+            session = next(self.session_ids)
+            self.sessions[session] = (game, batcher)
+            owned_sessions.add(session)
+            return {'ok': True, 'session': session, 'board': board_to_state(game.board), 'result': None}
+
+        if op == 'move':
+            if request.get('session') not in self.sessions:
+                raise ValueError("Unknown session.")
+            game, batcher = self.sessions[request['session']]
+            move = (int(request['row']), int(request['col']))
+            if game.is_game_over() or game.current_player != game.human_symbol:
+                raise ValueError("It is not your turn.")
+            if move not in game.get_valid_moves():
+                raise ValueError("Invalid move.")
+            game.make_move(move)
+            ai_move = None
+            if not game.is_game_over():
+                # It is the AI's turn while the batch is evaluated, so a pipelined move on this
+                # session is refused until the reply is made
+                ai_move = await batcher.best_move(game)
+                game.make_move(ai_move)
+                ai_move = list(ai_move)
+            return {'ok': True, 'ai_move': ai_move, 'board': board_to_state(game.board), 'result': game.result}
+
+        if op == 'close':
+            session = request.get('session')
+            self.sessions.pop(session, None)
+            owned_sessions.discard(session)
+            return {'ok': True}
+
+        raise ValueError(f"Unknown op {op!r}.")
+
+    async def _respond(self, writer, request, owned_sessions):
+        try:
+            response = await self.handle_request(request, owned_sessions)
+        except Exception as error:
+            # Any failure, e.g. of a worker process, is answered rather than dropping the request
+            response = {'ok': False, 'error': str(error) or type(error).__name__}
+        if 'id' in request:
+            response['id'] = request['id']
+        writer.write((json.dumps(response) + '\n').encode())
+
+    async def handle_connection(self, reader, writer):
+        owned_sessions = set()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request must be a JSON object.")
+                except ValueError as error:
+                    writer.write((json.dumps({'ok': False, 'error': str(error)}) + '\n').encode())
+                    continue
+                task = asyncio.ensure_future(self._respond(writer, request, owned_sessions))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                await writer.drain()
+            if tasks:
+                await asyncio.gather(*tasks)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            # The games of a closed connection are dropped
+            for session in owned_sessions:
+                self.sessions.pop(session, None)
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, unix_path=None):
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Tic Tac Toe games over a JSON-lines socket protocol.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--batch-size", type=int, default=64, help="largest batch of AI moves evaluated at once")
+    parser.add_argument("--batch-delay-ms", type=float, default=2.0, help="longest wait for a batch to fill")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes evaluating batches")
+    parser.add_argument("--mcts-time-budget-ms", type=float, default=20,
+                        help="QLearning's MCTS budget per move; a batch of n moves takes n times as long. "
+                             "0 plays from the Q-table without searching, a whole batch at once")
+    args = parser.parse_args()
+
+    game_server = GameServer(args.batch_size, args.batch_delay_ms / 1000, args.workers, args.mcts_time_budget_ms)
+    print(f"Serving on {args.unix or f'{args.host}:{args.port}'}")
+    try:
+        asyncio.run(game_server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
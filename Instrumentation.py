@@ -0,0 +1,189 @@
+import cProfile
+import contextlib
+import json
+import math
+import random
+import time
+from abc import ABC, abstractmethod
+
+
+class Stats(ABC):
+    """
+    Base of the statistics objects filled in by instrumented runs.
+
+    The counters are read with as_dict(). With an emit_file (any writable text stream),
+    maybe_emit() also writes them as one JSON line at most every emit_seconds seconds.
+    """
+    kind = None
+
+    def __init__(self, emit_file=None, emit_seconds=10.0):
+        self.emit_file = emit_file
+        self.emit_seconds = emit_seconds
+        self.last_emit = time.monotonic()
+
+    @abstractmethod
+    def as_dict(self):
+        pass
+
+    def maybe_emit(self):
+        if self.emit_file is not None and time.monotonic() - self.last_emit >= self.emit_seconds:
+            self.emit()
+
+    def emit(self):
+        record = {'kind': self.kind, 'time': time.time()}
+        record.update(self.as_dict())
+        self.emit_file.write(json.dumps(record) + '\n')
+        self.emit_file.flush()
+        self.last_emit = time.monotonic()
+
+
+class SearchStats(Stats):
+    """
+    Counters and timers of MCTS searches, accumulated over every search given this object.
+
+    Times are in seconds, summed over all simulations (and over all workers of a
+    root-parallel search). max_depth is the deepest tree node reached; q_lookups and
+    q_hits count the rollout positions looked up in the Q-table and those found.
+    reused_nodes and reused_visits count the subtrees kept between moves by MCTS.advance,
+    and search_latencies holds the wall-clock time of every search, or past latency_samples
+    searches, a uniform sample of latency_samples of them (see record_latency).
+    """
+    kind = 'search'
+    _COUNTERS = ('searches', 'simulations', 'select_time', 'expand_time', 'simulate_time', 'backprop_time',
+                 'nodes_allocated', 'q_lookups', 'q_hits', 'reused_nodes', 'reused_visits')
+
+    def __init__(self, emit_file=None, emit_seconds=10.0, latency_samples=1024):
+        super().__init__(emit_file, emit_seconds)
+        self.searches = 0
+        self.simulations = 0
+        self.select_time = 0.0
+        self.expand_time = 0.0
+        self.simulate_time = 0.0
+        self.backprop_time = 0.0
+        self.max_depth = 0
+        self.nodes_allocated = 0
+        self.q_lookups = 0
+        self.q_hits = 0
+        self.reused_nodes = 0
+        self.reused_visits = 0
+        self.latency_samples = latency_samples
+        self.latency_count = 0
+        self.search_latencies = []
+        self._sorted_latencies = None  # search_latencies sorted, until the next record_latency
+        # Own generator, so that sampling does not move the random module of seeded runs
+        self._latency_random = random.Random(0)
+
+    def record_latency(self, seconds):
+        """
+        Records the wall-clock time of a search. Once latency_samples latencies are kept, the
+        n-th search replaces a random one of them with probability latency_samples / n
+        (reservoir sampling), so memory and the cost of a percentile stay bounded.
+        """
+        self.latency_count += 1
+        if len(self.search_latencies) < self.latency_samples:
+            self.search_latencies.append(seconds)
+        else:
+            slot = self._latency_random.randrange(self.latency_count)
+            if slot >= self.latency_samples:
+                return
+            self.search_latencies[slot] = seconds
+        self._sorted_latencies = None
+
+    def q_hit_rate(self):
+        return self.q_hits / self.q_lookups if self.q_lookups else 0.0
+
+    def latency_percentile(self, percentile):
+        """
+        Returns the given percentile (0-100) of the search latencies in milliseconds,
+        nearest rank, 0 before the first search.
+        """
+        if not self.search_latencies:
+            return 0.0
+        if self._sorted_latencies is None:
+            self._sorted_latencies = sorted(self.search_latencies)
+        latencies = self._sorted_latencies
+        rank = max(math.ceil(percentile / 100 * len(latencies)), 1)
+        return latencies[rank - 1] * 1000
+
+    def merge(self, counters):
+        """
+        Adds the counters of another search, as returned by its as_dict().
+        """
+        for name in self._COUNTERS:
+            setattr(self, name, getattr(self, name) + counters[name])
+        self.max_depth = max(self.max_depth, counters['max_depth'])
+
+    def as_dict(self):
+        counters = {name: getattr(self, name) for name in self._COUNTERS}
+        counters['max_depth'] = self.max_depth
+        counters['q_hit_rate'] = self.q_hit_rate()
+        counters['p50_search_ms'] = self.latency_percentile(50)
+        counters['p99_search_ms'] = self.latency_percentile(99)
+        return counters
+
+
+class TrainingStats(Stats):
+    """
+    Progress of a Run.train_strategy run: episodes played, the strategy's table size
+    and the time spent updating it (QLearning's update_q_value, ValueIteration's
+    value_iteration, or the batched trainer's steps).
+    """
+    kind = 'training'
+
+    def __init__(self, emit_file=None, emit_seconds=10.0):
+        super().__init__(emit_file, emit_seconds)
+        self.episodes = 0
+        self.updates = 0
+        self.update_time = 0.0
+        self.table_size_start = None
+        self.table_size = 0
+        self.start_time = time.perf_counter()
+        self.elapsed = 0.0
+
+    def record_episodes(self, episodes, table_size):
+        if self.table_size_start is None:
+            self.table_size_start = table_size
+        self.episodes += episodes
+        self.table_size = table_size
+        self.elapsed = time.perf_counter() - self.start_time
+        self.maybe_emit()
+
+    def timed(self, function):
+        """
+        Returns function wrapped to add its running time to update_time.
+        """
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.update_time += time.perf_counter() - start
+                self.updates += 1
+        return timed_function
+
+    def as_dict(self):
+        return {'episodes': self.episodes,
+                'elapsed': self.elapsed,
+                'episodes_per_second': self.episodes / self.elapsed if self.elapsed else 0.0,
+                'updates': self.updates,
+                'update_time': self.update_time,
+                'table_size': self.table_size,
+                'table_growth': self.table_size - (self.table_size_start or 0)}
+
+
+@contextlib.contextmanager
+def profiled(filename):
+    """
+    Runs the body under cProfile and dumps the profile to filename, for pstats or snakeviz.
+    With filename None the body runs unprofiled.
+    """
+    if filename is None:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(filename)
@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+
+async def _play_games(reader, writer, board_size, algorithm_type, num_games, rng, latencies, results):
+    """
+    Plays num_games games one after the other on one connection, making random human moves.
+    """
+    async def call(request):
+        writer.write((json.dumps(request) + '\n').encode())
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+        return response
+
+    for _ in range(num_games):
+        response = await call({'op': 'new', 'size': board_size, 'algorithm': algorithm_type})
+        session = response['session']
+        board = response['board']
+        while response['result'] is None:
+            cell = rng.choice([i for i, symbol in enumerate(board) if symbol == ' '])
+            start = time.perf_counter()
+            response = await call({'op': 'move', 'session': session, 'row': cell // board_size,
+                                   'col': cell % board_size})
+            latencies.append(time.perf_counter() - start)
+            board = response['board']
+        results.append(response['result'])
+        await call({'op': 'close', 'session': session})
+
+
+async def run_load(connections=50, games_per_connection=10, board_size=3, algorithm_type='QLearning',
+                   host='127.0.0.1', port=8765, unix_path=None, seed=0):
+    """
+    Opens the given number of connections to a GameServer and plays games on all of them at once.
+
+    Returns:
+    dict: games, moves, elapsed seconds, games and moves per second, move latency
+    percentiles in milliseconds and the count of each result.
+    """
+    latencies = []
+    results = []
+
+    async def client(index):
+        if unix_path is not None:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        try:
+            await _play_games(reader, writer, board_size, algorithm_type, games_per_connection,
+                              random.Random(seed + index), latencies, results)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(connections)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {'games': len(results),
+            'moves': len(latencies),
+            'elapsed': elapsed,
+            'games_per_second': len(results) / elapsed,
+            'moves_per_second': len(latencies) / elapsed,
+            'p50_ms': quantiles[49] * 1000,
+            'p95_ms': quantiles[94] * 1000,
+            'p99_ms': quantiles[98] * 1000,
+            'results': {result: results.count(result) for result in sorted(set(results))}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play many concurrent random games against a GameServer.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--games", type=int, default=10, help="games played one after the other per connection")
+    parser.add_argument("--size", type=int, default=3, choices=(3, 5, 7))
+    parser.add_argument("--algorithm", default="QLearning")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args.connections, args.games, args.size, args.algorithm,
+                                  args.host, args.port, args.unix, args.seed))
+    print(json.dumps(report, indent=2))
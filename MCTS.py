@@ -1,80 +1,483 @@
-from Node import Node
-import math
-import random
-from Utils import board_to_state
-
-
-
-class MCTS:
-    def __init__(self, game, q_table, simulations=1000, C=1.4):
-        self.root = Node(game)
-        self.game = game
-        self.q_table = q_table
-        self.simulations = simulations
-        self.C = C  # Exploration factor for UCB1
-
-    def search(self):
-        for _ in range(self.simulations):
-            node = self._select(self.root)
-            if not node.children and not node.game_state.is_game_over():
-                node = self._expand(node)
-            result = self._simulate(node)
-            self._backpropagate(node, result)
-        return self._best_move(self.root)
-
-    def _ucb1(self, node):
-        if node.visits == 0:
-            return float('inf')  # Prioritize unexplored nodes
-        return node.value / node.visits + self.C * math.sqrt(math.log(node.parent.visits) / node.visits)
-
-    def _select(self, node):
-        while node.children:
-            node = max(node.children, key=self._ucb1)
-        return node
-
-    def _expand(self, node):
-        for move in self.game.get_valid_moves():
-            if move not in [child.move for child in node.children]:
-                child_game_state = node.game_state.copy()
-                child_game_state.make_move(move)
-                child_node = Node(child_game_state, parent=node)
-                node.children.append(child_node)
-        return random.choice(node.children)  # Return a random child node
-
-    def _simulate(self, node):
-        current_game_state = node.game_state.copy()
-        while not current_game_state.is_game_over():
-            state = board_to_state(current_game_state.board)
-            if state in self.q_table:
-                # Use the Q-values to select the best move
-                move = max(self.q_table[state], key=self.q_table[state].get)
-            else:
-                # If the state is not in the Q-table, select a move randomly
-                move = random.choice(current_game_state.get_valid_moves())
-            current_game_state.make_move(move)
-
-        # Determine the outcome of the game
-        winner = current_game_state.get_winner()
-        if winner == self.game.AI_symbol:
-            return 1
-        elif winner == self.game.human_symbol:
-            return -1
-        else:  # Draw
-            return 0
-
-    def _backpropagate(self, node, result):
-        while node:  # while node is not None
-            node.visits += 1
-            node.value += result
-            node = node.parent  # move up to the parent
-
-    def _best_move(self, node):
-        """
-        Determines the best move from the root node.
-        Returns the move associated with the child node with the most visits.
-        """
-        sorted_children = sorted(node.children, key=lambda child: child.visits, reverse=True)
-        if not sorted_children:
-            return None
-        return sorted_children[0].move
-
+from Node import Node
+import itertools
+import math
+import multiprocessing
+import random
+import time
+import weakref
+from collections import OrderedDict
+from Instrumentation import SearchStats
+from QTable import QTable
+from Utils import inverse_transform_action, transform_action
+
+
+def _search_worker(q_table, game, settings, seed, instrument=False, deadline=None):
+    """
+    Runs one independent MCTS tree in a worker process, until deadline (a time.monotonic()
+    value, which is system-wide) if one is given.
+
+    Returns:
+    tuple: (move, visits, value) for every child of the root, the worker's transposition
+    table lookups and hits, and its SearchStats counters if instrument is set, else None.
+    """
+    random.seed(seed)
+    mcts = MCTS(game, q_table, stats=SearchStats() if instrument else None, **settings)
+    mcts._run_simulations(mcts.simulations, deadline)
+    root = mcts.root
+    root_children = [(move, child.visits, child.value) for move, child in zip(root.moves, root.children)]
+    return root_children, mcts.tt_lookups, mcts.tt_hits, mcts.stats.as_dict() if instrument else None
+
+
+def _pool_worker(connection, q_table):
+    """
+    Worker process of a SearchPool: keeps its copy of the Q-table and runs one search per
+    message.
+
+    Each message from the pool is (game, settings, seed, instrument, deadline, changes),
+    changes being the Q-table entries set since the previous search, as {key: value};
+    None stops the worker.
+    """
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        game, settings, seed, instrument, deadline, changes = message
+        if changes:
+            for key, value in changes.items():
+                q_table[key] = value
+        connection.send(_search_worker(q_table, game, settings, seed, instrument, deadline))
+    connection.close()
+
+
+class SearchPool:
+    """
+    Worker processes for root-parallel MCTS searches, kept from one search to the next.
+
+    The Q-table is handed to each worker once, when the pool starts. The changes of a
+    QTable are tracked from then on (QTable.track_changes), and each search only sends the
+    entries set since the previous one; any other table is taken to stay as it is.
+    """
+
+    def __init__(self, q_table, workers):
+        self.q_table = q_table
+        self.workers = workers
+        self.tracker = q_table.track_changes() if isinstance(q_table, QTable) else None
+        context = multiprocessing.get_context()
+        self.connections = []
+        self.processes = []
+        for _ in range(workers):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_pool_worker, args=(worker_connection, q_table), daemon=True)
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def search(self, game, settings, seeds, instrument=False, deadline=None):
+        """
+        Runs one search per worker from game, the i-th with seeds[i].
+
+        Returns:
+        list: The result of each worker, as returned by _search_worker.
+        """
+        changes = self.q_table.pop_changes(self.tracker) if self.tracker is not None else None
+        for connection, seed in zip(self.connections, seeds):
+            connection.send((game, settings, seed, instrument, deadline, changes))
+        return [connection.recv() for connection in self.connections]
+
+    def close(self):
+        """
+        Stops the workers. Closing twice does nothing.
+        """
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass  # The worker is already gone
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+        if self.tracker is not None:
+            self.q_table.untrack_changes(self.tracker)
+            self.tracker = None
+
+
+class MCTS:
+    def __init__(self, game, q_table, simulations=1000, C=1.4, workers=1, worker_simulations=None, seed=None,
+                 transposition_table=False, max_transpositions=100000, stats=None, time_budget_ms=None,
+                 rollout_policy=None, pool=None):
+        """
+        Parameters:
+        game (TicTacToeGame): The position to search from.
+        q_table (QTable): Q-table used to guide the rollouts. Another {(state, action): value}
+            mapping, its states canonical, is copied into a QTable.
+        simulations (int): Number of simulations of a single-process search.
+        C (float): Exploration factor for UCB1.
+        workers (int): Number of processes for root-parallel search. 1 searches in-process.
+        worker_simulations (int): Simulations run by each worker. By default simulations are
+            split across the workers, each running ceil(simulations / workers).
+        seed (int): Base seed of the workers' random generators, drawn at random if None.
+        transposition_table (bool): Share one node between all move orders reaching the same
+            position or a symmetric one, which turns the tree into a DAG. Nodes are keyed by
+            the board's canonical_key(), and their moves are stored in the canonical
+            orientation, mapped to and from the board's through its transform.
+        max_transpositions (int): Size cap of the transposition table. The least recently used
+            entry is evicted first; evicted nodes stay in the tree but are no longer shared.
+        stats (SearchStats): Collects counters and phase timings of the search, None to
+            collect nothing.
+        time_budget_ms (float): Wall-clock budget of search(). When set, simulations are run
+            until it is used up, instead of a fixed number, and the best move found by then
+            is returned. At least one simulation is always run.
+        rollout_policy (RolloutPolicy): Plays the rollouts. None follows the best known action
+            of q_table in each position and plays at random where none is known.
+        pool (SearchPool): The worker processes of a root-parallel search, kept by the caller
+            across searches (see QLearningStrategy.get_search_pool). Without one, the first
+            parallel search starts one with `workers` processes, kept until close().
+        """
+        if workers > 1 and worker_simulations is None:
+            worker_simulations = math.ceil(simulations / workers)
+        if worker_simulations is not None and worker_simulations < 1:
+            raise ValueError(f"worker_simulations must be at least 1, got {worker_simulations}.")
+        self.root = Node()
+        self.game = game
+        # Rollouts look positions up by the board's canonical key, which a QTable is indexed by
+        self.q_table = q_table if isinstance(q_table, QTable) else QTable(q_table)
+        self.simulations = simulations
+        self.C = C  # Exploration factor for UCB1
+        self.workers = workers
+        self.worker_simulations = worker_simulations if worker_simulations is not None else simulations
+        self.pool = pool
+        self.close_pool = None  # Stops a pool started by this MCTS, when it is collected at the latest
+        self.seed = seed
+        self.stats = stats
+        self.time_budget_ms = time_budget_ms
+        self.rollout_policy = rollout_policy
+
+        # Moves from the start of the game to the root position, for advance()
+        self.root_moves = tuple(move for move, _, _ in game.move_history)
+        self.reused_visits = 0
+
+        self.max_transpositions = max_transpositions
+        self.transpositions = OrderedDict() if transposition_table else None
+        self.tt_lookups = 0
+        self.tt_hits = 0
+        if self.transpositions is not None:
+            self.transpositions[self._position_key(game)] = self.root
+
+    def search(self):
+        start = time.monotonic()
+        deadline = start + self.time_budget_ms / 1000 if self.time_budget_ms is not None else None
+        if self.workers > 1:
+            self._search_parallel(deadline)
+        else:
+            self._run_simulations(self.simulations, deadline)
+        if self.stats is not None:
+            self.stats.searches += 1
+            self.stats.record_latency(time.monotonic() - start)
+            self.stats.maybe_emit()
+        move = self._best_move(self.root)
+        return self._game_move(move, self.game) if move is not None else None
+
+    def advance(self, game):
+        """
+        Moves the root to the position of game, so that the next search() continues from the
+        work of the previous ones. game must be the game searched before, or a copy of it,
+        with the moves played since appended to its move_history: the subtree reached by
+        those moves becomes the new root. Any other position starts a new tree.
+
+        Returns:
+        int: The visits of the reused root, 0 if the tree was rebuilt.
+        """
+        moves = tuple(move for move, _, _ in game.move_history)
+        depth = len(self.root_moves)
+        node = self.root if moves[:depth] == self.root_moves else None
+        if node is not None and len(moves) > depth:
+            # The moves since the root are replayed on a scratch copy rewound to the root
+            # position, which maps them to the orientation of the nodes' moves
+            scratch = game.copy()
+            for _ in range(len(moves) - depth):
+                scratch.undo_move()
+            for move in moves[depth:]:
+                edge = self._tree_move(move, scratch)
+                if edge not in node.moves:
+                    node = None
+                    break
+                node = node.children[node.moves.index(edge)]
+                scratch.make_move(move)
+
+        self.game = game
+        self.root_moves = moves
+        if node is None:
+            self.root = Node()
+            if self.transpositions is not None:
+                self.transpositions.clear()
+                self.transpositions[self._position_key(game)] = self.root
+        else:
+            self.root = node
+        self.reused_visits = self.root.visits
+        if self.stats is not None and node is not None:
+            self.stats.reused_visits += node.visits
+            self.stats.reused_nodes += self._count_nodes(node)
+        return self.reused_visits
+
+    def _count_nodes(self, root):
+        seen = {id(root)}
+        stack = [root]
+        while stack:
+            for child in stack.pop().children:
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    stack.append(child)
+        return len(seen)
+
+    def close(self):
+        """
+        Stops the worker processes of a pool this MCTS started; a pool given to it is left
+        to its owner.
+        """
+        if self.close_pool is not None:
+            self.close_pool()
+            self.close_pool = None
+            self.pool = None
+
+    def _search_parallel(self, deadline=None):
+        """
+        Root-parallel search: every worker grows its own tree from the same position
+        with its own seed, then the root children's statistics are summed into self.root.
+        The workers are those of a SearchPool, which receive the Q-table once.
+        """
+        if self.close_pool is not None and self.pool.q_table is not self.q_table:
+            self.close()  # q_table was replaced since the pool started
+        if self.pool is None:
+            self.pool = SearchPool(self.q_table, self.workers)
+            self.close_pool = weakref.finalize(self, self.pool.close)
+        base_seed = self.seed if self.seed is not None else random.getrandbits(32)
+        settings = {'simulations': self.worker_simulations, 'C': self.C,
+                    'transposition_table': self.transpositions is not None,
+                    'max_transpositions': self.max_transpositions, 'rollout_policy': self.rollout_policy}
+        seeds = [base_seed + i for i in range(self.pool.workers)]
+        results = self.pool.search(self.game.copy(), settings, seeds, self.stats is not None, deadline)
+
+        merged = {}
+        for root_children, tt_lookups, tt_hits, counters in results:
+            self.tt_lookups += tt_lookups
+            self.tt_hits += tt_hits
+            if counters is not None:
+                self.stats.merge(counters)
+            for move, visits, value in root_children:
+                child = merged.get(move)
+                if child is None:
+                    child = merged[move] = Node()
+                child.visits += visits
+                child.value += value
+        self.root.moves = tuple(merged)
+        self.root.children = tuple(merged.values())
+        self.root.visits = sum(child.visits for child in self.root.children)
+        self.root.value = sum(child.value for child in self.root.children)
+
+    def _run_simulations(self, simulations, deadline=None):
+        # Nodes do not store game states: a single scratch copy of the game is walked
+        # down the tree with make_move and rewound with undo_move after each simulation.
+        # With a deadline, simulations run until time.monotonic() reaches it instead.
+        # With stats, each phase is timed and counted into them.
+        stats = self.stats
+        clock = time.perf_counter
+        game = self.game.copy()
+        for _ in range(simulations) if deadline is None else itertools.count():
+            if stats is not None:
+                start = clock()
+            path = self._select(self.root, game)
+            if stats is not None:
+                selected = clock()
+            node = path[-1]
+            if not node.children and not game.is_game_over():
+                tt_hits = self.tt_hits
+                node = self._expand(node, game)
+                if stats is not None:
+                    stats.nodes_allocated += len(path[-1].children) - (self.tt_hits - tt_hits)
+                path.append(node)
+            if stats is not None:
+                expanded = clock()
+            result = self._simulate(game)
+            if stats is not None:
+                simulated = clock()
+            self._backpropagate(path, result)
+            for _ in range(len(path) - 1):
+                game.undo_move()
+            if stats is not None:
+                done = clock()
+                stats.select_time += selected - start
+                stats.expand_time += expanded - selected
+                stats.simulate_time += simulated - expanded
+                stats.backprop_time += done - simulated
+                stats.max_depth = max(stats.max_depth, len(path) - 1)
+                stats.simulations += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+
+    def transposition_hit_rate(self):
+        """
+        Returns the fraction of expansions that reused a node from the transposition table.
+        """
+        return self.tt_hits / self.tt_lookups if self.tt_lookups else 0.0
+
+    def _position_key(self, game):
+        return game.board.canonical_key()[0]
+
+    def _tree_move(self, move, game):
+        """
+        Returns a move on game as stored in node.moves: in the canonical orientation of the
+        position with the transposition table, else as it is.
+        """
+        if self.transpositions is None:
+            return move
+        return transform_action(move, game.board.canonical_key()[1], game.board.width)
+
+    def _game_move(self, move, game):
+        """
+        Returns a move of node.moves as played on game, the inverse of _tree_move.
+        """
+        if self.transpositions is None:
+            return move
+        return inverse_transform_action(move, game.board.canonical_key()[1], game.board.width)
+
+    def _lookup_or_create(self, game):
+        """
+        Returns the shared node of the position on game, creating and caching it if needed.
+        """
+        table = self.transpositions
+        key = self._position_key(game)
+        self.tt_lookups += 1
+        node = table.get(key)
+        if node is not None:
+            self.tt_hits += 1
+            table.move_to_end(key)
+            return node
+        node = table[key] = Node()
+        if len(table) > self.max_transpositions:
+            table.popitem(last=False)
+        return node
+
+    def _select_child(self, node):
+        """
+        Returns the index of the child with the highest UCB1 score, scoring the whole
+        child block in one pass.
+
+        This stays a Python loop over the nodes rather than a NumPy argmax. NumPy needs the
+        child statistics in arrays held by the parent, which a transposition table cannot
+        keep consistent: a shared node has one set of statistics whatever parent it is
+        reached from. With at most 49 children the loop is also as fast: a NumPy argmax
+        costs about 4 us whatever the width, against 1.6 us for the loop over 9 children
+        and 6 us over 49, and the loop stops at the first unvisited child.
+        """
+        exploration = self.C * self.C * math.log(node.visits)
+        best_index = 0
+        best_score = -math.inf
+        for index, child in enumerate(node.children):
+            visits = child.visits
+            if visits == 0:
+                return index  # Prioritize unexplored nodes
+            score = child.value / visits + math.sqrt(exploration / visits)
+            if score > best_score:
+                best_index = index
+                best_score = score
+        return best_index
+
+    def _select(self, node, game):
+        """
+        Descends from node to a leaf, replaying the chosen moves on game.
+
+        Returns:
+        list of Node: The descent path, starting with node.
+        """
+        path = [node]
+        canonical = self.transpositions is not None
+        board = game.board
+        while node.children:
+            index = self._select_child(node)
+            move = node.moves[index]
+            if canonical:
+                move = inverse_transform_action(move, board.canonical_key()[1], board.width)
+            game.make_move(move)
+            node = node.children[index]
+            path.append(node)
+        return path
+
+    def _expand(self, node, game):
+        moves = tuple(game.get_valid_moves())
+        if self.transpositions is None:
+            children = tuple(Node() for _ in moves)
+            node.moves = moves
+        else:
+            children = []
+            for move in moves:
+                game.make_move(move)
+                children.append(self._lookup_or_create(game))
+                game.undo_move()
+            children = tuple(children)
+            node.moves = tuple(self._tree_move(move, game) for move in moves)
+        node.children = children
+
+        index = random.randrange(len(moves))  # Continue from a random child node
+        game.make_move(moves[index])
+        return children[index]
+
+    def _simulate(self, game):
+        if self.rollout_policy is not None:
+            return self.rollout_policy.rollout(game, self.game.AI_symbol)
+
+        # The rollout is played on the scratch game and rewound with undo_move
+        # afterwards, so no game, board or strategy objects are allocated per rollout.
+        # A QTable is read with the board's canonical key, kept up to date by make_move,
+        # so no state string is built or canonicalized per ply.
+        # With stats, the Q-table lookups and hits are counted
+        q_table = self.q_table
+        stats = self.stats
+        board = game.board
+        size = board.width
+        depth = 0
+        while not game.is_game_over():
+            move = None
+            key, transform = board.canonical_key()
+            cell = q_table.best_known_cell(key, size)
+            if stats is not None:
+                stats.q_lookups += 1
+                if cell is not None:
+                    stats.q_hits += 1
+            if cell is not None:
+                # Use the Q-values to select the best move
+                move = inverse_transform_action(divmod(cell, size), transform, size)
+            if move is None:
+                # If the state is not in the Q-table, select a move randomly
+                move = random.choice(game.get_valid_moves())
+            game.make_move(move)
+            depth += 1
+
+        # Determine the outcome of the game
+        winner = game.get_winner()
+        for _ in range(depth):
+            game.undo_move()
+
+        if winner == self.game.AI_symbol:
+            return 1
+        elif winner == self.game.human_symbol:
+            return -1
+        else:  # Draw
+            return 0
+
+    def _backpropagate(self, path, result):
+        for node in path:
+            node.visits += 1
+            node.value += result
+
+    def _best_move(self, node):
+        """
+        Determines the best move from the root node.
+        Returns the move associated with the child node with the most visits.
+        """
+        if not node.children:
+            return None
+        best_index = max(range(len(node.children)), key=lambda index: node.children[index].visits)
+        return node.moves[best_index]
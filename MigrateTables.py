@@ -0,0 +1,30 @@
+import glob
+import os
+import pickle
+import sys
+
+from Utils import fold_symmetric_table
+
+
+def migrate_table_file(filename):
+    """
+    Rewrites a pickled Q-table or value table so that it is keyed by canonical states.
+
+    Entries of symmetric positions are folded together by averaging. Running it again on
+    a migrated file leaves the table unchanged.
+    """
+    with open(filename, "rb") as f:
+        table = pickle.load(f)
+    folded = fold_symmetric_table(table)
+    with open(filename, "wb") as f:
+        pickle.dump(folded, f)
+    print(f"{filename}: {len(table)} -> {len(folded)} entries, "
+          f"{os.path.getsize(filename)} bytes")
+
+
+if __name__ == "__main__":
+    # Usage: python MigrateTables.py [table.pkl ...]
+    # Without arguments, migrates every q_table_*.pkl and vi_values_*.pkl in the working directory.
+    filenames = sys.argv[1:] or sorted(glob.glob("q_table_*.pkl") + glob.glob("vi_values_*.pkl"))
+    for filename in filenames:
+        migrate_table_file(filename)
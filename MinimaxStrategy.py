@@ -0,0 +1,275 @@
+import math
+import random
+import time
+
+from Algorithm import Algorithm
+from BitBoard import get_cell_win_masks, get_win_masks
+from Utils import board_to_state, get_zobrist_keys
+
+WIN_SCORE = 10 ** 9
+# Scores beyond this bound are forced results: WIN_SCORE minus the plies until the win
+_FORCED_BOUND = WIN_SCORE - 1000
+
+# Transposition table entry flags: the stored score is exact, a lower bound or an upper bound
+_EXACT, _LOWER, _UPPER = 0, 1, 2
+
+# XORed into the hash of the positions with 'O' to move, so that the same stones with the
+# other side to move get their own transposition table entry
+_O_TO_MOVE_KEY = random.Random('O to move').getrandbits(64)
+
+
+class _SearchTimeout(Exception):
+    def __init__(self, best_cell=None):
+        super().__init__()
+        self.best_cell = best_cell  # Best root move of the interrupted iteration, if one was scored
+
+
+class MinimaxStrategy(Algorithm):
+    """
+    A search-based AI: negamax with alpha-beta pruning over bitboards, iterative deepening
+    under a time and node budget, and a transposition table keyed by Zobrist hashes of the
+    stones and the side to move.
+
+    Each iteration searches one ply deeper than the last, trying the previous best move
+    first. The budget is checked between root moves as well as during their search; when it
+    runs out, the best move of the interrupted iteration is played if the previous best move
+    was scored in it, and the best move of the last completed iteration otherwise. Moves are
+    ordered winning moves first, then blocks of the opponent's wins, then the best move
+    stored for the position, then cells on the most lines. When the opponent threatens to
+    win, only the blocking moves are searched.
+
+    Positions at the depth limit are scored by a line heuristic: every row, column and
+    diagonal still open to only one player counts for that player, 10 ** stones. A search
+    deep enough to reach the end of every line of play is exact, which on 3x3 takes a few
+    milliseconds.
+    """
+
+    def __init__(self, board, ai_symbol, human_symbol, time_budget_ms=1000, max_nodes=None,
+                 max_transpositions=1 << 20):
+        """
+        Parameters:
+        board (GameBoard): The game board, unused; positions are read from the game.
+        ai_symbol (str): The AI's symbol.
+        human_symbol (str): The opponent's symbol.
+        time_budget_ms (float): Wall-clock budget of each move, None for no limit.
+        max_nodes (int): Node budget of each move, None for no limit.
+        max_transpositions (int): The transposition table is cleared when it grows past this size.
+        """
+        self.board = board
+        self.ai_symbol = ai_symbol
+        self.human_symbol = human_symbol
+        self.time_budget_ms = time_budget_ms
+        self.max_nodes = max_nodes
+        self.max_transpositions = max_transpositions
+        self.size = None
+        self.deadline = None
+        # Zobrist hash, side to move included -> (depth, flag, score, best cell). Positions keep
+        # their values from one move to the next, so the table is kept for the whole game.
+        self.transpositions = {}
+
+        # Depth, nodes searched, score and exactness of the last calculate_best_move
+        self.depth = 0
+        self.nodes = 0
+        self.score = 0
+        self.exact = False
+
+    def _setup(self, size):
+        self.size = size
+        self.full_mask = (1 << size * size) - 1
+        self.win_masks = get_win_masks(size)
+        self.zobrist = get_zobrist_keys(size)
+        cell_win_masks = get_cell_win_masks(size)
+        self.cell_order = sorted(range(size * size), key=lambda cell: -len(cell_win_masks[cell]))
+        self.line_weights = [0] + [10 ** stones for stones in range(1, size + 1)]
+        self.transpositions = {}
+
+    def calculate_best_move(self, game_state):
+        return self.search_state(board_to_state(game_state.board), game_state.current_player)
+
+    def search_state(self, state, player):
+        """
+        Searches a position given as a state string.
+
+        Parameters:
+        state (str): The position, as built by board_to_state; the game must not be over.
+        player (str): The symbol to move.
+
+        Returns:
+        tuple: The best move (row, col) found within the budget.
+        """
+        size = int(len(state) ** 0.5)
+        if size != self.size:
+            self._setup(size)
+        mine = theirs = position_hash = 0
+        for cell, symbol in enumerate(state):
+            if symbol != ' ':
+                if symbol == player:
+                    mine |= 1 << cell
+                else:
+                    theirs |= 1 << cell
+                position_hash ^= self.zobrist[cell][0 if symbol == 'X' else 1]
+        side = 0 if player == 'X' else 1
+        if side:
+            position_hash ^= _O_TO_MOVE_KEY
+        empty = size * size - (mine | theirs).bit_count()
+
+        if len(self.transpositions) > self.max_transpositions:
+            self.transpositions = {}
+        self.nodes = 0
+        self.deadline = time.monotonic() + self.time_budget_ms / 1000 if self.time_budget_ms is not None else None
+        best_cell = None
+        self.exact = False
+        for depth in range(1, empty + 1):
+            try:
+                score, cell = self._search_root(mine, theirs, position_hash, side, depth, best_cell)
+            except _SearchTimeout as timeout:
+                # The previous best move is searched first, so any move the interrupted
+                # iteration scored best was searched deeper and found at least as good
+                if timeout.best_cell is not None:
+                    best_cell = timeout.best_cell
+                break
+            best_cell, self.score, self.depth = cell, score, depth
+            if depth == empty or abs(score) >= _FORCED_BOUND:
+                self.exact = True
+                break
+        return divmod(best_cell, size)
+
+    def _check_budget(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise _SearchTimeout()
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise _SearchTimeout()
+
+    def _ordered_moves(self, mine, theirs, best_cell):
+        """
+        Sorts the empty cells for the search, best_cell first within its group.
+
+        Returns:
+        tuple: (wins, blocks, rest): the cells that win at once, the cells that block a win
+        of the opponent, and the others, each ordered by the number of lines through them.
+        """
+        # A line one stone short of complete, with no stone of the other player, wins on its empty cell
+        needed = self.size - 1
+        win_bits = 0
+        block_bits = 0
+        for mask in self.win_masks:
+            own = mine & mask
+            other = theirs & mask
+            if not other:
+                if own.bit_count() == needed:
+                    win_bits |= mask & ~own
+            elif not own and other.bit_count() == needed:
+                block_bits |= mask & ~other
+
+        occupied = mine | theirs
+        wins = []
+        blocks = []
+        rest = []
+        for cell in self.cell_order:
+            bit = 1 << cell
+            if occupied & bit:
+                continue
+            if win_bits & bit:
+                wins.append(cell)
+            else:
+                group = blocks if block_bits & bit else rest
+                if cell == best_cell:
+                    group.insert(0, cell)
+                else:
+                    group.append(cell)
+        return wins, blocks, rest
+
+    def _search_root(self, mine, theirs, position_hash, side, depth, best_cell):
+        wins, blocks, rest = self._ordered_moves(mine, theirs, best_cell)
+        if wins:
+            return WIN_SCORE - 1, wins[0]
+        moves = blocks or rest
+        alpha = -math.inf
+        best = moves[0]
+        for i, cell in enumerate(moves):
+            try:
+                # The first move is always scored, so that the first iteration has a move to return
+                if i:
+                    self._check_budget()
+                score = self._play(mine, theirs, position_hash, side, cell, depth, -math.inf, -alpha, 0)
+            except _SearchTimeout:
+                raise _SearchTimeout(best if i else None)
+            if score > alpha:
+                alpha, best = score, cell
+        return alpha, best
+
+    def _play(self, mine, theirs, position_hash, side, cell, depth, alpha, beta, ply):
+        """
+        Returns the score of playing cell, for the side that plays it, at the given ply.
+        """
+        occupied = mine | theirs | 1 << cell
+        if occupied == self.full_mask:
+            return 0  # A move that does not win and fills the board draws
+        return -self._negamax(theirs, mine | 1 << cell, position_hash ^ self.zobrist[cell][side] ^ _O_TO_MOVE_KEY,
+                              1 - side, depth - 1, alpha, beta, ply + 1)
+
+    def _negamax(self, mine, theirs, position_hash, side, depth, alpha, beta, ply):
+        """
+        Scores a position that is not over, for the side to move (whose stones are mine).
+        """
+        self.nodes += 1
+        if not self.nodes & 63:
+            self._check_budget()
+
+        entry = self.transpositions.get(position_hash)
+        best_cell = None
+        if entry is not None:
+            entry_depth, flag, score, best_cell = entry
+            if entry_depth >= depth:
+                # Forced results are stored relative to the position, not the root
+                if score >= _FORCED_BOUND:
+                    score -= ply
+                elif score <= -_FORCED_BOUND:
+                    score += ply
+                if flag == _EXACT:
+                    return score
+                if flag == _LOWER and score >= beta:
+                    return score
+                if flag == _UPPER and score <= alpha:
+                    return score
+
+        wins, blocks, rest = self._ordered_moves(mine, theirs, best_cell)
+        if wins:
+            return WIN_SCORE - ply - 1
+        if depth == 0:
+            return self._evaluate(mine, theirs)
+
+        original_alpha = alpha
+        best_score = -math.inf
+        for cell in blocks or rest:
+            score = self._play(mine, theirs, position_hash, side, cell, depth, -beta, -alpha, ply)
+            if score > best_score:
+                best_score, best_cell = score, cell
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        flag = _UPPER if best_score <= original_alpha else _LOWER if best_score >= beta else _EXACT
+        stored = best_score
+        if stored >= _FORCED_BOUND:
+            stored += ply
+        elif stored <= -_FORCED_BOUND:
+            stored -= ply
+        self.transpositions[position_hash] = (depth, flag, stored, best_cell)
+        return best_score
+
+    def _evaluate(self, mine, theirs):
+        """
+        Line heuristic of a position for the side to move.
+        """
+        weights = self.line_weights
+        score = 0
+        for mask in self.win_masks:
+            own = mine & mask
+            other = theirs & mask
+            if own and not other:
+                score += weights[own.bit_count()]
+            elif other and not own:
+                score -= weights[other.bit_count()]
+        return score
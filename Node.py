@@ -1,8 +1,16 @@
-class Node:
-    def __init__(self, game_state, move=None, parent=None):
-        self.game_state = game_state
-        self.move = move
-        self.parent = parent
-        self.children = []
-        self.value = 0
-        self.visits = 0
+class Node:
+    """
+    A node of the MCTS tree.
+
+    Nodes only keep their statistics and their outgoing edges: `moves` and `children`
+    are parallel tuples created when the node is expanded. Keeping moves on the edges
+    lets one node be shared by several parents when MCTS uses a transposition table.
+    The game state is rebuilt by replaying moves along the descent path.
+    """
+    __slots__ = ('moves', 'children', 'value', 'visits')
+
+    def __init__(self):
+        self.moves = ()
+        self.children = ()
+        self.value = 0
+        self.visits = 0
@@ -0,0 +1,154 @@
+import argparse
+import multiprocessing
+import random
+import time
+
+from QLearningStrategy import QLearningStrategy
+from Run import load_strategy, play_q_learning_episode, save_strategy
+from TicTacToeGame import TicTacToeGame
+
+
+def _worker(connection, board_size, seed, strategy_settings):
+    """
+    Worker process: keeps a local QLearningStrategy, plays the requested number of
+    episodes per round and sends back the entries it changed with their visit counts.
+
+    Each message from the master is (episodes, merged_entries, exploration_rate),
+    merged_entries being the master's table values to apply before playing; None stops
+    the worker.
+    """
+    random.seed(seed)
+    game = TicTacToeGame(QLearningStrategy, board_size)
+    strategy = QLearningStrategy(game.board, game.AI_symbol, game.human_symbol, **strategy_settings)
+    tracker = strategy.Q.track_changes()  # The entries changed by this round's episodes
+
+    visits = {}
+    update_q_value = strategy.update_q_value
+
+    def counted_update_q_value(game, old_state, action, reward, new_state):
+        update_q_value(game, old_state, action, reward, new_state)
+        key = strategy.q_key(old_state, action)
+        visits[key] = visits.get(key, 0) + 1
+
+    strategy.update_q_value = counted_update_q_value
+
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        episodes, merged_entries, exploration_rate = message
+        for key, value in merged_entries.items():
+            strategy.Q[key] = value
+        tracker.clear()
+        strategy.exploration_rate = exploration_rate
+        visits.clear()
+
+        for _ in range(episodes):
+            play_q_learning_episode(game, strategy)
+
+        changes = strategy.Q.pop_changes(tracker)
+        connection.send(({key: (value, visits.get(key, 1)) for key, value in changes.items()},
+                         strategy.exploration_rate))
+    connection.close()
+
+
+class ParallelQLearningTrainer:
+    """
+    Trains a QLearningStrategy with several worker processes playing against the random
+    opponent, each with its own seed and its own copy of the Q-table.
+
+    Every merge_interval episodes per worker, the workers send the entries they changed.
+    The master sets each entry to the visit-weighted average of its own value and the
+    workers' values, then sends the merged entries back to every worker before the next
+    round. The master's value counts for as many visits as the workers made to the entry
+    in its last merge, one for the entries of the starting table, so a worker that visited
+    an entry once cannot replace a value learned from many visits.
+    """
+
+    def __init__(self, board_size, workers=4, merge_interval=100, seed=0, **strategy_settings):
+        self.board_size = board_size
+        self.workers = workers
+        self.merge_interval = merge_interval
+        self.seed = seed
+        self.strategy_settings = strategy_settings
+        self.visits = {}  # Key -> the workers' visits of the entry in its last merge
+
+    def train(self, ai_strategy, total_episodes):
+        """
+        Trains ai_strategy in place for total_episodes episodes, split across the workers.
+
+        Returns:
+        float: Episodes per second.
+        """
+        start = time.perf_counter()
+        context = multiprocessing.get_context()
+        connections = []
+        processes = []
+        for i in range(self.workers):
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(target=_worker, daemon=True,
+                                      args=(child_connection, self.board_size, self.seed + i, self.strategy_settings))
+            process.start()
+            connections.append(parent_connection)
+            processes.append(process)
+
+        # The first round hands every worker the whole starting table
+        merged_entries = dict(ai_strategy.Q.items())
+        self.visits = {}
+        exploration_rate = ai_strategy.exploration_rate
+        remaining = total_episodes
+        try:
+            while remaining > 0:
+                round_episodes = min(self.merge_interval * self.workers, remaining)
+                shares = [round_episodes // self.workers + (1 if i < round_episodes % self.workers else 0)
+                          for i in range(self.workers)]
+                for connection, episodes in zip(connections, shares):
+                    connection.send((episodes, merged_entries, exploration_rate))
+                results = [connection.recv() for connection in connections]
+                merged_entries = self._merge(ai_strategy, [changes for changes, _ in results])
+                exploration_rate = sum(rate for _, rate in results) / len(results)
+                remaining -= round_episodes
+        finally:
+            for connection in connections:
+                connection.send(None)
+            for process in processes:
+                process.join()
+
+        ai_strategy.exploration_rate = exploration_rate
+        return total_episodes / (time.perf_counter() - start)
+
+    def _merge(self, ai_strategy, worker_changes):
+        totals = {}
+        for changes in worker_changes:
+            for key, (value, visits) in changes.items():
+                weighted_sum, total_visits = totals.get(key, (0.0, 0))
+                totals[key] = (weighted_sum + value * visits, total_visits + visits)
+        merged_entries = {}
+        for key, (weighted_sum, total_visits) in totals.items():
+            master_value = ai_strategy.Q.get(key)
+            self.visits[key], master_visits = total_visits, self.visits.get(key, 1)
+            if master_value is not None:
+                weighted_sum += master_value * master_visits
+                total_visits += master_visits
+            merged_entries[key] = ai_strategy.Q[key] = weighted_sum / total_visits
+        return merged_entries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train QLearning with several worker processes.")
+    parser.add_argument("board_size", type=int, choices=(3, 5, 7))
+    parser.add_argument("episodes", type=int, help="total number of training episodes")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--merge-interval", type=int, default=100, help="episodes per worker between merges")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mcts-simulations", type=int, default=1000)
+    args = parser.parse_args()
+
+    filename = f"q_table_{args.board_size}x{args.board_size}.pkl"
+    strategy = QLearningStrategy(None, 'X', 'O', mcts_simulations=args.mcts_simulations)
+    load_strategy(strategy, filename)
+    trainer = ParallelQLearningTrainer(args.board_size, args.workers, args.merge_interval, args.seed,
+                                       mcts_simulations=args.mcts_simulations)
+    episodes_per_second = trainer.train(strategy, args.episodes)
+    save_strategy(strategy, filename)
+    print(f"Trained {args.episodes} episodes with {args.workers} workers: {episodes_per_second:.1f} episodes/s")
@@ -1,71 +1,236 @@
-import random
-from MCTS import MCTS
-from Utils import board_to_state, state_to_board
-
-
-class QLearningStrategy:
-
-    def __init__(self, board, ai_symbol, human_symbol, learning_rate=0.1, discount_factor=0.9, exploration_rate=1.0,
-                 exploration_decay=0.995):
-        self.board = board
-        self.ai_symbol = ai_symbol
-        self.human_symbol = human_symbol
-        self.learning_rate = learning_rate
-        self.discount_factor = discount_factor
-        self.exploration_rate = exploration_rate
-        self.exploration_decay = exploration_decay
-
-        # Q-table, initialized with zeros
-        self.Q = {}
-
-    def calculate_best_move(self, game):
-        state = board_to_state(game.board)
-
-        # Exploration vs Exploitation
-        if random.uniform(0, 1) < self.exploration_rate:
-            action = random.choice(self.get_possible_actions(game, state))
-        else:
-            # Using MCTS to get best action
-            mcts = MCTS(game, self.Q)
-            action = mcts.search()
-
-            # Adding randomness to exploitation
-            best_actions = [act for act in self.get_possible_actions(game, state) if
-                            self.Q.get((state, act), 0) == self.Q.get((state, action), 0)]
-            action = random.choice(best_actions)
-
-        # Decay exploration rate and ensure it doesn't go below 0.01
-        self.exploration_rate = max(self.exploration_rate * self.exploration_decay, 0.01)
-        return action
-
-    def update_q_value(self, game, old_state, action, reward, new_state):
-        old_value = self.Q.get((old_state, action), 0)
-
-        # If the new state results in the end of the game (win, lose, or draw)
-        # then there's no future action from that state, hence the max_future_value is 0
-        if game.get_winner() or (' ' not in board_to_state(game.board)):
-            max_future_value = 0
-        else:
-            max_future_value = max(
-                [self.Q.get((new_state, new_action), 0) for new_action in
-                 self.get_possible_actions_from_state(new_state)]
-            )
-
-        new_value = (1 - self.learning_rate) * old_value + self.learning_rate * (
-                reward + self.discount_factor * max_future_value)
-        self.Q[(old_state, action)] = new_value
-
-    def get_possible_actions(self, game, state):
-        board = state_to_board(state)
-        return [(i, j) for i in range(len(board)) for j in range(len(board)) if board[i][j] == ' ']
-
-    def get_possible_actions_from_state(self, state):
-        board = state_to_board(state)
-        return [(i, j) for i in range(len(board)) for j in range(len(board)) if board[i][j] == ' ']
-
-    def get_best_action(self, game, state):
-        actions = self.get_possible_actions(game, state)
-        best_action = max(actions, key=lambda action: self.Q.get((state, action), 0))
-        return best_action
-
-
+import random
+import weakref
+
+import numpy as np
+
+from MCTS import MCTS, SearchPool
+from QTable import QTable
+from ReplayBuffer import ReplayBuffer
+from TableFile import MappedTable
+from Utils import array_to_states, board_to_state, canonicalize_state, select_best_moves, transform_action
+
+
+class QLearningStrategy:
+
+    def __init__(self, board, ai_symbol, human_symbol, learning_rate=0.1, discount_factor=0.9, exploration_rate=1.0,
+                 exploration_decay=0.995, mcts_simulations=1000, mcts_workers=1, mcts_worker_simulations=None,
+                 search_stats=None, mcts_time_budget_ms=None, mcts_reuse_tree=False, replay_capacity=0,
+                 replay_batch_size=32, replay_prioritized=False, mcts_rollout_policy=None):
+        self.board = board
+        self.ai_symbol = ai_symbol
+        self.human_symbol = human_symbol
+        self.learning_rate = learning_rate
+        self.discount_factor = discount_factor
+        self.exploration_rate = exploration_rate
+        self.exploration_decay = exploration_decay
+
+        # MCTS settings; with mcts_workers > 1 the search runs root-parallel across processes
+        self.mcts_simulations = mcts_simulations
+        self.mcts_workers = mcts_workers
+        self.mcts_worker_simulations = mcts_worker_simulations
+        # With a time budget (ms) the search runs until it is used up instead of for mcts_simulations;
+        # with mcts_reuse_tree the tree is kept between moves and re-rooted at the position searched
+        self.mcts_time_budget_ms = mcts_time_budget_ms
+        self.mcts_reuse_tree = mcts_reuse_tree
+        # A RolloutPolicy playing the search's rollouts, None to follow the Q-table
+        self.mcts_rollout_policy = mcts_rollout_policy
+        self.mcts = None
+        # The worker processes of the root-parallel searches, kept from one search to the next
+        self.search_pool = None
+        self._close_search_pool = None
+        # An Instrumentation.SearchStats collecting the counters of every search, None to run uninstrumented
+        self.search_stats = search_stats
+
+        # Experience replay: with a replay_capacity, every update_q_value also stores its
+        # transition and replays a minibatch of replay_batch_size stored ones
+        self.replay_batch_size = replay_batch_size
+        self.replay_buffer = ReplayBuffer(replay_capacity, replay_prioritized) if replay_capacity else None
+
+        # Q-table, initialized with zeros. Keys are (canonical state, action in the canonical
+        # orientation), so the 8 symmetric variants of a position share one set of entries.
+        self.Q = QTable()
+
+    @property
+    def Q(self):
+        return self._Q
+
+    @Q.setter
+    def Q(self, table):
+        # Plain dicts, e.g. unpickled from a q_table file, are converted to a QTable, and
+        # memory-mapped tables are read through lazily
+        if isinstance(table, QTable):
+            self._Q = table
+        elif isinstance(table, MappedTable):
+            self._Q = QTable(fallback=table)
+        else:
+            self._Q = QTable(table)
+        # The workers of the search pool hold a copy of the previous table
+        if getattr(self, 'search_pool', None) is not None:
+            self.close_search_pool()
+        # Stored transitions refer to rows of the previous table
+        if getattr(self, 'replay_buffer', None) is not None:
+            self.replay_buffer.clear()
+
+    def calculate_best_move(self, game):
+        state = board_to_state(game.board)
+
+        # Exploration vs Exploitation
+        if random.uniform(0, 1) < self.exploration_rate:
+            action = random.choice(self.get_possible_actions(game, state))
+        else:
+            # Using MCTS to get best action
+            mcts = self.get_mcts(game)
+            action = mcts.search()
+
+            # Adding randomness to exploitation
+            action_value = self.get_q_value(state, action)
+            best_actions = [act for act in self.get_possible_actions(game, state) if
+                            self.get_q_value(state, act) == action_value]
+            action = random.choice(best_actions)
+
+        # Decay exploration rate and ensure it doesn't go below 0.01
+        self.exploration_rate = max(self.exploration_rate * self.exploration_decay, 0.01)
+        return action
+
+    def calculate_best_moves(self, games):
+        """
+        Picks the moves of many games at once, for tournaments and the game server.
+
+        Instead of an MCTS search per game, each game plays its best action in the Q-table,
+        as get_best_action does, looked up once per distinct position. Each game still
+        explores with the current exploration_rate, which decays once per game.
+
+        Returns:
+        list: The move (row, col) of each game.
+        """
+        explore = np.zeros(len(games), dtype=bool)
+        for i in range(len(games)):
+            explore[i] = random.uniform(0, 1) < self.exploration_rate
+            self.exploration_rate = max(self.exploration_rate * self.exploration_decay, 0.01)
+        return select_best_moves(games, lambda positions, players: self.Q.state_values(array_to_states(positions)),
+                                 explore)
+
+    def get_mcts(self, game):
+        """
+        Returns the MCTS to search game with: a new one, or with mcts_reuse_tree the one of the
+        previous move, advanced to the current position.
+        """
+        if self.mcts_reuse_tree and self.mcts is not None:
+            self.mcts.q_table = self.Q
+            self.mcts.rollout_policy = self.mcts_rollout_policy
+            self.mcts.pool = self.get_search_pool() if self.mcts.workers > 1 else None
+            self.mcts.advance(game)
+            return self.mcts
+        pool = self.get_search_pool() if self.mcts_workers > 1 else None
+        mcts = MCTS(game, self.Q, simulations=self.mcts_simulations, workers=self.mcts_workers,
+                    worker_simulations=self.mcts_worker_simulations, stats=self.search_stats,
+                    time_budget_ms=self.mcts_time_budget_ms, rollout_policy=self.mcts_rollout_policy, pool=pool)
+        if self.mcts_reuse_tree:
+            self.mcts = mcts
+        return mcts
+
+    def get_search_pool(self):
+        """
+        Returns the SearchPool of the root-parallel searches: started by the first one, it is
+        kept while Q and mcts_workers stay the same, so Q is sent to the workers only once.
+        """
+        pool = self.search_pool
+        if pool is None or pool.q_table is not self.Q or pool.workers != self.mcts_workers:
+            self.close_search_pool()
+            pool = self.search_pool = SearchPool(self.Q, self.mcts_workers)
+            self._close_search_pool = weakref.finalize(self, pool.close)
+        return pool
+
+    def close_search_pool(self):
+        """
+        Stops the worker processes of the search pool, if any; the next parallel search starts new ones.
+        """
+        if self.search_pool is not None:
+            self._close_search_pool()
+            self.search_pool = None
+            self._close_search_pool = None
+
+    def q_key(self, state, action):
+        """
+        Returns the Q-table key of a state and action: the canonical state and the action
+        mapped into the canonical orientation.
+        """
+        canonical_state, transform = canonicalize_state(state)
+        return canonical_state, transform_action(action, transform, int(len(state) ** 0.5))
+
+    def get_q_value(self, state, action):
+        return self.Q.get(self.q_key(state, action), 0)
+
+    def update_q_value(self, game, old_state, action, reward, new_state):
+        key = self.q_key(old_state, action)
+        old_value = self.Q.get(key, 0)
+
+        # If the new state results in the end of the game (win, lose, or draw)
+        # then there's no future action from that state, hence the max_future_value is 0
+        if game.is_game_over():
+            max_future_value = 0
+        else:
+            # The empty cells of the canonical state are exactly the canonical actions
+            max_future_value = self.Q.max_value(canonicalize_state(new_state)[0])
+
+        new_value = (1 - self.learning_rate) * old_value + self.learning_rate * (
+                reward + self.discount_factor * max_future_value)
+        self.Q[key] = new_value
+
+        if self.replay_buffer is not None:
+            self.remember(key, reward, new_state, game.is_game_over())
+            if len(self.replay_buffer) >= self.replay_batch_size:
+                self.replay()
+
+    def remember(self, key, reward, new_state, terminal):
+        """
+        Stores a transition in the replay buffer.
+
+        Parameters:
+        key (tuple): The Q-table key of the state and action, as returned by q_key.
+        reward (float): The reward observed.
+        new_state (str): The state reached.
+        terminal (bool): Whether the game ended.
+        """
+        (canonical_state, (i, j)) = key
+        canonical_new_state = canonicalize_state(new_state)[0]
+        self.replay_buffer.add(self.Q.state_row(canonical_state), i * self.Q.size + j, reward,
+                               self.Q.state_row(canonical_new_state),
+                               np.frombuffer(canonical_new_state.encode(), dtype=np.uint8) == ord(' '), terminal)
+
+    def replay(self, batch_size=None):
+        """
+        Samples a minibatch of stored transitions and applies their TD updates all at once.
+        Each update is computed from the values before the minibatch, so a transition drawn
+        twice is applied twice. With prioritized replay, the steps are scaled by the
+        importance weights and the transitions get their new TD errors as priorities.
+
+        Returns:
+        ndarray: The TD error of each transition sampled.
+        """
+        buffer = self.replay_buffer
+        indices, weights = buffer.sample(batch_size or self.replay_batch_size)
+        rows = buffer.states[indices]
+        cells = buffer.actions[indices]
+        future = self.Q.max_values(buffer.next_states[indices], buffer.next_legal[indices])
+        targets = buffer.rewards[indices] + self.discount_factor * np.where(buffer.terminal[indices], 0.0, future)
+        td_errors = targets - self.Q.values[rows, cells]
+        steps = self.learning_rate * td_errors if weights is None else self.learning_rate * weights * td_errors
+        self.Q.add_at(rows, cells, steps.astype(np.float32))
+        if buffer.prioritized:
+            buffer.update_priorities(indices, td_errors)
+        return td_errors
+
+    def get_possible_actions(self, game, state):
+        return self.get_possible_actions_from_state(state)
+
+    def get_possible_actions_from_state(self, state):
+        size = int(len(state) ** 0.5)
+        return [divmod(cell, size) for cell, symbol in enumerate(state) if symbol == ' ']
+
+    def get_best_action(self, game, state):
+        actions = self.get_possible_actions(game, state)
+        best_action = max(actions, key=lambda action: self.get_q_value(state, action))
+        return best_action
+
+
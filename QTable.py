@@ -0,0 +1,293 @@
+from collections.abc import MutableMapping
+
+import numpy as np
+
+from Utils import canonicalize_state, decode_state, encode_state, inverse_transform_action
+
+
+class QTable(MutableMapping):
+    """
+    A Q-table that stores one float32 vector of action values per state.
+
+    States are keyed by their base-3 integer encoding (Utils.encode_state) and mapped to a
+    row of a (states, cells) array, actions being the cell index row * size + col. A
+    parallel boolean array records which entries have been set, so the table behaves
+    like the {(state, action): value} dict QLearningStrategy used to keep:
+    `Q[(state, action)]`, `Q.get(...)`, `in`, `len` and iteration all work on
+    (state, action) pairs.
+
+    Looking up a bare state string, `state in Q` or `Q[state]`, returns the known
+    actions of that position as {action: value}. It goes through the symmetry
+    canonicalization, so it also finds positions stored under a symmetric variant,
+    and the actions come back in the orientation of the state that was asked for.
+
+    A QTable pickles as a QTable, e.g. for the worker processes of a parallel search; saved
+    q_table files keep the plain dict layout, see Run.save_strategy.
+
+    An optional read-only fallback table (e.g. a TableFile.MappedTable) is read lazily:
+    the entries of a state are copied in the first time that state is looked up, and
+    only iterating over or pickling the whole table reads everything.
+    """
+
+    def __init__(self, entries=None, capacity=1024, fallback=None):
+        self.cells = None
+        self.size = None
+        self.rows = {}  # base-3 state key -> row
+        self.row_keys = []  # row -> base-3 state key
+        self.capacity = capacity
+        self.values = None
+        self.known = None
+        self.count = 0
+        # (row, cell) of the entries set since each reader of the changes last asked for
+        # them, see track_changes(); nothing is recorded while no reader is attached
+        self.trackers = []
+        self.fallback = fallback
+        if entries:
+            self.update(entries)
+
+    def _allocate(self, cells):
+        self.cells = cells
+        self.size = int(cells ** 0.5)
+        self.values = np.zeros((self.capacity, cells), dtype=np.float32)
+        self.known = np.zeros((self.capacity, cells), dtype=bool)
+
+    def _new_row(self, key, cells):
+        if self.values is None:
+            self._allocate(cells)
+        row = len(self.row_keys)
+        if row == len(self.values):
+            self.values = np.concatenate([self.values, np.zeros_like(self.values)])
+            self.known = np.concatenate([self.known, np.zeros_like(self.known)])
+        self.rows[key] = row
+        self.row_keys.append(key)
+        return row
+
+    def _fill(self, row, entries):
+        for (i, j), value in entries:
+            cell = i * self.size + j
+            if not self.known[row, cell]:
+                self.known[row, cell] = True
+                self.count += 1
+            self.values[row, cell] = value
+
+    def _row(self, state, create=False):
+        key = encode_state(state)
+        row = self.rows.get(key)
+        if row is None and self.fallback is not None:
+            entries = self.fallback.state_items(state)
+            if entries:
+                row = self._new_row(key, len(state))
+                self._fill(row, entries)
+        if row is None and create:
+            row = self._new_row(key, len(state))
+        return row
+
+    def _load_fallback(self):
+        """
+        Copies in every entry of the fallback table whose state has not been loaded yet.
+        """
+        fallback, self.fallback = self.fallback, None
+        if fallback is None:
+            return
+        loaded = set(self.rows)
+        for (state, action), value in fallback.items():
+            key = encode_state(state)
+            if key not in loaded:
+                row = self.rows.get(key)
+                if row is None:
+                    row = self._new_row(key, len(state))
+                self._fill(row, [(action, value)])
+
+    def _legal_mask(self, state):
+        return np.frombuffer(state.encode(), dtype=np.uint8) == ord(' ')
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.actions(key)
+        state, (i, j) = key
+        row = self._row(state)
+        if row is None or not self.known[row, i * self.size + j]:
+            raise KeyError(key)
+        return float(self.values[row, i * self.size + j])
+
+    def __setitem__(self, key, value):
+        state, (i, j) = key
+        row = self._row(state, create=True)
+        cell = i * self.size + j
+        if not self.known[row, cell]:
+            self.known[row, cell] = True
+            self.count += 1
+        self.values[row, cell] = value
+        for tracker in self.trackers:
+            tracker.add((row, cell))
+
+    def __delitem__(self, key):
+        state, (i, j) = key
+        row = self._row(state)
+        if row is None or not self.known[row, i * self.size + j]:
+            raise KeyError(key)
+        self.known[row, i * self.size + j] = False
+        self.values[row, i * self.size + j] = 0
+        self.count -= 1
+
+    def __contains__(self, key):
+        if isinstance(key, str):
+            row = self._row(canonicalize_state(key)[0])
+            return row is not None and bool(self.known[row].any())
+        state, (i, j) = key
+        row = self._row(state)
+        return row is not None and bool(self.known[row, i * self.size + j])
+
+    def __len__(self):
+        self._load_fallback()
+        return self.count
+
+    def __iter__(self):
+        self._load_fallback()
+        if self.known is None:
+            return
+        rows, cells = np.nonzero(self.known[:len(self.row_keys)])
+        size = self.size
+        for row, cell in zip(rows.tolist(), cells.tolist()):
+            yield decode_state(self.row_keys[row], size), divmod(cell, size)
+
+    def __getstate__(self):
+        # The fallback is read in first, memory-mapped files do not pickle; the trackers
+        # belong to the readers of this copy
+        self._load_fallback()
+        state = dict(self.__dict__)
+        state['trackers'] = []
+        return state
+
+    def pop_changes(self, tracker):
+        """
+        Returns the entries a tracker from track_changes() recorded since it was last given,
+        as {(state, action): value}.
+        """
+        size = self.size
+        changes = {(decode_state(self.row_keys[row], size), divmod(cell, size)): float(self.values[row, cell])
+                   for row, cell in tracker}
+        tracker.clear()
+        return changes
+
+    def track_changes(self):
+        """
+        Starts recording the entries set from now on for a reader of the changes, e.g. a
+        Checkpoint.TrainingCheckpoint, or MCTS.SearchPool, which keeps the copies of its
+        workers up to date. Changes are only recorded while a tracker is attached.
+
+        Returns:
+        set: The tracker, to pass to pop_changes() and untrack_changes().
+        """
+        tracker = set()
+        self.trackers.append(tracker)
+        return tracker
+
+    def untrack_changes(self, tracker):
+        self.trackers = [other for other in self.trackers if other is not tracker]
+
+    def actions(self, state):
+        """
+        Returns the known actions of a position, in the orientation of state, as {action: value}.
+        """
+        canonical_state, transform = canonicalize_state(state)
+        row = self._row(canonical_state)
+        if row is None:
+            return {}
+        size = self.size
+        cells = np.flatnonzero(self.known[row])
+        return {inverse_transform_action(divmod(cell, size), transform, size): float(self.values[row, cell])
+                for cell in cells.tolist()}
+
+    def state_values(self, states):
+        """
+        Returns the Q-values of many states of one board size, as stored (the states of
+        QLearningStrategy are canonical), in a (len(states), cells) array of action values
+        indexed by cell, unknown entries counting as 0.
+        """
+        values = np.zeros((len(states), len(states[0]) if states else 0), dtype=np.float32)
+        found = []
+        rows = []
+        for i, state in enumerate(states):
+            row = self._row(state)
+            if row is not None:
+                found.append(i)
+                rows.append(row)
+        if rows:
+            values[found] = self.values[rows]
+        return values
+
+    def best_known_cell(self, key, size):
+        """
+        Returns the cell with the largest value among the known entries of a canonical state,
+        given by its base-3 key (e.g. GameBoard.canonical_key()), None when none is known.
+        Ties go to the first cell, the order in which actions() lists them.
+        """
+        row = self.rows.get(key)
+        if row is None:
+            if self.fallback is None:
+                return None
+            row = self._row(decode_state(key, size))
+            if row is None:
+                return None
+        known = self.known[row]
+        if not known.any():
+            return None
+        return int(np.where(known, self.values[row], -np.inf).argmax())
+
+    def state_row(self, state):
+        """
+        Returns the row of a state as stored (canonical for QLearningStrategy), creating it
+        if needed. Rows never move, so they can stand for their state while the table grows.
+        """
+        return self._row(state, create=True)
+
+    def add_at(self, rows, cells, deltas):
+        """
+        Adds deltas to the entries at (rows, cells), all at once; deltas to a repeated entry
+        add up. The entries become known.
+        """
+        np.add.at(self.values, (rows, cells), deltas)
+        new = ~self.known[rows, cells]
+        if new.any():
+            self.count += len(set(zip(rows[new].tolist(), cells[new].tolist())))
+            self.known[rows, cells] = True
+        if self.trackers:
+            entries = list(zip(rows.tolist(), cells.tolist()))
+            for tracker in self.trackers:
+                tracker.update(entries)
+
+    def max_values(self, rows, legal):
+        """
+        Returns the largest Q-value over the legal cells of each row, unknown entries counting
+        as 0 and rows without legal cells scoring 0.
+
+        Parameters:
+        rows (ndarray): Rows, as returned by state_row.
+        legal (ndarray): (len(rows), cells) boolean mask of the legal cells.
+        """
+        best = np.where(legal, self.values[rows], -np.inf).max(axis=1)
+        return np.where(legal.any(axis=1), best, 0.0)
+
+    def max_value(self, state):
+        """
+        Returns the largest Q-value over the legal actions of state, unknown entries counting as 0.
+        """
+        row = self._row(state)
+        if row is None:
+            return 0.0
+        legal = self._legal_mask(state)
+        if not legal.any():
+            return 0.0
+        return float(self.values[row][legal].max())
+
+    def best_action(self, state):
+        """
+        Returns the legal action of state with the largest Q-value, unknown entries counting as 0.
+        """
+        legal = self._legal_mask(state)
+        row = self._row(state)
+        if row is None:
+            return divmod(int(np.argmax(legal)), int(len(state) ** 0.5))
+        scores = np.where(legal, self.values[row], -np.inf)
+        return divmod(int(np.argmax(scores)), self.size)
@@ -1,47 +1,92 @@
-import pickle
-import random
-from Algorithm import Algorithm
-
-
-class ReinforcementLearningStrategy(Algorithm):
-    """
-    This class represents a Tic Tac Toe AI that uses a Q-table to decide its moves.
-    """
-
-    def __init__(self, board, ai_symbol, human_symbol, learning_rate=0.5, discount_factor=0.9):
-        self.board = board
-        self.ai_symbol = ai_symbol
-        self.human_symbol = human_symbol
-        self.q_table = {}
-        self.learning_rate = learning_rate
-        self.discount_factor = discount_factor
-        self.last_move = None
-
-    def calculate_best_move(self, game_state):
-        state = str(game_state.board.board)
-        if state not in self.q_table:
-            self.q_table[state] = {move: 0 for move in game_state.get_valid_moves()}
-
-        max_q_value = max(self.q_table[state].values())
-        best_moves = [move for move, q_value in self.q_table[state].items() if q_value == max_q_value]
-        return random.choice(best_moves)
-
-    def update_q_table(self, reward, next_state):
-        state = str(self.board.board)  # Adjusted from grid to board
-        if next_state not in self.q_table:
-            self.q_table[next_state] = {move: 0 for move in self.board.get_empty_positions()}
-
-        max_next_q_value = max(self.q_table[next_state].values())
-        self.q_table[state][self.last_move] += self.learning_rate * (
-                    reward + self.discount_factor * max_next_q_value - self.q_table[state][self.last_move])
-
-    def save_q_table(self, filename):
-        with open(filename, 'wb') as f:
-            pickle.dump(self.q_table, f)
-
-    def load_q_table(self, filename):
-        try:
-            with open(filename, 'rb') as f:
-                self.q_table = pickle.load(f)
-        except FileNotFoundError:
-            self.q_table = {}
+import pickle
+import random
+
+import numpy as np
+
+from Algorithm import Algorithm
+from Utils import board_to_state, canonicalize_state, state_to_board, transform_action, inverse_transform_action, \
+    array_to_states, select_best_moves
+
+
+class ReinforcementLearningStrategy(Algorithm):
+    """
+    This class represents a Tic Tac Toe AI that uses a Q-table to decide its moves.
+
+    The Q-table maps a canonical state string to {action: q_value}, with the actions in the
+    canonical orientation, so the 8 symmetric variants of a position share one entry.
+    """
+
+    def __init__(self, board, ai_symbol, human_symbol, learning_rate=0.5, discount_factor=0.9):
+        self.board = board
+        self.ai_symbol = ai_symbol
+        self.human_symbol = human_symbol
+        self.q_table = {}
+        self.learning_rate = learning_rate
+        self.discount_factor = discount_factor
+        self.last_move = None
+
+    def calculate_best_move(self, game_state):
+        size = game_state.board.width
+        state, transform = canonicalize_state(board_to_state(game_state.board))
+        if state not in self.q_table:
+            self.q_table[state] = {transform_action(move, transform, size): 0
+                                   for move in game_state.get_valid_moves()}
+
+        max_q_value = max(self.q_table[state].values())
+        best_moves = [move for move, q_value in self.q_table[state].items() if q_value == max_q_value]
+        return inverse_transform_action(random.choice(best_moves), transform, size)
+
+    def calculate_best_moves(self, games):
+        """
+        Picks the moves of many games at once, for tournaments and the game server. Each
+        distinct position is looked up once, and positions not in the Q-table are added
+        with zero values, as calculate_best_move does.
+
+        Returns:
+        list: The move (row, col) of each game.
+        """
+        return select_best_moves(games, self._q_value_rows)
+
+    def _q_value_rows(self, positions, players):
+        size = int(positions.shape[1] ** 0.5)
+        q_values = np.full(positions.shape, -np.inf)
+        for i, state in enumerate(array_to_states(positions)):
+            if state not in self.q_table:
+                self.q_table[state] = {divmod(cell, size): 0 for cell in np.flatnonzero(positions[i] == 0).tolist()}
+            for (row, col), q_value in self.q_table[state].items():
+                q_values[i, row * size + col] = q_value
+        return q_values
+
+    def update_q_table(self, reward, next_state):
+        """
+        Updates the Q-value of self.last_move played from the current board.
+
+        Parameters:
+        reward (float): The reward observed after the move.
+        next_state (str): The resulting state string, as built by board_to_state.
+        """
+        size = self.board.width
+        state, transform = canonicalize_state(board_to_state(self.board))
+        action = transform_action(self.last_move, transform, size)
+        next_state = canonicalize_state(next_state)[0]
+        if next_state not in self.q_table:
+            next_board = state_to_board(next_state)
+            self.q_table[next_state] = {(i, j): 0 for i in range(size) for j in range(size)
+                                        if next_board[i][j] == ' '}
+
+        max_next_q_value = max(self.q_table[next_state].values(), default=0)
+        q_values = self.q_table.setdefault(state, {})
+        old_value = q_values.get(action, 0)
+        q_values[action] = old_value + self.learning_rate * (
+                    reward + self.discount_factor * max_next_q_value - old_value)
+
+    def save_q_table(self, filename):
+        with open(filename, 'wb') as f:
+            pickle.dump(self.q_table, f)
+
+    def load_q_table(self, filename):
+        try:
+            with open(filename, 'rb') as f:
+                self.q_table = pickle.load(f)
+        except FileNotFoundError:
+            self.q_table = {}
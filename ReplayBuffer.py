@@ -0,0 +1,97 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    A fixed-capacity ring buffer of Q-learning transitions, kept in preallocated NumPy arrays.
+
+    A transition is stored encoded against the QTable it trains: the table rows of its
+    canonical state and next state, the action as a cell index in the canonical
+    orientation, the reward, the legal moves of the next state and whether the game
+    ended. Once full, the oldest transition is overwritten.
+
+    With prioritized set, transitions are sampled in proportion to priority ** alpha,
+    new ones getting the largest priority seen so far, and sample() returns importance
+    weights ((size * P) ** -beta, scaled to at most 1) that correct the update for the
+    non-uniform sampling. Sampling is a cumulative sum and a binary search over the
+    priorities, O(capacity), which stays well under a millisecond up to some 100000
+    transitions.
+    """
+
+    def __init__(self, capacity, prioritized=False, alpha=0.6, beta=0.4, seed=None):
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.rng = np.random.default_rng(seed)
+        self.size = 0
+        self.position = 0
+        self.max_priority = 1.0
+        self.states = None  # The arrays are allocated on the first add(), once the board size is known
+
+    def _allocate(self, cells):
+        self.states = np.zeros(self.capacity, dtype=np.int64)
+        self.actions = np.zeros(self.capacity, dtype=np.int16)
+        self.rewards = np.zeros(self.capacity, dtype=np.float32)
+        self.next_states = np.zeros(self.capacity, dtype=np.int64)
+        self.next_legal = np.zeros((self.capacity, cells), dtype=bool)
+        self.terminal = np.zeros(self.capacity, dtype=bool)
+        self.priorities = np.zeros(self.capacity, dtype=np.float64)
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        self.size = 0
+        self.position = 0
+        self.max_priority = 1.0
+
+    def add(self, state_row, action, reward, next_state_row, next_legal, terminal):
+        """
+        Stores one transition, overwriting the oldest once the buffer is full.
+
+        Parameters:
+        state_row (int): QTable row of the canonical state.
+        action (int): Cell index of the action in the canonical orientation.
+        reward (float): The reward observed.
+        next_state_row (int): QTable row of the canonical next state.
+        next_legal (ndarray): Boolean mask of the empty cells of the canonical next state.
+        terminal (bool): Whether the game ended.
+        """
+        if self.states is None:
+            self._allocate(len(next_legal))
+        i = self.position
+        self.states[i] = state_row
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state_row
+        self.next_legal[i] = next_legal
+        self.terminal[i] = terminal
+        self.priorities[i] = self.max_priority
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size):
+        """
+        Draws batch_size transitions, with replacement.
+
+        Returns:
+        tuple: (indices, weights), weights being None unless prioritized.
+        """
+        if not self.prioritized:
+            return self.rng.integers(0, self.size, batch_size), None
+        scaled = self.priorities[:self.size] ** self.alpha
+        cumulative = np.cumsum(scaled)
+        indices = np.searchsorted(cumulative, self.rng.random(batch_size) * cumulative[-1], side='right')
+        indices = np.minimum(indices, self.size - 1)
+        weights = (self.size * scaled[indices] / cumulative[-1]) ** -self.beta
+        return indices, weights / weights.max()
+
+    def update_priorities(self, indices, td_errors, epsilon=1e-3):
+        """
+        Sets the priorities of sampled transitions to their absolute TD errors, plus epsilon
+        so that no transition stops being sampled.
+        """
+        priorities = np.abs(td_errors) + epsilon
+        self.priorities[indices] = priorities
+        self.max_priority = max(self.max_priority, float(priorities.max()))
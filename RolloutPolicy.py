@@ -0,0 +1,155 @@
+import random
+from abc import ABC, abstractmethod
+
+from BitBoard import get_win_masks
+from Utils import board_to_state
+
+_LINE_TABLES = {}
+
+
+def get_line_tables(size):
+    """
+    Returns the winning lines of a size x size board, in the order of BitBoard.get_win_masks.
+
+    Returns:
+    tuple: (the cell indices of each line, the lines through each cell, the sum of the
+    cell indices of each line), cached per size.
+    """
+    tables = _LINE_TABLES.get(size)
+    if tables is None:
+        cells = size * size
+        lines = tuple(tuple(cell for cell in range(cells) if mask >> cell & 1) for mask in get_win_masks(size))
+        cell_lines = tuple(tuple(line for line, line_cells in enumerate(lines) if cell in line_cells)
+                           for cell in range(cells))
+        tables = _LINE_TABLES[size] = (lines, cell_lines, tuple(sum(line_cells) for line_cells in lines))
+    return tables
+
+
+class RolloutPolicy(ABC):
+    """
+    Plays the rollouts of an MCTS search (see the rollout_policy of MCTS). Without one,
+    MCTS follows the best known action of its Q-table and plays at random elsewhere.
+    """
+
+    @abstractmethod
+    def rollout(self, game, player):
+        """
+        Plays out the position of game.
+
+        Parameters:
+        game (TicTacToeGame): The search's scratch game, to be left in the position it was given.
+        player (str): The symbol the result is scored for.
+
+        Returns:
+        float: 1 if player wins, -1 if it loses, 0 for a draw, or a score in between for a
+        rollout stopped before the end.
+        """
+        pass
+
+
+class HeuristicRolloutPolicy(RolloutPolicy):
+    """
+    A fast, threat-aware rollout policy for large boards.
+
+    The rollout keeps its own count of each player's stones on every line, and the sum of
+    the cells filled, instead of moving on the game's board. A line one stone short of
+    complete with no stone of the other player is a threat, and its empty cell is found
+    from the sums, so the player to move takes a win or blocks the opponent's in O(1), and
+    otherwise plays at random. A line holding stones of both players is dead; once every
+    line is dead nobody can win, and the rollout ends as a draw.
+
+    With a cutoff_depth, a rollout stopped after that many moves is scored by a static line
+    evaluation, the one of MinimaxStrategy: every live line open to only one player counts
+    10 ** stones for that player, and the score is (own - other) / (own + other).
+    """
+
+    def __init__(self, cutoff_depth=None):
+        """
+        Parameters:
+        cutoff_depth (int): Moves played before a rollout is scored statically, None to play
+            every rollout out.
+        """
+        self.cutoff_depth = cutoff_depth
+
+    def rollout(self, game, player):
+        result = game.result
+        if result is not None:
+            return 0 if result == 'Draw' else 1 if result == player else -1
+
+        size = game.board.width
+        lines, cell_lines, line_sums = get_line_tables(size)
+        state = board_to_state(game.board)
+        # Side 0 is player, side 1 its opponent
+        counts = ([0] * len(lines), [0] * len(lines))
+        filled = [0] * len(lines)
+        empty = []
+        for cell, symbol in enumerate(state):
+            if symbol == ' ':
+                empty.append(cell)
+                continue
+            side_counts = counts[0 if symbol == player else 1]
+            for line in cell_lines[cell]:
+                side_counts[line] += 1
+                filled[line] += cell
+
+        needed = size - 1
+        threats = (set(), set())
+        live = 0
+        for line, (own, other) in enumerate(zip(*counts)):
+            if own and other:
+                continue
+            live += 1
+            if own == needed:
+                threats[0].add(line)
+            elif other == needed:
+                threats[1].add(line)
+
+        side = 0 if game.current_player == player else 1
+        depth = 0
+        while True:
+            if threats[side]:
+                return 1 if side == 0 else -1
+            if not live or not empty:
+                return 0
+            if self.cutoff_depth is not None and depth >= self.cutoff_depth:
+                return self.evaluate(counts)
+
+            other_side = 1 - side
+            if threats[other_side]:
+                line = next(iter(threats[other_side]))
+                cell = line_sums[line] - filled[line]
+                empty.remove(cell)
+            else:
+                index = random.randrange(len(empty))
+                cell = empty[index]
+                empty[index] = empty[-1]
+                empty.pop()
+
+            own_counts = counts[side]
+            other_counts = counts[other_side]
+            for line in cell_lines[cell]:
+                own = own_counts[line] + 1
+                own_counts[line] = own
+                filled[line] += cell
+                if other_counts[line]:
+                    if own == 1:
+                        live -= 1
+                        threats[other_side].discard(line)
+                elif own == needed:
+                    threats[side].add(line)
+            side = other_side
+            depth += 1
+
+    @staticmethod
+    def evaluate(counts):
+        """
+        Scores a position for side 0 of counts, the per-line stone counts of both sides.
+        """
+        own_score = other_score = 0
+        for own, other in zip(*counts):
+            if own and not other:
+                own_score += 10 ** own
+            elif other and not own:
+                other_score += 10 ** other
+        total = own_score + other_score
+        return (own_score - other_score) / total if total else 0.0
@@ -1,167 +1,341 @@
-import os
-import pickle
-import random
-
-from AlgorithmFactory import AlgorithmFactory
-from GameFactory import GameFactory
-from Utils import board_to_state
-
-
-def display_values_from_file(filename):
-    """
-    Display the values saved inside the .pkl file.
-    """
-    if os.path.exists(filename):
-        with open(filename, "rb") as f:
-            values = pickle.load(f)
-            for state, value in values.items():
-                print(f"State: {state}, Value: {value}")
-    else:
-        print(f"{filename} does not exist!")
-
-
-def print_progress_bar(iteration, total, bar_length=50):
-    progress = (iteration / total)
-    arrow = '-' * int(round(progress * bar_length) - 1) + '>'
-    spaces = ' ' * (bar_length - len(arrow))
-    print('\r[{}] {}/{}'.format(arrow + spaces, iteration, total), end='')
-
-
-def get_board_size():
-    print("\nPlease select a board size:")
-    print("1 - 3x3 / 2 - 5x5 / 3 - 7x7")
-    size_mapping = {1: 3, 2: 5, 3: 7}
-    return size_mapping[int(input())]
-
-
-def get_algorithm_type():
-    print("\nPlease select an algorithm to play against:")
-    print("Select Algorithm: 1 - ReinforcementLearning / 2 - ValueIteration / 3 - QLearning")
-    algorithm_mapping = {1: 'ReinforcementLearning', 2: 'ValueIteration', 3: 'QLearning'}
-    algorithm_type = int(input())
-    print(f"You have chosen to play against the {algorithm_mapping[algorithm_type]} algorithm")
-    return algorithm_mapping[algorithm_type]
-
-
-def load_strategy(ai_strategy, filename):
-    if os.path.exists(filename):
-        with open(filename, "rb") as f:
-            if 'vi_values' in filename:
-                ai_strategy.V = pickle.load(f)
-            elif 'q_table' in filename:
-                ai_strategy.Q = pickle.load(f)
-
-
-def train_strategy(game, ai_strategy, num_games, exploration_prob, algorithm_type):
-    if algorithm_type == 'ValueIteration':
-        for i in range(1, num_games + 1):
-            print_progress_bar(i, num_games)
-            while not game.is_game_over():
-                if game.current_player == game.AI_symbol:
-                    move = ai_strategy.calculate_best_move(game)
-                    game.make_move(move)
-                else:
-                    ai_strategy2 = AlgorithmFactory.create_algorithm('ValueIteration')(game.board, game.human_symbol, game.AI_symbol)
-                    move = random.choice(game.get_valid_moves()) if random.random() < exploration_prob else ai_strategy2.calculate_best_move(game)
-                    game.make_move(move)
-
-            # After each game, perform value iteration for a few iterations to update the value function
-            ai_strategy.value_iteration(game, num_iterations=10)
-            game.reset_game()
-
-    elif algorithm_type == 'QLearning':
-        for i in range(1, num_games + 1):
-            print_progress_bar(i, num_games)
-            previous_state = None
-            previous_action = None
-            while not game.is_game_over():
-                current_state = board_to_state(game.board)
-                if game.current_player == game.AI_symbol:
-                    action = ai_strategy.calculate_best_move(game)
-                    game.make_move(action)
-                    if previous_state is not None:
-                        reward = game.calculate_reward()
-                        ai_strategy.update_q_value(game, previous_state, previous_action, reward, current_state)
-                    previous_state = current_state
-                    previous_action = action
-                else:
-                    move = random.choice(game.get_valid_moves())
-                    game.make_move(move)
-            game.reset_game()
-
-
-
-def save_strategy(ai_strategy, filename):
-    with open(filename, "wb") as f:
-        if 'vi_values' in filename:
-            pickle.dump(ai_strategy.V, f)
-        elif 'q_table' in filename:
-            pickle.dump(ai_strategy.Q, f)
-
-
-def play_game(game, ai_strategy):
-    while not game.is_game_over():
-        game.display_game()
-        if game.current_player == game.human_symbol:
-            move = tuple(map(int, input("Enter your move (row, col): ").split(",")))
-            while move not in game.get_valid_moves():
-                print("Invalid move! Try again.")
-                move = tuple(map(int, input("Enter your move (row, col): ").split(",")))
-            game.make_move(move)
-        else:
-            print("Current board state before AI move:")
-            game.display_game()
-            move = ai_strategy.calculate_best_move(game)
-            print(f"AI is making move: {move}")
-            game.make_move(move)
-    game.display_game()
-
-
-if __name__ == "__main__":
-    print("Welcome to Tic Tac Toe!")
-    print("You are playing as X, and the AI is playing as O.")
-    print("To make a move, enter the row and column of the cell you want to play in, separated by a comma.")
-    print("Good luck!")
-
-    # check the values saved in the .pkl file to ensure that the training is updating the values accordingly
-    # display_values_from_file("vi_values_3x3.pkl")
-
-    board_size = get_board_size()  # 3x3, 5x5, 7x7
-    algorithm_type = get_algorithm_type()  # ReinforcementLearning, ValueIteration, QLearning
-
-    filename_mapping = {
-        'ValueIteration': f"vi_values_{board_size}x{board_size}.pkl",
-        'QLearning': f"q_table_{board_size}x{board_size}.pkl"
-    }
-
-    game = GameFactory.create_game('TicTacToe', algorithm_type, board_size)
-    ai_strategy = AlgorithmFactory.create_algorithm(algorithm_type)(game.board, game.AI_symbol, game.human_symbol)
-
-    load_strategy(ai_strategy, filename_mapping[algorithm_type])
-
-    if algorithm_type == 'ValueIteration':
-        num_games = int(input("Enter number of training games for ValueIteration (or enter 0 to skip training): "))
-    elif algorithm_type == 'QLearning':
-        num_games = int(input("Enter number of training episodes for QLearning (or enter 0 to skip training): "))
-
-    exploration_prob = 0.3
-    train_strategy(game, ai_strategy, num_games, exploration_prob, algorithm_type)
-
-
-
-    save_strategy(ai_strategy, filename_mapping[algorithm_type])
-
-    # Print a new line
-    print()
-
-    print("\nPlaying a game against the AI...")
-
-    play_game(game, ai_strategy)
-
-    winner = game.get_winner()
-    if winner == "Draw":
-        print("It's a draw!")
-    elif winner == game.AI_symbol:
-        print("AI wins!")
-    else:
-        print("You win!")
+import argparse
+import os
+import pickle
+import random
+from collections import ChainMap
+
+from AlgorithmFactory import AlgorithmFactory
+from BatchTrainer import BatchQLearningTrainer
+from Checkpoint import TrainingCheckpoint
+from GameFactory import GameFactory
+from Instrumentation import SearchStats, TrainingStats, profiled
+from OpeningBook import OpeningBookStrategy, read_book
+from ReplayBuffer import ReplayBuffer
+from RolloutPolicy import HeuristicRolloutPolicy
+from TableFile import MappedTable
+from Utils import board_to_state
+
+
+def display_values_from_file(filename):
+    """
+    Display the values saved inside the .pkl file.
+    """
+    if os.path.exists(filename):
+        with open(filename, "rb") as f:
+            values = pickle.load(f)
+            for state, value in values.items():
+                print(f"State: {state}, Value: {value}")
+    else:
+        print(f"{filename} does not exist!")
+
+
+def print_progress_bar(iteration, total, bar_length=50):
+    progress = (iteration / total)
+    arrow = '-' * int(round(progress * bar_length) - 1) + '>'
+    spaces = ' ' * (bar_length - len(arrow))
+    print('\r[{}] {}/{}'.format(arrow + spaces, iteration, total), end='')
+
+
+def get_board_size():
+    print("\nPlease select a board size:")
+    print("1 - 3x3 / 2 - 5x5 / 3 - 7x7")
+    size_mapping = {1: 3, 2: 5, 3: 7}
+    return size_mapping[int(input())]
+
+
+def get_algorithm_type():
+    print("\nPlease select an algorithm to play against:")
+    print("Select Algorithm: 1 - ReinforcementLearning / 2 - ValueIteration / 3 - QLearning / 4 - Minimax")
+    algorithm_mapping = {1: 'ReinforcementLearning', 2: 'ValueIteration', 3: 'QLearning', 4: 'Minimax'}
+    algorithm_type = int(input())
+    print(f"You have chosen to play against the {algorithm_mapping[algorithm_type]} algorithm")
+    return algorithm_mapping[algorithm_type]
+
+
+def get_table_filename(algorithm_type, board_size):
+    """
+    Returns the file the table of a strategy is saved in, None for strategies without one.
+    """
+    filename_mapping = {
+        'ValueIteration': f"vi_values_{board_size}x{board_size}.pkl",
+        'QLearning': f"q_table_{board_size}x{board_size}.pkl"
+    }
+    return filename_mapping.get(algorithm_type)
+
+
+def load_strategy(ai_strategy, filename):
+    # Prefer a memory-mapped .tbl conversion of the pickle (see TableFile.py) when it is up to date
+    table_filename = os.path.splitext(filename)[0] + '.tbl'
+    if os.path.exists(table_filename) and (not os.path.exists(filename) or
+                                           os.path.getmtime(table_filename) >= os.path.getmtime(filename)):
+        table = MappedTable(table_filename)
+        if 'vi_values' in filename:
+            # New values go to the dict in front; lookups fall through to the file
+            ai_strategy.V = ChainMap({}, table)
+        elif 'q_table' in filename:
+            ai_strategy.Q = table
+        return
+
+    if os.path.exists(filename):
+        with open(filename, "rb") as f:
+            if 'vi_values' in filename:
+                ai_strategy.V = pickle.load(f)
+            elif 'q_table' in filename:
+                ai_strategy.Q = pickle.load(f)
+
+
+def play_q_learning_episode(game, ai_strategy):
+    """
+    Plays one QLearning training game against a random opponent, then resets the game.
+
+    Each AI move is updated when the AI is next to move, with reward 0, and the last one
+    when the game ends, with the result's reward, whoever made the final move; these are
+    the transitions BatchQLearningTrainer learns from.
+    """
+    previous_state = None
+    previous_action = None
+    while not game.is_game_over():
+        current_state = board_to_state(game.board)
+        if game.current_player == game.AI_symbol:
+            if previous_state is not None:
+                ai_strategy.update_q_value(game, previous_state, previous_action, 0, current_state)
+            action = ai_strategy.calculate_best_move(game)
+            game.make_move(action)
+            previous_state = current_state
+            previous_action = action
+        else:
+            move = random.choice(game.get_valid_moves())
+            game.make_move(move)
+    if previous_state is not None:
+        ai_strategy.update_q_value(game, previous_state, previous_action, game.calculate_reward(),
+                                   board_to_state(game.board))
+    game.reset_game()
+
+
+def _table_size(ai_strategy):
+    """
+    Returns the number of table entries the strategy holds in memory. Entries still only in a
+    memory-mapped table file are not counted, so that this never has to read the whole file.
+    """
+    if hasattr(ai_strategy, 'Q'):
+        return ai_strategy.Q.count
+    if isinstance(ai_strategy.V, ChainMap):
+        return len(ai_strategy.V.maps[0])
+    return len(ai_strategy.V)
+
+
+def train_strategy(game, ai_strategy, num_games, exploration_prob, algorithm_type, batch_size=0,
+                   checkpoint=None, checkpoint_every=100, checkpoint_seconds=60.0, stats=None):
+    """
+    Trains ai_strategy for num_games games. For QLearning, a batch_size > 0 plays that many
+    games at once with the vectorized BatchQLearningTrainer instead of one game at a time.
+
+    With a checkpoint filename, the changed table entries are appended to that log every
+    checkpoint_every games or checkpoint_seconds seconds, and a run restarted with the same
+    log resumes after the last checkpointed game, with its exploration rate.
+
+    With an Instrumentation.TrainingStats, the games played, table size and time spent in
+    table updates are recorded into it after every game (every batch step for the batched
+    trainer, whose table size counts positions rather than entries).
+    """
+    checkpointer = None
+    first_game = 1
+    if checkpoint is not None:
+        checkpointer = TrainingCheckpoint(checkpoint, ai_strategy, checkpoint_every, checkpoint_seconds)
+        first_game = checkpointer.resume() + 1
+        if first_game > 1:
+            print(f"Resuming training after game {first_game - 1} from {checkpoint}")
+
+    if algorithm_type == 'ValueIteration':
+        value_iteration = stats.timed(ai_strategy.value_iteration) if stats is not None else ai_strategy.value_iteration
+        for i in range(first_game, num_games + 1):
+            print_progress_bar(i, num_games)
+            while not game.is_game_over():
+                if game.current_player == game.AI_symbol:
+                    move = ai_strategy.calculate_best_move(game)
+                    game.make_move(move)
+                else:
+                    ai_strategy2 = AlgorithmFactory.create_algorithm('ValueIteration')(game.board, game.human_symbol, game.AI_symbol)
+                    move = random.choice(game.get_valid_moves()) if random.random() < exploration_prob else ai_strategy2.calculate_best_move(game)
+                    game.make_move(move)
+
+            # After each game, perform value iteration for a few iterations to update the value function
+            value_iteration(game, num_iterations=10)
+            game.reset_game()
+            if checkpointer:
+                checkpointer.maybe_save(i)
+            if stats is not None:
+                stats.record_episodes(1, _table_size(ai_strategy))
+
+    elif algorithm_type == 'QLearning' and batch_size > 0:
+        trainer = BatchQLearningTrainer(ai_strategy, game.board.width, batch_size)
+        trainer.episodes = first_game - 1
+        step = stats.timed(trainer.step) if stats is not None else trainer.step
+        while trainer.episodes < num_games:
+            episodes = trainer.episodes
+            step()
+            print_progress_bar(min(trainer.episodes, num_games), num_games)
+            if checkpointer:
+                trainer.write_back()
+                checkpointer.maybe_save(trainer.episodes)
+            if stats is not None:
+                stats.record_episodes(trainer.episodes - episodes, len(trainer.states))
+        trainer.write_back()
+
+    elif algorithm_type == 'QLearning':
+        if stats is not None:
+            ai_strategy.update_q_value = stats.timed(ai_strategy.update_q_value)
+        try:
+            for i in range(first_game, num_games + 1):
+                print_progress_bar(i, num_games)
+                play_q_learning_episode(game, ai_strategy)
+                if checkpointer:
+                    checkpointer.maybe_save(i)
+                if stats is not None:
+                    stats.record_episodes(1, _table_size(ai_strategy))
+        finally:
+            if stats is not None:
+                del ai_strategy.update_q_value  # Back to the class's method
+
+    if checkpointer and num_games >= first_game:
+        checkpointer.save(num_games)
+    if checkpointer:
+        checkpointer.close()
+
+
+def save_strategy(ai_strategy, filename):
+    with open(filename, "wb") as f:
+        if 'vi_values' in filename:
+            pickle.dump(dict(ai_strategy.V), f)
+        elif 'q_table' in filename:
+            # Saved as a plain {(state, action): value} dict, whatever the table type
+            pickle.dump(dict(ai_strategy.Q.items()), f)
+
+
+def play_game(game, ai_strategy):
+    while not game.is_game_over():
+        game.display_game()
+        if game.current_player == game.human_symbol:
+            move = tuple(map(int, input("Enter your move (row, col): ").split(",")))
+            while move not in game.get_valid_moves():
+                print("Invalid move! Try again.")
+                move = tuple(map(int, input("Enter your move (row, col): ").split(",")))
+            game.make_move(move)
+        else:
+            print("Current board state before AI move:")
+            game.display_game()
+            move = ai_strategy.calculate_best_move(game)
+            print(f"AI is making move: {move}")
+            game.make_move(move)
+    game.display_game()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train and play Tic Tac Toe against the AI.")
+    parser.add_argument("--stats", metavar="FILE",
+                        help="append training and search statistics to FILE as JSON lines")
+    parser.add_argument("--stats-seconds", type=float, default=10.0, help="interval between statistics lines")
+    parser.add_argument("--profile", metavar="FILE", help="run under cProfile and dump the profile to FILE")
+    parser.add_argument("--async-value-iteration", action="store_true",
+                        help="train ValueIteration by prioritized sweeping instead of full sweeps after every game")
+    parser.add_argument("--replay-capacity", type=int, default=0,
+                        help="train QLearning one game at a time with experience replay from a buffer of this many "
+                             "transitions, replaying a minibatch after every update")
+    parser.add_argument("--prioritized-replay", action="store_true",
+                        help="sample the replayed transitions by their TD errors")
+    parser.add_argument("--heuristic-rollouts", action="store_true",
+                        help="play QLearning's MCTS rollouts with the threat-aware heuristic instead of the Q-table")
+    parser.add_argument("--rollout-cutoff", type=int, default=None, metavar="DEPTH",
+                        help="with --heuristic-rollouts, score rollouts statically after DEPTH moves")
+    args = parser.parse_args()
+
+    print("Welcome to Tic Tac Toe!")
+    print("You are playing as X, and the AI is playing as O.")
+    print("To make a move, enter the row and column of the cell you want to play in, separated by a comma.")
+    print("Good luck!")
+
+    # check the values saved in the .pkl file to ensure that the training is updating the values accordingly
+    # display_values_from_file("vi_values_3x3.pkl")
+
+    board_size = get_board_size()  # 3x3, 5x5, 7x7
+    algorithm_type = get_algorithm_type()  # ReinforcementLearning, ValueIteration, QLearning, Minimax
+
+    filename = get_table_filename(algorithm_type, board_size)
+
+    game = GameFactory.create_game('TicTacToe', algorithm_type, board_size)
+    ai_strategy = AlgorithmFactory.create_algorithm(algorithm_type)(game.board, game.AI_symbol, game.human_symbol)
+
+    if algorithm_type == 'ValueIteration':
+        ai_strategy.asynchronous = args.async_value_iteration
+    if algorithm_type == 'QLearning' and args.replay_capacity:
+        ai_strategy.replay_buffer = ReplayBuffer(args.replay_capacity, args.prioritized_replay)
+    if algorithm_type == 'QLearning' and args.heuristic_rollouts:
+        ai_strategy.mcts_rollout_policy = HeuristicRolloutPolicy(args.rollout_cutoff)
+
+    # Minimax searches every move and has no table to load or train
+    trained = filename is not None
+    if trained:
+        load_strategy(ai_strategy, filename)
+
+    stats_file = open(args.stats, "a") if args.stats else None
+    training_stats = TrainingStats(stats_file, args.stats_seconds) if stats_file else None
+    if stats_file and algorithm_type == 'QLearning':
+        ai_strategy.search_stats = SearchStats(stats_file, args.stats_seconds)
+
+    num_games = 0
+    if algorithm_type == 'ValueIteration':
+        if input("Solve the value function over all reachable positions first? (y/n): ").strip().lower() == 'y':
+            # Full enumeration is only practical on 3x3; larger boards are solved a few plies deep
+            ai_strategy.solve(board_size, max_depth=None if board_size == 3 else 4)
+        num_games = int(input("Enter number of training games for ValueIteration (or enter 0 to skip training): "))
+    elif algorithm_type == 'QLearning':
+        num_games = int(input("Enter number of training episodes for QLearning (or enter 0 to skip training): "))
+
+    batch_size = 0
+    if algorithm_type == 'QLearning' and num_games > 0:
+        batch_size = int(input("Enter the number of games to train in parallel (or enter 0 to train one at a time): "))
+
+    if trained:
+        # An interrupted training run leaves its checkpoint behind and is resumed from it next time
+        checkpoint = os.path.splitext(filename)[0] + '.ckpt'
+
+        exploration_prob = 0.3
+        with profiled(args.profile):
+            train_strategy(game, ai_strategy, num_games, exploration_prob, algorithm_type, batch_size, checkpoint,
+                           stats=training_stats)
+        if training_stats:
+            training_stats.emit()
+
+
+
+        save_strategy(ai_strategy, filename)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+    # Print a new line
+    print()
+
+    print("\nPlaying a game against the AI...")
+
+    # Positions covered by an opening book (see OpeningBook.py) are answered from it
+    book_filename = f"opening_book_{board_size}x{board_size}.book"
+    if os.path.exists(book_filename):
+        ai_strategy = OpeningBookStrategy(read_book(book_filename), ai_strategy)
+
+    with profiled(args.profile + ".game" if args.profile else None):
+        play_game(game, ai_strategy)
+    if isinstance(ai_strategy, OpeningBookStrategy):
+        print(f"Opening book answered {ai_strategy.hits} of {ai_strategy.lookups} moves ({ai_strategy.hit_rate():.0%})")
+        ai_strategy = ai_strategy.strategy
+    if stats_file:
+        if algorithm_type == 'QLearning':
+            ai_strategy.search_stats.emit()
+        stats_file.close()
+
+    winner = game.get_winner()
+    if winner == "Draw":
+        print("It's a draw!")
+    elif winner == game.AI_symbol:
+        print("AI wins!")
+    else:
+        print("You win!")
@@ -0,0 +1,86 @@
+import numpy as np
+
+from BitBoard import get_cell_win_masks
+from Utils import canonicalize_state, encode_state
+
+
+class StateSpace:
+    """
+    Enumerates the canonical positions reachable from the empty board, breadth first.
+
+    The human ('O') moves first, as in TicTacToeGame. States are indexed through their
+    base-3 integer key (Utils.encode_state), and the transitions are precomputed as
+    NumPy tables so that Bellman backups can be run as whole-array sweeps.
+
+    Attributes:
+    states (list of str): Canonical state string of every index.
+    index (dict): Base-3 key of a canonical state -> index.
+    successors (ndarray): (states, cells) index of the canonical state reached by playing
+        each cell, -1 where the cell is taken or the state was not expanded.
+    rewards (ndarray): (states, cells) reward of each move for the player making it:
+        1 for a win, 0 for a draw and the given step reward otherwise.
+    terminal (ndarray): True for won and drawn positions.
+    expanded (ndarray): False for positions left unexpanded by the depth or state budget.
+    """
+
+    def __init__(self, board_size, max_depth=None, max_states=None, step_reward=-0.1):
+        self.size = board_size
+        cells = board_size * board_size
+        cell_masks = get_cell_win_masks(board_size)
+
+        empty = ' ' * cells
+        self.states = [empty]
+        self.index = {encode_state(empty): 0}
+        successors = []
+        rewards = []
+        terminal = [False]
+        expanded = []
+
+        frontier = [0]
+        depth = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            next_frontier = []
+            for i in frontier:
+                if max_states is not None and len(self.states) >= max_states:
+                    next_frontier = []
+                    break
+                state = self.states[i]
+                row_successors = [-1] * cells
+                row_rewards = [0.0] * cells
+                expanded.append(i)
+                if not terminal[i]:
+                    mover = 'O' if state.count('O') == state.count('X') else 'X'
+                    mover_bits = sum(1 << c for c in range(cells) if state[c] == mover)
+                    is_full = state.count(' ') == 1
+                    for cell in range(cells):
+                        if state[cell] != ' ':
+                            continue
+                        bits = mover_bits | 1 << cell
+                        won = any(bits & mask == mask for mask in cell_masks[cell])
+                        next_state = canonicalize_state(state[:cell] + mover + state[cell + 1:])[0]
+                        key = encode_state(next_state)
+                        j = self.index.get(key)
+                        if j is None:
+                            j = self.index[key] = len(self.states)
+                            self.states.append(next_state)
+                            terminal.append(won or is_full)
+                            next_frontier.append(j)
+                        row_successors[cell] = j
+                        row_rewards[cell] = 1.0 if won else 0.0 if is_full else step_reward
+                successors.append(row_successors)
+                rewards.append(row_rewards)
+            frontier = next_frontier
+            depth += 1
+
+        num_states = len(self.states)
+        self.successors = np.full((num_states, cells), -1, dtype=np.int32)
+        self.rewards = np.zeros((num_states, cells))
+        self.expanded = np.zeros(num_states, dtype=bool)
+        # Positions are expanded in index order, so the first rows are the expanded ones
+        self.successors[:len(successors)] = successors
+        self.rewards[:len(rewards)] = rewards
+        self.expanded[expanded] = True
+        self.terminal = np.array(terminal, dtype=bool)
+
+    def __len__(self):
+        return len(self.states)
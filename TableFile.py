@@ -0,0 +1,155 @@
+import mmap
+import os
+import pickle
+import struct
+import sys
+from collections.abc import Mapping
+
+# File layout (little-endian):
+#   header  magic b'TTTB', version (u8), kind (u8), cells (u8), padding (u8), count (u64)
+#   index   count fixed-width keys, sorted: the state as ASCII (' ', 'O', 'X'), followed for
+#           Q-tables by one byte holding the action's cell index row * size + col
+#   values  count float64 values, in the order of the index
+_MAGIC = b'TTTB'
+_VERSION = 1
+_HEADER = struct.Struct('<4sBBBxQ')
+_VALUE = struct.Struct('<d')
+
+VALUE_TABLE = 0  # {state: value}, as ValueIterationStrategy.V
+Q_TABLE = 1  # {(state, action): value}, as QLearningStrategy.Q
+
+
+def write_table(filename, table):
+    """
+    Writes a {state: value} or {(state, action): value} table in the mapped table format.
+    """
+    items = list(table.items())
+    if not items:
+        raise ValueError("Cannot write an empty table.")
+    first_key = items[0][0]
+    kind = Q_TABLE if isinstance(first_key, tuple) else VALUE_TABLE
+    state = first_key[0] if kind == Q_TABLE else first_key
+    cells = len(state)
+    size = int(cells ** 0.5)
+
+    records = []
+    for key, value in items:
+        if kind == Q_TABLE:
+            (state, (i, j)) = key
+            records.append((state.encode('ascii') + bytes([i * size + j]), value))
+        else:
+            records.append((key.encode('ascii'), value))
+    records.sort()
+
+    with open(filename, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, kind, cells, len(records)))
+        f.write(b''.join(key for key, _ in records))
+        f.write(struct.pack(f'<{len(records)}d', *(value for _, value in records)))
+
+
+def convert_pickle(pickle_filename, table_filename=None):
+    """
+    Converts a pickled q_table or vi_values file, writing it next to it with a .tbl extension.
+
+    Returns:
+    str: The name of the written file.
+    """
+    if table_filename is None:
+        table_filename = os.path.splitext(pickle_filename)[0] + '.tbl'
+    with open(pickle_filename, 'rb') as f:
+        table = pickle.load(f)
+    write_table(table_filename, table)
+    return table_filename
+
+
+class MappedTable(Mapping):
+    """
+    A read-only table backed by a memory-mapped file written by write_table.
+
+    Opening it only reads the header; lookups binary-search the sorted key index in
+    place, so only the pages holding the keys and values actually looked up are read
+    into memory. Keys are the same as in the pickled tables: state strings for value
+    tables and (state, action) tuples for Q-tables.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.kind, self.cells, self.count = _HEADER.unpack_from(self.mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{filename} is not a mapped table file.")
+        self.size = int(self.cells ** 0.5)
+        self.key_width = self.cells + (1 if self.kind == Q_TABLE else 0)
+        self.index_offset = _HEADER.size
+        self.values_offset = self.index_offset + self.count * self.key_width
+
+    def _key_at(self, i):
+        start = self.index_offset + i * self.key_width
+        return self.mm[start:start + self.key_width]
+
+    def _value_at(self, i):
+        return _VALUE.unpack_from(self.mm, self.values_offset + i * _VALUE.size)[0]
+
+    def _lower_bound(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _encode(self, key):
+        if self.kind == Q_TABLE:
+            state, (i, j) = key
+            return state.encode('ascii') + bytes([i * self.size + j])
+        return key.encode('ascii')
+
+    def _decode(self, raw):
+        if self.kind == Q_TABLE:
+            return raw[:self.cells].decode('ascii'), divmod(raw[self.cells], self.size)
+        return raw.decode('ascii')
+
+    def __getitem__(self, key):
+        try:
+            raw = self._encode(key)
+        except (AttributeError, TypeError, ValueError):
+            raise KeyError(key)
+        if len(raw) == self.key_width:
+            i = self._lower_bound(raw)
+            if i < self.count and self._key_at(i) == raw:
+                return self._value_at(i)
+        raise KeyError(key)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self._decode(self._key_at(i))
+
+    def state_items(self, state):
+        """
+        Returns the (action, value) entries stored for a state of a Q-table.
+        """
+        raw = state.encode('ascii')
+        i = self._lower_bound(raw)
+        entries = []
+        while i < self.count:
+            key = self._key_at(i)
+            if key[:self.cells] != raw:
+                break
+            entries.append((divmod(key[self.cells], self.size), self._value_at(i)))
+            i += 1
+        return entries
+
+    def close(self):
+        self.mm.close()
+
+
+if __name__ == "__main__":
+    # Usage: python TableFile.py q_table_7x7.pkl [vi_values_7x7.pkl ...]
+    for filename in sys.argv[1:]:
+        print(f"{filename} -> {convert_pickle(filename)}")
@@ -0,0 +1,233 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Algorithm import Algorithm
+from AlgorithmFactory import AlgorithmFactory
+from MinimaxStrategy import MinimaxStrategy
+from Run import get_table_filename, load_strategy
+from TicTacToeGame import TicTacToeGame
+from Utils import board_to_state, state_to_board
+
+_SWAP_SYMBOLS = str.maketrans('XO', 'OX')
+
+# The two players of the current worker process, set once by the pool initializer
+_worker_players = None
+
+
+class RandomStrategy(Algorithm):
+    """
+    The random baseline: plays a uniformly random legal move.
+    """
+
+    def __init__(self, board=None, ai_symbol=None, human_symbol=None):
+        self.board = board
+
+    def calculate_best_move(self, game_state):
+        return random.choice(game_state.get_valid_moves())
+
+
+def create_player(spec, board_size, mcts_simulations=200, minimax_nodes=5000):
+    """
+    Creates the strategy of a player spec: an AlgorithmFactory algorithm or 'Random',
+    optionally followed by '=' and the table file to load instead of the default one
+    (e.g. 'QLearning=q_table_3x3.new.pkl').
+
+    Every move is made reproducible from the random seed: QLearning searches with
+    mcts_simulations per move instead of a time budget, and Minimax with a budget of
+    minimax_nodes and no time limit.
+    """
+    algorithm_type, _, filename = spec.partition('=')
+    if algorithm_type == 'Random':
+        return RandomStrategy()
+    strategy = AlgorithmFactory.create_algorithm(algorithm_type)(None, 'X', 'O')
+    if filename:
+        if not os.path.exists(filename) and not os.path.exists(os.path.splitext(filename)[0] + '.tbl'):
+            raise FileNotFoundError(f"Table {filename} not found.")
+    else:
+        filename = get_table_filename(algorithm_type, board_size)
+    if filename is not None:
+        load_strategy(strategy, filename)
+    if algorithm_type == 'QLearning':
+        strategy.mcts_simulations = mcts_simulations
+        strategy.mcts_time_budget_ms = None
+    elif algorithm_type == 'Minimax':
+        strategy.time_budget_ms = None
+        strategy.max_nodes = minimax_nodes
+    return strategy
+
+
+def _as_x(game):
+    """
+    Returns a copy of game with the symbols swapped, so that the 'O' player sees the position
+    as the 'X' player, the AI whose tables are trained for it.
+    """
+    view = game.copy()
+    view.board.board = state_to_board(board_to_state(game.board).translate(_SWAP_SYMBOLS))
+    view.current_player = 'X'
+    return view
+
+
+def play_game(players, board_size, first, seed):
+    """
+    Plays one game between players[0], playing 'X', and players[1], playing 'O'.
+
+    Both players are asked for their moves as if they played 'X'. They never explore, and
+    Minimax's transposition table is cleared first, so the game only depends on its seed.
+
+    Parameters:
+    first (int): The index of the player moving first.
+    seed (int): Seed of the random module for the game.
+
+    Returns:
+    tuple: The index of the winner, None for a draw, then the seconds spent choosing moves
+    and the number of moves of each player.
+    """
+    random.seed(seed)
+    for player in players:
+        if isinstance(player, MinimaxStrategy):
+            player.transpositions = {}
+    game = TicTacToeGame(RandomStrategy, board_size)
+    game.current_player = 'XO'[first]
+    times = [0.0, 0.0]
+    moves = [0, 0]
+    while not game.is_game_over():
+        index = 0 if game.current_player == 'X' else 1
+        player = players[index]
+        if hasattr(player, 'exploration_rate'):
+            player.exploration_rate = 0.0
+        view = game.copy() if index == 0 else _as_x(game)
+        start = time.perf_counter()
+        move = player.calculate_best_move(view)
+        times[index] += time.perf_counter() - start
+        moves[index] += 1
+        game.make_move(move)
+    winner = game.get_winner()
+    return (None if winner is None else 'XO'.index(winner)), times, moves
+
+
+def _init_worker(specs, board_size, settings):
+    global _worker_players
+    _worker_players = [create_player(spec, board_size, **settings) for spec in specs]
+
+
+def _play_games(board_size, seed, game_indices):
+    """
+    Plays the given games with the worker's players; the players move first in turn.
+
+    Returns:
+    list: (game index, winner, move times, move counts) of every game.
+    """
+    return [(index,) + play_game(_worker_players, board_size, index % 2, seed + index) for index in game_indices]
+
+
+def confidence_interval(successes, trials, z=1.96):
+    """
+    Returns the Wilson score interval of a rate, 95% for the default z.
+    """
+    if not trials:
+        return [0.0, 1.0]
+    rate = successes / trials
+    denominator = 1 + z * z / trials
+    center = (rate + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials)) / denominator
+    return [max(center - margin, 0.0), min(center + margin, 1.0)]
+
+
+def run_tournament(specs, board_size=3, num_games=1000, workers=None, seed=0, mcts_simulations=200,
+                   minimax_nodes=5000, chunk_size=None):
+    """
+    Plays num_games games between two players across a process pool, each worker creating
+    the players and loading their tables once. Game i is played with seed + i, and the first
+    player moves first in the even games, so the results do not depend on the workers.
+
+    Parameters:
+    specs (tuple): The two player specs, as taken by create_player.
+    workers (int): Worker processes, the CPU count by default. 1 plays in-process.
+    chunk_size (int): Games sent to a worker at a time.
+
+    Returns:
+    dict: The report: for each player its wins, draws and losses, their rates with 95%
+    confidence intervals, overall and by who moved first, and its average move latency;
+    and the games played per second.
+    """
+    workers = workers or os.cpu_count()
+    settings = {'mcts_simulations': mcts_simulations, 'minimax_nodes': minimax_nodes}
+    chunk_size = chunk_size or max(1, math.ceil(num_games / (workers * 4)))
+    chunks = [range(start, min(start + chunk_size, num_games)) for start in range(0, num_games, chunk_size)]
+
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(specs, board_size, settings)
+        batches = [_play_games(board_size, seed, chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(tuple(specs), board_size, settings)) as executor:
+            batches = list(executor.map(_play_games, itertools.repeat(board_size), itertools.repeat(seed), chunks))
+    elapsed = time.perf_counter() - start
+
+    games = [game for batch in batches for game in batch]
+    players = []
+    for index, spec in enumerate(specs):
+        counts = {'wins': 0, 'draws': 0, 'losses': 0}
+        by_first = {'moving_first': dict(counts), 'moving_second': dict(counts)}
+        move_time = 0.0
+        moves = 0
+        for game_index, winner, times, move_counts in games:
+            outcome = 'draws' if winner is None else 'wins' if winner == index else 'losses'
+            counts[outcome] += 1
+            by_first['moving_first' if game_index % 2 == index else 'moving_second'][outcome] += 1
+            move_time += times[index]
+            moves += move_counts[index]
+        player = {'spec': spec}
+        player.update(counts)
+        for outcome, rate_name in (('wins', 'win'), ('draws', 'draw'), ('losses', 'loss')):
+            player[f'{rate_name}_rate'] = counts[outcome] / len(games) if games else 0.0
+            player[f'{rate_name}_rate_ci95'] = confidence_interval(counts[outcome], len(games))
+        non_losses = counts['wins'] + counts['draws']
+        player['non_loss_rate'] = non_losses / len(games) if games else 0.0
+        player['non_loss_rate_ci95'] = confidence_interval(non_losses, len(games))
+        player.update(by_first)
+        player['moves'] = moves
+        player['move_latency_ms'] = move_time / moves * 1000 if moves else 0.0
+        players.append(player)
+
+    return {'board_size': board_size,
+            'games': len(games),
+            'seed': seed,
+            'workers': workers,
+            'elapsed': elapsed,
+            'games_per_second': len(games) / elapsed if elapsed else 0.0,
+            'players': players}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Play two strategies against each other headlessly and write the results as JSON.",
+        epilog="Players are an AlgorithmFactory algorithm or Random, optionally with =TABLE to load "
+               "another table file, e.g. QLearning=q_table_3x3.new.pkl.")
+    parser.add_argument("board_size", type=int, choices=(3, 5, 7))
+    parser.add_argument("player", help="the player whose results gate the run")
+    parser.add_argument("opponent", nargs="?", default="Random")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mcts-simulations", type=int, default=200, help="QLearning's MCTS simulations per move")
+    parser.add_argument("--minimax-nodes", type=int, default=5000, help="Minimax's node budget per move")
+    parser.add_argument("--output", default="tournament_results.json", help="where to write the results as JSON")
+    parser.add_argument("--min-non-loss-rate", type=float, default=None,
+                        help="exit with status 1 if the lower 95%% bound of the player's non-loss rate is below this")
+    args = parser.parse_args()
+
+    report = run_tournament((args.player, args.opponent), args.board_size, args.games, args.workers, args.seed,
+                            args.mcts_simulations, args.minimax_nodes)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.min_non_loss_rate is not None and report['players'][0]['non_loss_rate_ci95'][0] < args.min_non_loss_rate:
+        sys.exit(1)
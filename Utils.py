@@ -1,19 +1,294 @@
-def state_to_board(state):
-    board_size = int(len(state) ** 0.5)
-    board = []
-
-    for i in range(board_size):
-        row = list(state[i * board_size:(i + 1) * board_size])
-        board.append(row)
-
-    return board
-
-
-def board_to_state(game_board):
-    # If the game_board is a list, use it directly; otherwise, use game_board.board
-    board = game_board if isinstance(game_board, list) else game_board.board
-    return ''.join([''.join(row) for row in board])
-
-
-
-
+import random
+from functools import lru_cache
+
+import numpy as np
+
+
+def state_to_board(state):
+    board_size = int(len(state) ** 0.5)
+    board = []
+
+    for i in range(board_size):
+        row = list(state[i * board_size:(i + 1) * board_size])
+        board.append(row)
+
+    return board
+
+
+def board_to_state(game_board):
+    # A GameBoard keeps its state string up to date as moves are made
+    state = getattr(game_board, 'state', None)
+    if state is not None:
+        return state
+    # If the game_board is a list, use it directly; otherwise, use game_board.board
+    board = game_board if isinstance(game_board, list) else game_board.board
+    return ''.join([''.join(row) for row in board])
+
+
+# Base-3 digit of each cell symbol. The digit order matches the character order
+# ' ' < 'O' < 'X', so comparing keys of states of the same size compares the strings.
+_CELL_DIGITS = str.maketrans(' OX', '012')
+_DIGIT_CELLS = ' OX'
+
+
+def encode_state(state):
+    """
+    Encodes a state string as a base-3 integer, the first cell being the most significant digit.
+    """
+    return int(state.translate(_CELL_DIGITS), 3)
+
+
+def decode_state(key, size):
+    """
+    Decodes a base-3 integer key back into the state string of a size x size board.
+    """
+    cells = []
+    for _ in range(size * size):
+        key, digit = divmod(key, 3)
+        cells.append(_DIGIT_CELLS[digit])
+    return ''.join(reversed(cells))
+
+
+_ZOBRIST_KEYS = {}
+
+
+def get_zobrist_keys(size):
+    """
+    Returns the Zobrist keys of a size x size board: a tuple of (x_key, o_key) random 64-bit
+    integers per cell index. The hash of a position is the XOR of the keys of its stones,
+    so it can be updated with one XOR per move. A fixed seed keeps hashes stable across runs.
+    """
+    keys = _ZOBRIST_KEYS.get(size)
+    if keys is None:
+        rng = random.Random(size)
+        keys = tuple((rng.getrandbits(64), rng.getrandbits(64)) for _ in range(size * size))
+        _ZOBRIST_KEYS[size] = keys
+    return keys
+
+
+# The 8 symmetries of a square board (4 rotations, with and without reflection),
+# each mapping a cell (row, col) of an n x n board to its transformed position.
+_TRANSFORMS = (
+    lambda r, c, n: (r, c),                  # identity
+    lambda r, c, n: (c, n - 1 - r),          # rotate 90 degrees clockwise
+    lambda r, c, n: (n - 1 - r, n - 1 - c),  # rotate 180 degrees
+    lambda r, c, n: (n - 1 - c, r),          # rotate 270 degrees clockwise
+    lambda r, c, n: (r, n - 1 - c),          # mirror left-right
+    lambda r, c, n: (n - 1 - r, c),          # mirror top-bottom
+    lambda r, c, n: (c, r),                  # transpose
+    lambda r, c, n: (n - 1 - c, n - 1 - r),  # anti-transpose
+)
+
+_SYMMETRY_MAPS = {}
+
+
+def get_symmetry_maps(size):
+    """
+    Returns the cell index maps of the 8 board symmetries for the given size.
+
+    Returns:
+    tuple: (forward, inverse) where forward[t][i] is the cell that cell i moves to under
+    transform t, and inverse[t][j] is the cell that moves to j. Applying transform t to a
+    state string is ''.join(state[i] for i in inverse[t]).
+    """
+    maps = _SYMMETRY_MAPS.get(size)
+    if maps is None:
+        forward = []
+        inverse = []
+        for transform in _TRANSFORMS:
+            cells_to = [0] * (size * size)
+            cells_from = [0] * (size * size)
+            for r in range(size):
+                for c in range(size):
+                    tr, tc = transform(r, c, size)
+                    cells_to[r * size + c] = tr * size + tc
+                    cells_from[tr * size + tc] = r * size + c
+            forward.append(tuple(cells_to))
+            inverse.append(tuple(cells_from))
+        maps = (tuple(forward), tuple(inverse))
+        _SYMMETRY_MAPS[size] = maps
+    return maps
+
+
+@lru_cache(maxsize=1 << 16)
+def canonicalize_state(state):
+    """
+    Maps a state string to the representative of its symmetry class.
+
+    The representative is the lexicographically smallest of the 8 transformed states.
+
+    Returns:
+    tuple: (canonical_state, transform), where transform is the index of the symmetry
+    that turns state into canonical_state.
+    """
+    size = int(len(state) ** 0.5)
+    best_state = state
+    best_transform = 0
+    for transform, cells_from in enumerate(get_symmetry_maps(size)[1]):
+        if transform:
+            candidate = ''.join([state[i] for i in cells_from])
+            if candidate < best_state:
+                best_state = candidate
+                best_transform = transform
+    return best_state, best_transform
+
+
+# Byte translations between state strings and arrays of base-3 digits (see encode_state)
+_CELL_BYTES = bytes.maketrans(b' OX', bytes([0, 1, 2]))
+_BYTE_CELLS = bytes.maketrans(bytes([0, 1, 2]), b' OX')
+
+
+def states_to_array(states):
+    """
+    Encodes state strings of one board size into a (len(states), cells) uint8 array of
+    base-3 digits: 0 for an empty cell, 1 for 'O' and 2 for 'X'.
+    """
+    data = ''.join(states).encode().translate(_CELL_BYTES)
+    return np.frombuffer(data, dtype=np.uint8).reshape(len(states), -1)
+
+
+def array_to_states(array):
+    """
+    Decodes the rows of an array built by states_to_array back into state strings.
+    """
+    cells = array.shape[1]
+    data = np.ascontiguousarray(array, dtype=np.uint8).tobytes().translate(_BYTE_CELLS).decode()
+    return [data[i:i + cells] for i in range(0, len(data), cells)]
+
+
+def canonicalize_array(array):
+    """
+    canonicalize_state for every row of an array built by states_to_array at once.
+
+    Returns:
+    tuple: (canonical, transforms): the canonical rows, and the index of the symmetry
+    that turns each row into its canonical row, as canonicalize_state returns them.
+    """
+    rows, cells = array.shape
+    size = int(cells ** 0.5)
+    candidates = array[:, np.array(get_symmetry_maps(size)[1])]  # (rows, 8, cells)
+    # Narrows down the smallest candidates cell by cell, as a string comparison would;
+    # ties keep the first transform, as canonicalize_state does
+    smallest = np.ones((rows, len(_TRANSFORMS)), dtype=bool)
+    for cell in range(cells):
+        column = candidates[:, :, cell]
+        smallest &= column == np.where(smallest, column, 3).min(axis=1, keepdims=True)
+    transforms = smallest.argmax(axis=1)
+    return candidates[np.arange(rows), transforms], transforms
+
+
+def unique_rows(array):
+    """
+    np.unique(array, axis=0, return_inverse=True) for arrays of base-3 digits, several times
+    faster: the rows are packed into base-3 int64 keys of up to 39 digits before sorting.
+
+    Returns:
+    tuple: (the distinct rows, the index of each row of array among them).
+    """
+    digits = array.shape[1]
+    keys = []
+    for start in range(0, digits, 39):
+        chunk = array[:, start:start + 39].astype(np.int64)
+        keys.append(chunk @ 3 ** np.arange(chunk.shape[1] - 1, -1, -1, dtype=np.int64))
+    keys = keys[0] if len(keys) == 1 else np.column_stack(keys)
+    _, first, index = np.unique(keys, axis=0 if keys.ndim == 2 else None, return_index=True, return_inverse=True)
+    return array[first], index.reshape(-1)
+
+
+def select_best_moves(games, score_positions, explore=None):
+    """
+    Picks one move for each of many games, scoring each distinct position once.
+
+    The boards are encoded into one array and canonicalized, so games whose positions are
+    identical or symmetric, with the same player to move, share a single row. Each game
+    then plays its best scoring legal cell, ties broken at random.
+
+    Parameters:
+    games (list): The games, all of one board size and none of them over.
+    score_positions (callable): Called with the distinct canonical positions, an array
+        built by states_to_array, and the digit of the player to move in each of them;
+        returns a (positions, cells) array of move scores in the canonical orientation.
+        Illegal cells are never chosen, whatever their score.
+    explore (array): Optional boolean per game; those games play a random legal move.
+
+    Returns:
+    list: The move (row, col) of each game.
+    """
+    if not games:
+        return []
+    array = states_to_array([board_to_state(game.board) for game in games])
+    players = np.array([2 if game.current_player == 'X' else 1 for game in games], dtype=np.uint8)
+    size = int(array.shape[1] ** 0.5)
+    canonical, transforms = canonicalize_array(array)
+
+    keys, index = unique_rows(np.column_stack([canonical, players]))
+    scores = np.asarray(score_positions(keys[:, :-1], keys[:, -1]), dtype=np.float64)[index]
+    legal = canonical == 0
+    if explore is not None:
+        scores[explore] = 0.0
+    scores[~legal] = -np.inf
+
+    # Breaks ties with a random number per cell, seeded from random so random.seed() applies
+    rng = np.random.default_rng(random.getrandbits(64))
+    best = legal & (scores == scores.max(axis=1, keepdims=True))
+    cells = np.where(best, rng.random(scores.shape), -1.0).argmax(axis=1)
+
+    cells = np.array(get_symmetry_maps(size)[1])[transforms, cells]
+    return [divmod(cell, size) for cell in cells.tolist()]
+
+
+def transform_action(action, transform, size):
+    """
+    Maps an action (row, col) of a state to the matching action of the transformed state.
+    """
+    return divmod(get_symmetry_maps(size)[0][transform][action[0] * size + action[1]], size)
+
+
+def inverse_transform_action(action, transform, size):
+    """
+    Maps an action of the transformed state back to the original state.
+    """
+    return divmod(get_symmetry_maps(size)[1][transform][action[0] * size + action[1]], size)
+
+
+def fold_symmetric_table(table):
+    """
+    Folds the entries of symmetric states of a table into their canonical representative,
+    averaging the values of entries that collapse onto the same key.
+
+    Supports the three table layouts used by the strategies:
+    {(state, action): value} (QLearning), {state: value} (ValueIteration)
+    and {state: {action: value}} (ReinforcementLearning).
+
+    Returns:
+    dict: A new table keyed by canonical states and actions.
+    """
+    totals = {}
+    counts = {}
+
+    def add(key, value):
+        totals[key] = totals.get(key, 0) + value
+        counts[key] = counts.get(key, 0) + 1
+
+    nested = False
+    for key, value in table.items():
+        if isinstance(key, tuple):
+            state, action = key
+            canonical_state, transform = canonicalize_state(state)
+            add((canonical_state, transform_action(action, transform, int(len(state) ** 0.5))), value)
+        elif isinstance(value, dict):
+            nested = True
+            canonical_state, transform = canonicalize_state(key)
+            size = int(len(key) ** 0.5)
+            for action, q_value in value.items():
+                add((canonical_state, transform_action(action, transform, size)), q_value)
+        else:
+            add(canonicalize_state(key)[0], value)
+
+    folded = {key: totals[key] / counts[key] for key in totals}
+    if nested:
+        nested_table = {}
+        for (state, action), value in folded.items():
+            nested_table.setdefault(state, {})[action] = value
+        return nested_table
+    return folded
@@ -1,76 +1,340 @@
-from Utils import state_to_board, board_to_state
-import random
-
-
-class ValueIterationStrategy:
-    def __init__(self, board=None, AI_symbol=None, human_symbol=None, discount_factor=0.9):
-        self.discount_factor = discount_factor
-        self.V = {}  # Value function
-
-    def value_iteration(self, game, num_iterations=10000, tolerance=1e-6):
-        """
-        Perform the value iteration algorithm.
-        """
-        for _ in range(num_iterations):
-            delta = 0  # Track max change in value function
-            for state in self.get_all_possible_states(game):
-                if state not in self.V:
-                    self.V[state] = 0
-
-                old_value = self.V[state]
-                possible_actions = self.get_possible_actions(game, state)
-                if possible_actions:  # Only compute Q-values if there are valid actions
-                    q_values = {action: self.compute_q_value(game, state, action) for action in possible_actions}
-                    self.V[state] = max(q_values.values())
-
-                delta = max(delta, abs(old_value - self.V[state]))
-
-            # Check for convergence
-            if delta < tolerance:
-                break
-
-    def compute_q_value(self, game, state, action):
-        """
-        Compute the Q-value for a given state and action.
-        """
-        next_state, reward = self.get_next_state_and_reward(game, state, action)
-        return reward + self.discount_factor * self.V.get(next_state, 0)
-
-    def get_all_possible_states(self, game):
-        current_state = board_to_state(game.board)
-        if current_state not in self.V:
-            self.V[current_state] = 0
-
-        return self.V.keys()
-
-    def get_possible_actions(self, game, state):
-        board = state_to_board(state)
-        return [(i, j) for i in range(len(board)) for j in range(len(board[0])) if board[i][j] == ' ']
-
-    def get_next_state_and_reward(self, game, state, action):
-        board = state_to_board(state)
-        x, y = action
-        board[x][y] = game.current_player
-
-        winner = game.check_winner(board)
-        if winner == game.current_player:
-            return board_to_state(board), 1
-        elif winner == game.human_symbol:
-            return board_to_state(board), -1
-        elif not game.get_valid_moves():
-            return board_to_state(board), 0
-        else:
-            return board_to_state(board), -0.1
-
-    def get_best_action(self, game, state):
-        actions = self.get_possible_actions(game, state)
-        q_values = {action: self.compute_q_value(game, state, action) for action in actions}
-        return max(q_values, key=q_values.get)
-
-    def calculate_best_move(self, game):
-        state = board_to_state(game.board)
-        # Add a 40% chance to make a random move
-        if random.random() < 0.4:
-            return random.choice(self.get_possible_actions(game, state))
-        return self.get_best_action(game, state)
-
+import heapq
+import itertools
+
+from BitBoard import get_cell_win_masks, get_win_masks
+from Utils import state_to_board, board_to_state, canonicalize_state, array_to_states, canonicalize_array, \
+    select_best_moves, unique_rows
+from StateSpace import StateSpace
+import numpy as np
+import random
+
+_SWAP_SYMBOLS = str.maketrans('XO', 'OX')
+
+
+def _player_to_move(state):
+    """
+    Returns the player to move in a position of a game 'O' opened: the one with fewer stones, 'O' on ties.
+    """
+    return 'O' if state.count('O') == state.count('X') else 'X'
+
+
+class ValueIterationStrategy:
+    def __init__(self, board=None, AI_symbol=None, human_symbol=None, discount_factor=0.9, asynchronous=False,
+                 max_backups=1000, priority_threshold=1e-4, exploration_rate=0.4):
+        """
+        Parameters:
+        discount_factor (float): Discount of the values of successor positions.
+        exploration_rate (float): Chance of a random move instead of the best one.
+        asynchronous (bool): Make value_iteration run prioritized_sweep instead of full sweeps.
+        max_backups (int): Most backups of one prioritized_sweep call; the rest stay queued.
+        priority_threshold (float): Smallest value change that queues the predecessors of a position.
+        """
+        self.discount_factor = discount_factor
+        self.V = {}  # Value function, keyed by canonical state: symmetric positions share one value
+        self.exploration_rate = exploration_rate
+
+        self.asynchronous = asynchronous
+        self.max_backups = max_backups
+        self.priority_threshold = priority_threshold
+        # State of the prioritized sweeps, kept from one call to the next: the canonical
+        # positions each position was reached from, the moves of each position backed up,
+        # and the queue of positions to back up as a heap of (-priority, order, state) with
+        # the best priority of each in queued
+        self.predecessors = {}
+        self.successors = {}
+        self.queue = []
+        self.queued = {}
+        self.queue_order = itertools.count()
+        self.backups = 0
+
+    def value_iteration(self, game, num_iterations=10000, tolerance=1e-6):
+        """
+        Perform the value iteration algorithm.
+
+        Like solve(), backs up every position of V for its player to move, the one with fewer
+        stones ('O' on ties), whoever is to move in game; finished positions stay at 0.
+        With asynchronous set, runs prioritized_sweep(game) instead, and num_iterations and
+        tolerance are not used.
+        """
+        if self.asynchronous:
+            self.prioritized_sweep(game)
+            return
+        for _ in range(num_iterations):
+            delta = 0  # Track max change in value function
+            for state in self.get_all_possible_states(game):
+                if state not in self.V:
+                    self.V[state] = 0
+
+                old_value = self.V[state]
+                possible_actions = self.get_possible_actions(game, state)
+                # Only compute Q-values if there are valid actions and nobody has won yet
+                if possible_actions and game.check_winner(state_to_board(state)) is None:
+                    mover = _player_to_move(state)
+                    q_values = {action: self.compute_q_value(game, state, action, mover)
+                                for action in possible_actions}
+                    self.V[state] = max(q_values.values())
+
+                delta = max(delta, abs(old_value - self.V[state]))
+
+            # Check for convergence
+            if delta < tolerance:
+                break
+
+    def solve(self, board_size, max_depth=None, max_states=None, num_iterations=10000, tolerance=1e-6):
+        """
+        Solve the value function over every reachable position with vectorized Bellman sweeps.
+
+        The positions are enumerated once (see StateSpace), then each sweep backs up all of
+        them at once with NumPy, negamax style: V(s) is the value for the player to move, and
+        V(s) = max over legal moves of reward - discount * V(s'), since the opponent moves in
+        s'. Won and drawn positions are worth 0, so a move ending the game scores its reward.
+        For boards too large to enumerate, max_depth (in plies) and max_states bound the
+        enumeration; positions left unexpanded keep their current value from self.V.
+
+        Returns:
+        int: The number of sweeps run until convergence.
+        """
+        space = StateSpace(board_size, max_depth, max_states)
+        num_states = len(space)
+
+        # One extra slot, kept at 0, for the -1 entries of the successor table
+        values = np.zeros(num_states + 1)
+        fixed = ~space.expanded
+        values[:num_states][fixed] = [self.V.get(space.states[i], 0) for i in np.flatnonzero(fixed)]
+        legal = space.successors >= 0
+        has_moves = legal.any(axis=1)
+
+        sweeps = 0
+        for sweeps in range(1, num_iterations + 1):
+            q_values = np.where(legal, space.rewards - self.discount_factor * values[space.successors], -np.inf)
+            new_values = np.where(has_moves, q_values.max(axis=1, initial=-np.inf), 0)
+            new_values[fixed] = values[:num_states][fixed]
+            delta = np.abs(new_values - values[:num_states]).max()
+            values[:num_states] = new_values
+            if delta < tolerance:
+                break
+
+        self.V.update(zip(space.states, values[:num_states].tolist()))
+        return sweeps
+
+    def prioritized_sweep(self, game, max_backups=None):
+        """
+        Asynchronous value iteration by prioritized sweeping, whose work depends on how much
+        the values changed rather than on the size of V.
+
+        The positions of the game just played that are not over are queued first. Backing
+        a position up sets V(s) = max over its moves of reward - discount * V(s') and links
+        s to its successors; when V(s) moves by more than priority_threshold, the positions
+        linked to s are queued with that change as priority, the largest backed up first.
+        Backups follow the negamax model of solve(): the player to move is the one with
+        fewer stones ('O' on ties), a move earns 1 for a win, 0 for a draw and -0.1
+        otherwise, and finished positions are worth 0.
+
+        Parameters:
+        game (TicTacToeGame): The game just played; its move_history gives the positions.
+        max_backups (int): Most backups of this call, default self.max_backups. Positions
+            still queued are backed up by the next calls.
+
+        Returns:
+        int: The number of backups run.
+        """
+        size = game.board.width
+        cells = [' '] * (size * size)
+        player = game.human_symbol  # The human moves first
+        for move, placed, result in game.move_history:
+            if result is not None:
+                break
+            if placed:
+                self._queue_state(canonicalize_state(''.join(cells))[0], float('inf'))
+                cells[move[0] * size + move[1]] = player
+            player = game.AI_symbol if player == game.human_symbol else game.human_symbol
+        return self._sweep(self.max_backups if max_backups is None else max_backups)
+
+    def _queue_state(self, state, priority):
+        if priority > self.queued.get(state, 0):
+            self.queued[state] = priority
+            heapq.heappush(self.queue, (-priority, next(self.queue_order), state))
+
+    def _sweep(self, max_backups):
+        backups = 0
+        while self.queue and (max_backups is None or backups < max_backups):
+            negative_priority, _, state = heapq.heappop(self.queue)
+            if self.queued.get(state) != -negative_priority:
+                continue  # Superseded by a higher priority entry, or already backed up
+            del self.queued[state]
+            old_value = self.V.get(state, 0)
+            new_value = self._backup(state)
+            self.V[state] = new_value
+            backups += 1
+            change = abs(new_value - old_value)
+            if change > self.priority_threshold:
+                for predecessor in self.predecessors.get(state, ()):
+                    self._queue_state(predecessor, change)
+        self.backups += backups
+        return backups
+
+    def _backup(self, state):
+        """
+        Returns the backed up value of a canonical position that is not over. The moves of
+        the position are only worked out by its first backup (see _expand).
+        """
+        moves = self.successors.get(state)
+        if moves is None:
+            moves = self.successors[state] = self._expand(state)
+        best, next_states = moves
+        if next_states:
+            # -0.1 - discount * V(s') is largest for the successor worth least to the opponent
+            best = max(best, -0.1 - self.discount_factor * min([self.V.get(next_state, 0)
+                                                                for next_state in next_states]))
+        return best
+
+    def _expand(self, state):
+        """
+        Works out the moves of a canonical position that is not over, linking it to its
+        successors that are not over either.
+
+        Returns:
+        tuple: (best, next_states), the best reward of the moves that end the game (-inf
+        when none does) and the distinct canonical positions the other moves lead to.
+        """
+        cells = len(state)
+        cell_masks = get_cell_win_masks(int(cells ** 0.5))
+        mover = _player_to_move(state)
+        mover_bits = sum(1 << cell for cell in range(cells) if state[cell] == mover)
+        is_full = state.count(' ') == 1
+        best = -float('inf')
+        next_states = set()
+        for cell in range(cells):
+            if state[cell] != ' ':
+                continue
+            bits = mover_bits | 1 << cell
+            if any(bits & mask == mask for mask in cell_masks[cell]):
+                best = 1.0
+            elif is_full:
+                best = max(best, 0.0)
+            else:
+                next_states.add(canonicalize_state(state[:cell] + mover + state[cell + 1:])[0])
+        for next_state in next_states:
+            self.predecessors.setdefault(next_state, set()).add(state)
+        return best, tuple(next_states)
+
+    def compute_q_value(self, game, state, action, player=None):
+        """
+        Compute the Q-value for a given state and action, for the player making the move: the
+        reward of a move that ends the game, otherwise the reward minus the discounted value
+        of the next position for the opponent, who moves there.
+
+        Parameters:
+        player (str): The player making the move, default game.current_player.
+        """
+        player = game.current_player if player is None else player
+        next_state, reward = self.get_next_state_and_reward(game, state, action, player)
+        if reward == 1 or ' ' not in next_state:
+            return reward
+        opponent = 'O' if player == 'X' else 'X'
+        return reward - self.discount_factor * self.value(next_state, opponent)
+
+    def value(self, state, player):
+        """
+        Returns the value of a position for player, the player to move in it.
+
+        V holds the positions of games 'O' opens, where 'O' moves whenever both players have
+        as many stones. A position of a game 'X' opened is looked up with the symbols swapped,
+        which makes it one of those with the same value for the player to move.
+        """
+        if (state.count('O') == state.count('X')) != (player == 'O'):
+            state = state.translate(_SWAP_SYMBOLS)
+        return self.V.get(canonicalize_state(state)[0], 0)
+
+    def get_all_possible_states(self, game):
+        current_state = canonicalize_state(board_to_state(game.board))[0]
+        if current_state not in self.V:
+            self.V[current_state] = 0
+
+        return self.V.keys()
+
+    def get_possible_actions(self, game, state):
+        size = int(len(state) ** 0.5)
+        return [divmod(cell, size) for cell, symbol in enumerate(state) if symbol == ' ']
+
+    def get_next_state_and_reward(self, game, state, action, player=None):
+        """
+        Returns the state after player plays action in a position that is not over, and the
+        reward of the move: 1 if it completes a line of player, 0 if it fills the board and
+        -0.1 otherwise. Only the lines through the cell played are checked.
+        """
+        player = game.current_player if player is None else player
+        size = int(len(state) ** 0.5)
+        cell = action[0] * size + action[1]
+        next_state = state[:cell] + player + state[cell + 1:]
+
+        bits = sum(1 << i for i, symbol in enumerate(next_state) if symbol == player)
+        if any(bits & mask == mask for mask in get_cell_win_masks(size)[cell]):
+            return next_state, 1
+        elif ' ' not in next_state:
+            return next_state, 0
+        else:
+            return next_state, -0.1
+
+    def get_best_action(self, game, state):
+        actions = self.get_possible_actions(game, state)
+        q_values = {action: self.compute_q_value(game, state, action) for action in actions}
+        return max(q_values, key=q_values.get)
+
+    def calculate_best_move(self, game):
+        state = board_to_state(game.board)
+        # Make a random move with a chance of exploration_rate, 40% by default
+        if random.random() < self.exploration_rate:
+            return random.choice(self.get_possible_actions(game, state))
+        return self.get_best_action(game, state)
+
+    def calculate_best_moves(self, games):
+        """
+        Picks the moves of many games at once, for tournaments and the game server, with the
+        same exploration_rate of random moves as calculate_best_move. The Q-values of each distinct
+        position are computed once, for all its moves together.
+
+        Returns:
+        list: The move (row, col) of each game.
+        """
+        explore = np.array([random.random() < self.exploration_rate for _ in games], dtype=bool)
+        return select_best_moves(games, self.compute_q_values, explore)
+
+    def compute_q_values(self, positions, players):
+        """
+        compute_q_value of every empty cell of many positions.
+
+        Parameters:
+        positions (np.ndarray): The positions, as built by Utils.states_to_array.
+        players (np.ndarray): The digit of the player to move in each position (1 'O', 2 'X').
+
+        Returns:
+        np.ndarray: A (positions, cells) array of Q-values, -inf on the occupied cells.
+        """
+        count, cells = positions.shape
+        size = int(cells ** 0.5)
+        lines = np.array([[cell for cell in range(cells) if mask >> cell & 1] for mask in get_win_masks(size)])
+        rows, moves = np.nonzero(positions == 0)
+        movers = players[rows]
+        after = positions[rows]
+        after[np.arange(len(rows)), moves] = movers
+
+        # A move can only complete a line of the player making it
+        won = (after[:, lines] == movers[:, None, None]).all(axis=2).any(axis=1)
+        full = (after != 0).all(axis=1)
+        rewards = np.where(won, 1.0, np.where(full, 0.0, -0.1))
+
+        # The opponent moves in the successors; as in value(), those of games 'X' opened are
+        # looked up with the symbols swapped
+        o_to_move = (after == 1).sum(axis=1) == (after == 2).sum(axis=1)
+        swapped = o_to_move != (movers == 2)
+        after[swapped] = np.where(after[swapped] == 0, 0, 3 - after[swapped])
+
+        # Successors are looked up once per distinct canonical position
+        successors, index = unique_rows(canonicalize_array(after)[0])
+        successor_values = np.array([self.V.get(state, 0) for state in array_to_states(successors)], dtype=np.float64)
+
+        q_values = np.full((count, cells), -np.inf)
+        q_values[rows, moves] = np.where(won | full, rewards,
+                                         rewards - self.discount_factor * successor_values[index])
+        return q_values